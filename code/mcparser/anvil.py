@@ -0,0 +1,757 @@
+'''
+    anvil.py extract world x1 y1 z1 x2 y2 z2 model.yaml
+
+    Extracts a box of blocks from a world's Anvil region (.mca) files into
+    an mc-sdf-1 document.
+
+    A region file starts with a 4 KiB table of chunk locations (a 3 byte
+    sector offset and a 1 byte sector count, both big-endian, per chunk)
+    followed by 4 KiB of timestamps; a chunk's sectors hold its length, a
+    compression type and its (gzip, zlib or uncompressed) NBT.
+
+    Chunk sections (16x16x16 blocks) store a palette of block states and an
+    array of longs with the bit-packed palette index of every block, in
+    y, z, x order. Indexes span two longs in chunks written before 1.16 and
+    are padded to whole longs after it; 1.18 moved the sections from
+    "Level" to the chunk's root. Chunks from before 1.13 (numeric block
+    ids) aren't supported.
+
+    Region files are memory-mapped and chunks are decompressed and decoded
+    in a process pool; workers return compact arrays (coordinates, palette
+    codes and the distinct states) that are merged in chunk order.
+'''
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from encoder import encode_document
+from mcparser import (
+    BLOCK_DTYPE,
+    BlockArrays,
+    BlockOperation,
+    code_dtype,
+    LookupTable
+)
+
+
+SECTOR_SIZE = 4096
+REGION_CHUNKS = 32
+SECTION_SIZE = 16
+SECTION_VOLUME = SECTION_SIZE ** 3
+
+REGION_TEMPLATE = 'r.{}.{}.mca'
+EXTERNAL_TEMPLATE = 'c.{}.{}.mcc'
+
+GZIP = 1
+ZLIB = 2
+UNCOMPRESSED = 3
+EXTERNAL = 128
+
+# the first data versions with non-spanning block states (20w17a) and with
+# sections at the chunk's root (21w43a)
+PADDED_STATES_VERSION = 2529
+ROOT_SECTIONS_VERSION = 2844
+
+MIN_STATE_BITS = 4
+
+NAMESPACE = 'minecraft:'
+
+AIR = frozenset(('minecraft:air', 'minecraft:cave_air', 'minecraft:void_air'))
+
+# block state properties that become the block's facing
+FACING_PROPERTIES = {
+    'facing': {
+        'north': 'N',
+        'east': 'E',
+        'south': 'S',
+        'west': 'W',
+        'up': 'U',
+        'down': 'D'
+    },
+    'axis': {
+        'x': 'E',
+        'y': 'U',
+        'z': 'N'
+    }
+}
+
+# chunks per worker task
+DEFAULT_BATCH = 32
+
+
+class AnvilException(Exception):
+    '''Base Exception class for this module.'''
+    pass
+
+
+class BadNbtException(AnvilException):
+    pass
+
+
+class BadRegionException(AnvilException):
+    pass
+
+
+class UnsupportedChunkException(AnvilException):
+    pass
+
+
+class NbtReader:
+    '''Decodes (uncompressed) NBT. Compounds become dicts, lists become
+    lists and byte/int/long arrays become big-endian numpy views of the
+    data.'''
+
+    def __init__(self, data):
+
+        self.data = data
+        self.pos = 0
+
+        self._readers = {
+            1: self._struct_reader('>b'),
+            2: self._struct_reader('>h'),
+            3: self._struct_reader('>i'),
+            4: self._struct_reader('>q'),
+            5: self._struct_reader('>f'),
+            6: self._struct_reader('>d'),
+            7: self._array_reader('>i1'),
+            8: self._string,
+            9: self._list,
+            10: self._compound,
+            11: self._array_reader('>i4'),
+            12: self._array_reader('>i8')
+        }
+
+    def read(self):
+        '''Return (name, value) of the root tag.'''
+
+        try:
+
+            tag = self.data[self.pos]
+            self.pos += 1
+
+            name = self._string()
+
+            return name, self._readers[tag]()
+
+        except (IndexError, KeyError, struct.error, ValueError) as e:
+            raise BadNbtException(
+                'Bad NBT data at byte {}: {}'.format(self.pos, e)
+            )
+
+    def _struct_reader(self, fmt):
+
+        unpack = struct.Struct(fmt).unpack_from
+        size = struct.calcsize(fmt)
+
+        def read():
+
+            value, = unpack(self.data, self.pos)
+            self.pos += size
+
+            return value
+
+        return read
+
+    def _array_reader(self, dtype):
+
+        dtype = np.dtype(dtype)
+
+        def read():
+
+            count, = struct.unpack_from('>i', self.data, self.pos)
+
+            start = self.pos + 4
+            self.pos = start + count * dtype.itemsize
+
+            if self.pos > len(self.data):
+                raise ValueError('array past the end of the data')
+
+            return np.frombuffer(self.data, dtype, count, start)
+
+        return read
+
+    def _string(self):
+
+        length, = struct.unpack_from('>H', self.data, self.pos)
+
+        start = self.pos + 2
+        self.pos = start + length
+
+        return bytes(self.data[start:self.pos]).decode('utf-8', 'replace')
+
+    def _list(self):
+
+        tag, count = struct.unpack_from('>bi', self.data, self.pos)
+        self.pos += 5
+
+        if count <= 0:
+            return []
+
+        read = self._readers[tag]
+
+        return [read() for _ in range(count)]
+
+    def _compound(self):
+
+        retval = {}
+
+        while True:
+
+            tag = self.data[self.pos]
+            self.pos += 1
+
+            if tag == 0:
+                return retval
+
+            name = self._string()
+            retval[name] = self._readers[tag]()
+
+
+def read_nbt(data):
+    '''Return the root compound of NBT data.'''
+
+    return NbtReader(data).read()[1]
+
+
+class Box:
+    '''An inclusive box of block coordinates.'''
+
+    __slots__ = ('x1', 'y1', 'z1', 'x2', 'y2', 'z2')
+
+    def __init__(self, x1, y1, z1, x2, y2, z2):
+
+        self.x1, self.x2 = min(x1, x2), max(x1, x2)
+        self.y1, self.y2 = min(y1, y2), max(y1, y2)
+        self.z1, self.z2 = min(z1, z2), max(z1, z2)
+
+    @property
+    def origin(self):
+
+        return self.x1, self.y1, self.z1
+
+    def chunks(self):
+        '''The (chunk x, chunk z) of every chunk the box touches.'''
+
+        return [
+            (cx, cz)
+            for cz in range(self.z1 >> 4, (self.z2 >> 4) + 1)
+            for cx in range(self.x1 >> 4, (self.x2 >> 4) + 1)
+        ]
+
+    def __repr__(self):
+
+        return 'Box({}, {}, {}, {}, {}, {})'.format(
+            self.x1, self.y1, self.z1, self.x2, self.y2, self.z2
+        )
+
+
+class RegionFile:
+    '''A memory-mapped Anvil region file.'''
+
+    def __init__(self, filename):
+
+        self.filename = filename
+
+        self._file = open(filename, 'rb')
+
+        if os.fstat(self._file.fileno()).st_size < 2 * SECTOR_SIZE:
+
+            # empty (or truncated) regions have no chunks
+            self.buffer = None
+            return
+
+        self.buffer = mmap.mmap(
+            self._file.fileno(), 0, access=mmap.ACCESS_READ
+        )
+
+        self.locations = np.frombuffer(
+            self.buffer, '>u4', REGION_CHUNKS * REGION_CHUNKS
+        )
+
+    def chunk_data(self, cx, cz):
+        '''Return the decompressed NBT of chunk (cx, cz), or None if it
+        hasn't been generated.'''
+
+        if self.buffer is None:
+            return None
+
+        location = int(
+            self.locations[(cx % REGION_CHUNKS) + (cz % REGION_CHUNKS) *
+                           REGION_CHUNKS]
+        )
+
+        offset = (location >> 8) * SECTOR_SIZE
+
+        if offset == 0:
+            return None
+
+        try:
+            length, compression = struct.unpack_from(
+                '>iB', self.buffer, offset
+            )
+        except struct.error:
+            raise BadRegionException(
+                'Chunk {},{} lies outside "{}".'.format(cx, cz, self.filename)
+            )
+
+        if compression & EXTERNAL:
+
+            external = os.path.join(
+                os.path.dirname(self.filename),
+                EXTERNAL_TEMPLATE.format(cx, cz)
+            )
+
+            with open(external, 'rb') as fin:
+                data = fin.read()
+
+            compression &= ~EXTERNAL
+
+        else:
+
+            data = self.buffer[offset + 5:offset + 4 + length]
+
+        if compression == ZLIB:
+            return zlib.decompress(data)
+
+        if compression == GZIP:
+            return gzip.decompress(data)
+
+        if compression == UNCOMPRESSED:
+            return data
+
+        raise UnsupportedChunkException(
+            'Chunk {},{} uses unknown compression type {}.'.format(
+                cx, cz, compression
+            )
+        )
+
+    def close(self):
+
+        if self.buffer is not None:
+
+            # the numpy view must go before the map can be closed
+            self.locations = None
+            self.buffer.close()
+
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def unpack_states(data, bits, padded=True):
+    '''Unpack SECTION_VOLUME bits wide indexes from an array of longs.'''
+
+    data = data.astype(np.int64).view(np.uint64)
+    mask = np.uint64((1 << bits) - 1)
+
+    if padded:
+
+        per_long = 64 // bits
+        shifts = np.arange(per_long, dtype=np.uint64) * np.uint64(bits)
+
+        values = (data[:, None] >> shifts) & mask
+
+        return values.ravel()[:SECTION_VOLUME]
+
+    positions = np.arange(SECTION_VOLUME, dtype=np.uint64) * np.uint64(bits)
+
+    index = (positions >> np.uint64(6)).astype(np.intp)
+    offsets = positions & np.uint64(63)
+
+    values = data[index] >> offsets
+
+    # the indexes that continue into the next long
+    spill = offsets + np.uint64(bits) > np.uint64(64)
+
+    if spill.any():
+
+        upper = data[np.minimum(index + 1, len(data) - 1)[spill]]
+        values[spill] |= upper << (np.uint64(64) - offsets[spill])
+
+    return values & mask
+
+
+def block_state(entry):
+    '''Return the (material, facing) of a palette entry.'''
+
+    name = entry.get('Name', 'minecraft:air')
+    properties = entry.get('Properties') or {}
+
+    facing = None
+
+    for prop, values in FACING_PROPERTIES.items():
+
+        if prop in properties:
+
+            facing = values.get(properties[prop])
+            break
+
+    if name.startswith(NAMESPACE):
+        name = name[len(NAMESPACE):]
+
+    return name, facing
+
+
+# (x, y, z) of every block of a section, in storage order
+_SECTION_INDEX = np.arange(SECTION_VOLUME)
+SECTION_COORDINATES = np.stack(
+    (_SECTION_INDEX & 15, _SECTION_INDEX >> 8, (_SECTION_INDEX >> 4) & 15),
+    axis=1
+).astype(np.int32)
+
+
+def _sections(root):
+    '''Yield (section y, palette, data, padded) for a chunk's sections.'''
+
+    version = root.get('DataVersion', 0)
+    padded = version >= PADDED_STATES_VERSION
+
+    if version >= ROOT_SECTIONS_VERSION:
+
+        for section in root.get('sections', []):
+
+            states = section.get('block_states')
+
+            if states and states.get('palette'):
+                yield (
+                    section['Y'],
+                    states['palette'],
+                    states.get('data'),
+                    padded
+                )
+
+        return
+
+    level = root.get('Level', root)
+
+    for section in level.get('Sections', []):
+
+        if 'Palette' in section:
+
+            yield (
+                section['Y'],
+                section['Palette'],
+                section.get('BlockStates'),
+                padded
+            )
+
+        elif 'Blocks' in section:
+
+            raise UnsupportedChunkException(
+                'Chunks from before 1.13 (numeric block ids) are not '
+                'supported.'
+            )
+
+
+def chunk_blocks(root, cx, cz, box):
+    '''Return (states, coordinates, codes) for the non-air blocks of a
+    chunk's NBT that lie in box: the distinct (material, facing) states,
+    an (n, 3) int32 array of world coordinates and each block's index into
+    states.'''
+
+    states = []
+    known = {}
+
+    coordinates = []
+    codes = []
+
+    local = SECTION_COORDINATES
+    base_x, base_z = cx * SECTION_SIZE, cz * SECTION_SIZE
+
+    columns = (
+        (local[:, 0] + base_x >= box.x1) & (local[:, 0] + base_x <= box.x2) &
+        (local[:, 2] + base_z >= box.z1) & (local[:, 2] + base_z <= box.z2)
+    )
+
+    for section_y, palette, data, padded in _sections(root):
+
+        base_y = section_y * SECTION_SIZE
+
+        if base_y > box.y2 or base_y + SECTION_SIZE <= box.y1:
+            continue
+
+        entries = [block_state(entry) for entry in palette]
+        air = np.array([entry.get('Name') in AIR for entry in palette])
+
+        if air.all():
+            continue
+
+        if data is None or len(palette) == 1:
+            indexes = np.zeros(SECTION_VOLUME, dtype=np.intp)
+        else:
+            bits = (
+                max(MIN_STATE_BITS, (len(palette) - 1).bit_length())
+                if padded else len(data) * 64 // SECTION_VOLUME
+            )
+            indexes = unpack_states(data, bits, padded).astype(np.intp)
+
+        keep = columns & ~air[indexes]
+
+        if base_y < box.y1 or base_y + SECTION_SIZE - 1 > box.y2:
+            y = local[:, 1] + base_y
+            keep &= (y >= box.y1) & (y <= box.y2)
+
+        if not keep.any():
+            continue
+
+        lookup = np.zeros(len(palette), dtype=np.uint32)
+
+        for n, entry in enumerate(entries):
+
+            if entry not in known:
+                known[entry] = len(states)
+                states.append(entry)
+
+            lookup[n] = known[entry]
+
+        coordinates.append(local[keep] + (base_x, base_y, base_z))
+        codes.append(lookup[indexes[keep]])
+
+    return _combine(states, coordinates, codes)
+
+
+def _combine(states, coordinates, codes):
+
+    if not coordinates:
+        return states, np.zeros((0, 3), dtype=np.int32), \
+            np.zeros(0, dtype=np.uint32)
+
+    return states, np.concatenate(coordinates).astype(np.int32), \
+        np.concatenate(codes)
+
+
+def _merge(parts):
+    '''Merge (states, coordinates, codes) triples into one.'''
+
+    states = []
+    known = {}
+
+    coordinates = []
+    codes = []
+
+    for part_states, part_coordinates, part_codes in parts:
+
+        lookup = np.zeros(len(part_states), dtype=np.uint32)
+
+        for n, state in enumerate(part_states):
+
+            if state not in known:
+                known[state] = len(states)
+                states.append(state)
+
+            lookup[n] = known[state]
+
+        coordinates.append(part_coordinates)
+        codes.append(lookup[part_codes])
+
+    return _combine(states, coordinates, codes)
+
+
+def _extract_batch(task):
+    '''Worker: the blocks of a batch of one region file's chunks.'''
+
+    filename, chunks, box = task
+
+    parts = []
+
+    with RegionFile(filename) as region:
+
+        for cx, cz in chunks:
+
+            data = region.chunk_data(cx, cz)
+
+            if data is None:
+                continue
+
+            parts.append(chunk_blocks(read_nbt(data), cx, cz, box))
+
+    return _merge(parts)
+
+
+class ExtractedBlocks:
+    '''The blocks of a box, relative to its origin: coordinates is an
+    (n, 3) int32 array, codes indexes states (a list of (material, facing)
+    pairs, sorted).'''
+
+    def __init__(self, box, states, coordinates, codes):
+
+        self.box = box
+        self.states = states
+        self.coordinates = coordinates
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def arrays(self):
+        '''The blocks as BlockArrays.'''
+
+        materials = LookupTable()
+        facings = LookupTable()
+
+        material_codes = np.array(
+            [materials.intern(m) for m, _ in self.states], dtype=np.uint16
+        )
+        facing_codes = np.array(
+            [facings.intern(f) for _, f in self.states], dtype=np.uint8
+        )
+
+        blocks = np.zeros(len(self.codes), dtype=BLOCK_DTYPE)
+
+        blocks['x'] = self.coordinates[:, 0]
+        blocks['y'] = self.coordinates[:, 1]
+        blocks['z'] = self.coordinates[:, 2]
+        blocks['material'] = material_codes[self.codes]
+        blocks['facing'] = facing_codes[self.codes]
+
+        return BlockArrays(
+            blocks, materials, facings, LookupTable([BlockOperation.Replace])
+        )
+
+
+class AnvilExtractor:
+    '''Reads boxes of blocks out of a world's region directory, using up to
+    "workers" processes (one means no pool).'''
+
+    def __init__(self, directory, workers=None, batch=DEFAULT_BATCH):
+
+        region = os.path.join(directory, 'region')
+
+        self.directory = region if os.path.isdir(region) else directory
+        self.workers = workers or os.cpu_count() or 1
+        self.batch = batch
+
+    def tasks(self, box):
+
+        regions = {}
+
+        for cx, cz in box.chunks():
+
+            regions.setdefault(
+                (cx // REGION_CHUNKS, cz // REGION_CHUNKS), []
+            ).append((cx, cz))
+
+        retval = []
+
+        for (rx, rz), chunks in regions.items():
+
+            filename = os.path.join(
+                self.directory, REGION_TEMPLATE.format(rx, rz)
+            )
+
+            if not os.path.exists(filename):
+                continue
+
+            for n in range(0, len(chunks), self.batch):
+                retval.append((filename, chunks[n:n + self.batch], box))
+
+        return retval
+
+    def extract(self, box):
+        '''Return the ExtractedBlocks of box.'''
+
+        tasks = self.tasks(box)
+
+        if self.workers == 1 or len(tasks) <= 1:
+            parts = [_extract_batch(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                parts = list(pool.map(_extract_batch, tasks))
+
+        states, coordinates, codes = _merge(parts)
+
+        # sort the states; blocks keep their chunk order within a state
+        order = sorted(range(len(states)), key=lambda n: _state_key(states[n]))
+
+        rank = np.zeros(len(states), dtype=np.uint32)
+        rank[order] = np.arange(len(states), dtype=np.uint32)
+
+        codes = rank[codes].astype(code_dtype(len(states)))
+        coordinates = coordinates - np.array(box.origin, dtype=np.int32)
+
+        # a stable sort of small integers is a radix sort
+        blocks = np.argsort(codes, kind='stable')
+
+        return ExtractedBlocks(
+            box,
+            [states[n] for n in order],
+            coordinates[blocks],
+            codes[blocks]
+        )
+
+
+def _state_key(state):
+
+    return state[0], state[1] or ''
+
+
+def write_document(fout, blocks, name=None):
+    '''Write ExtractedBlocks as a compact mc-sdf-1 document.'''
+
+    meta = {'origin': '{},{},{}'.format(*blocks.box.origin)}
+
+    if name is not None:
+        meta['name'] = name
+
+    encode_document(fout, blocks.arrays(), meta)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Extract blocks from Anvil region files into an '
+                    'mc-sdf-1 document.'
+    )
+
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    extract_parser = commands.add_parser(
+        'extract',
+        help='extract a box of blocks (inclusive world coordinates)'
+    )
+    extract_parser.add_argument(
+        'world',
+        help='the world (or its region) directory'
+    )
+
+    for axis in ('x1', 'y1', 'z1', 'x2', 'y2', 'z2'):
+        extract_parser.add_argument(axis, type=int)
+
+    extract_parser.add_argument('target')
+    extract_parser.add_argument('--name', help='the document\'s meta name')
+    extract_parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='decoding processes (default: one per CPU)'
+    )
+
+    args = parser.parse_args()
+
+    box = Box(args.x1, args.y1, args.z1, args.x2, args.y2, args.z2)
+
+    blocks = AnvilExtractor(args.world, workers=args.workers).extract(box)
+
+    with open(args.target, 'w') as fout:
+        write_document(fout, blocks, args.name)
+
+    print('Extracted {} blocks ({} states).'.format(
+        len(blocks), len(blocks.states)
+    ))
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,162 @@
+'''
+    The 1.13+ block states of mc-sdf-1 materials.
+
+    Materials use the legacy (pre-1.13) block names and variants of
+    rcon_client/materials.yaml, which become the flattened block names
+    ("wool.red" is "red_wool", "stained_hardened_clay.white" is
+    "white_terracotta"). A facing sets the property of the block's facings
+    table there: "facing" for most, "axis" for logs, and a torch that
+    faces sideways is a wall torch.
+
+    Structure templates (structure.py) and block state commands
+    (rcon_client/materials.py) both go through block_state(), so they
+    place the same blocks.
+'''
+
+import os
+
+import yaml
+
+from mcparser import Facing
+
+
+NAMESPACE = 'minecraft'
+
+MATERIALS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir,
+    'rcon_client',
+    'materials.yaml'
+)
+
+# the 1.13 names of the legacy variant families, filled in with the variant
+VARIANT_NAMES = {
+    'wool': '{}_wool',
+    'carpet': '{}_carpet',
+    'stained_glass': '{}_stained_glass',
+    'stained_glass_pane': '{}_stained_glass_pane',
+    'stained_hardened_clay': '{}_terracotta',
+    'concrete': '{}_concrete',
+    'concrete_powder': '{}_concrete_powder',
+    'planks': '{}_planks',
+    'wooden_slab': '{}_slab',
+    'sapling': '{}_sapling',
+    'log': '{}_log',
+    'log2': '{}_log'
+}
+
+# the 1.13 names of legacy blocks used without a variant (a variant family
+# without one is its first variant, data value 0)
+BLOCK_NAMES = {
+    'wool': 'white_wool',
+    'carpet': 'white_carpet',
+    'stained_glass': 'white_stained_glass',
+    'stained_glass_pane': 'white_stained_glass_pane',
+    'stained_hardened_clay': 'white_terracotta',
+    'hardened_clay': 'terracotta',
+    'concrete': 'white_concrete',
+    'concrete_powder': 'white_concrete_powder',
+    'planks': 'oak_planks',
+    'wooden_slab': 'oak_slab',
+    'sapling': 'oak_sapling',
+    'log': 'oak_log',
+    'log2': 'acacia_log',
+    'stone_stairs': 'cobblestone_stairs',
+    'wall_sign': 'oak_wall_sign'
+}
+
+# the block state property a facings table sets ("facing" if not listed)
+STATE_PROPERTIES = {
+    'log_axis': 'axis'
+}
+
+AXIS_VALUES = {
+    Facing.Up: 'y',
+    Facing.Down: 'y',
+    Facing.East: 'x',
+    Facing.West: 'x',
+    Facing.North: 'z',
+    Facing.South: 'z'
+}
+
+# blocks that are another block when they hang on a wall
+WALL_BLOCKS = {
+    'torch': 'wall_torch',
+    'redstone_torch': 'redstone_wall_torch'
+}
+
+
+def block_name(material):
+    '''The namespaced block name of a material. Materials that aren't
+    legacy names are taken as they are, "block.variant" ones as
+    "variant_block".'''
+
+    block, _, variant = material.partition('.')
+
+    if not variant:
+        block = BLOCK_NAMES.get(block, block)
+    elif block in VARIANT_NAMES:
+        block = VARIANT_NAMES[block].format(variant)
+    else:
+        block = '{}_{}'.format(variant, block)
+
+    if ':' not in block:
+        block = '{}:{}'.format(NAMESPACE, block)
+
+    return block
+
+
+def block_state(material, facing, facings):
+    '''Return the (namespaced name, properties dict) block state of a
+    material and (Facing or None) facing. facings maps blocks to their
+    facings table (the "facings" section of materials.yaml); the facing of
+    a block without one isn't part of its state.'''
+
+    block = material.partition('.')[0]
+
+    name = block_name(material)
+    properties = {}
+
+    if facing is None or block not in facings:
+        return name, properties
+
+    prop = STATE_PROPERTIES.get(facings[block], 'facing')
+
+    if prop == 'axis':
+        value = AXIS_VALUES.get(facing)
+    elif facing is Facing.Other:
+        value = None
+    else:
+        value = facing.name.lower()
+
+    if block in WALL_BLOCKS:
+
+        if facing is Facing.Up:
+            value = None
+        else:
+            name = block_name(WALL_BLOCKS[block])
+
+    if value is not None:
+        properties[prop] = value
+
+    return name, properties
+
+
+def format_state(name, properties):
+    '''A block state in command syntax: "name[key=value,...]".'''
+
+    if not properties:
+        return name
+
+    return '{}[{}]'.format(name, ','.join(
+        '{}={}'.format(key, value) for key, value in properties.items()
+    ))
+
+
+def load_facings(filename=MATERIALS_FILE):
+    '''The facings section of a materials mapping file.'''
+
+    with open(filename, 'r') as fin:
+        data = yaml.safe_load(fin) or {}
+
+    return data.get('facings') or {}
@@ -0,0 +1,511 @@
+'''
+    encoder.py compact model.yaml compact.yaml
+
+    Writes blocks (a BlockArrays) out as a compact mc-sdf-1 document.
+
+    Blocks are grouped into one context per (material, facing, operation)
+    state. States with only a few blocks, for which a context of their own
+    would cost more than naming the state on each item, are folded into the
+    context of the most common state that shares their operation and
+    whether they have a facing, using item_suffix for the fields that
+    differ. Each context's x/y/z is set to the minimum of its items' x/y/z
+    where that shortens the items by more than the line it costs, and items
+    are written as quoted "x,y,z[,suffix]" tuples in wrapped flow sequences.
+
+    Everything is done with whole-array operations, in time linear in the
+    number of blocks (apart from a sort when the blocks are spread too
+    sparsely to check for repeated coordinates on a grid).
+
+    The document holds the same set of blocks, which Parser and
+    ParseGenerator read back exactly; where the input places more than one
+    block at the same coordinates only the last of them (the one a build
+    leaves behind) is kept, and blocks come back in context order.
+'''
+
+import argparse
+import json
+import re
+
+import numpy as np
+import yaml
+
+from mcparser import (
+    BlockOperation,
+    code_dtype,
+    Facing,
+    last_occurrences,
+    StreamingParser,
+    ParseGenerator
+)
+
+
+ITEMS_PER_LINE = 8
+
+INDENT = '          '
+ITEMS_INDENT = INDENT + '  '
+
+ENTRY_TEMPLATE = '"{},{},{}"'
+SUFFIXED_ENTRY_TEMPLATE = '"{},{},{}{}"'
+
+# the fixed part of a context's lines, used to estimate what a context of
+# its own costs a state
+CONTEXT_COST = len(
+    '      - context:\n' + INDENT + 'material: \n' + INDENT + 'items: []\n'
+)
+FACING_COST = len(INDENT + 'facing: \n')
+
+# suffix values are written unquoted inside the item's tuple
+SUFFIX_REGEX = re.compile('^[A-Za-z0-9_.-]+(:[A-Za-z0-9_.-]+)*$')
+
+RESOLVER = yaml.resolver.Resolver()
+
+FACING_SHORTHAND = {
+    Facing.North: 'N',
+    Facing.East: 'E',
+    Facing.South: 'S',
+    Facing.West: 'W',
+    Facing.Up: 'U',
+    Facing.Down: 'D'
+}
+
+
+class EncoderException(Exception):
+    '''Base Exception class for this module.'''
+    pass
+
+
+def facing_name(value):
+    '''The shortest document form of a facing (a Facing or any string that
+    Facing.resolve() accepts), or None.'''
+
+    if value is None:
+        return None
+
+    if not isinstance(value, Facing):
+        value = Facing.resolve(value)
+
+    return FACING_SHORTHAND.get(value, value.name)
+
+
+def scalar(value):
+    '''value as a YAML scalar that loads back as the same string.'''
+
+    tag = RESOLVER.resolve(yaml.ScalarNode, value, (True, False))
+
+    if tag == 'tag:yaml.org,2002:str' and SUFFIX_REGEX.match(value):
+        return value
+
+    # JSON strings are valid double-quoted YAML scalars
+    return json.dumps(value)
+
+
+def _digits(values):
+    '''The printed length of every integer in values.'''
+
+    values = values.astype(np.int64)
+
+    retval = 1 + (values < 0).astype(np.int64)
+    magnitudes = np.abs(values)
+
+    if not len(values):
+        return retval
+
+    power = 10
+    largest = int(magnitudes.max())
+
+    while power <= largest:
+
+        retval += magnitudes >= power
+        power *= 10
+
+    return retval
+
+
+class EncodedContext:
+    '''One context of an encoded document: coordinates are the items'
+    (n, 3) coordinates relative to offset and suffixes (when fields is not
+    empty) their suffix strings, "" for items in the context's own
+    state.'''
+
+    __slots__ = (
+        'material',
+        'facing',
+        'operation',
+        'offset',
+        'fields',
+        'coordinates',
+        'suffixes'
+    )
+
+    def __init__(self, material, facing, operation, fields):
+
+        self.material = material
+        self.facing = facing
+        self.operation = operation
+        self.fields = fields
+
+        self.offset = (0, 0, 0)
+        self.coordinates = None
+        self.suffixes = None
+
+
+class _State:
+
+    __slots__ = ('material', 'facing', 'operation', 'count', 'first')
+
+    def __init__(self, material, facing, operation, count, first):
+
+        self.material = material
+        self.facing = facing
+        self.operation = operation
+        self.count = count
+        self.first = first
+
+    @property
+    def suffixable(self):
+
+        return (
+            self.material is not None and
+            SUFFIX_REGEX.match(self.material) is not None
+        )
+
+    @property
+    def own_cost(self):
+
+        return CONTEXT_COST + len(self.material or '') + (
+            0 if self.facing is None else FACING_COST + len(self.facing)
+        )
+
+    @property
+    def suffix_cost(self):
+
+        return 1 + len(self.material) + (
+            0 if self.facing is None else 1 + len(self.facing)
+        )
+
+    def suffix(self, fields):
+
+        return ''.join(
+            ',' + getattr(self, field_name) for field_name in fields
+        )
+
+
+class DocumentEncoder:
+    '''Encodes BlockArrays as compact mc-sdf-1 documents.'''
+
+    def __init__(self, items_per_line=ITEMS_PER_LINE):
+
+        self.items_per_line = items_per_line
+
+    def contexts(self, arrays):
+        '''Return the EncodedContexts for arrays, in the order of their
+        first block.'''
+
+        blocks = arrays.blocks[last_occurrences(arrays.coordinates)]
+
+        if not len(blocks):
+            return []
+
+        facing_count = max(len(arrays.facings), 1)
+        operation_count = max(len(arrays.operations), 1)
+
+        combined = (
+            blocks['material'].astype(np.int64) * facing_count +
+            blocks['facing']
+        ) * operation_count + blocks['operation']
+
+        totals = np.bincount(combined)
+        present = np.flatnonzero(totals)
+
+        state_codes = np.zeros(len(totals), dtype=np.intp)
+        state_codes[present] = np.arange(len(present))
+
+        block_states = state_codes[combined]
+
+        # a stable sort keeps each state's blocks in document order
+        by_state = np.argsort(
+            block_states.astype(code_dtype(len(present))), kind='stable'
+        )
+        starts = np.concatenate(([0], np.cumsum(totals[present])[:-1]))
+
+        states = [
+            _State(
+                arrays.materials[code // (facing_count * operation_count)],
+                facing_name(
+                    arrays.facings[code // operation_count % facing_count]
+                    if len(arrays.facings) else None
+                ),
+                arrays.operations[code % operation_count]
+                if len(arrays.operations) else None,
+                int(totals[code]),
+                int(by_state[start])
+            )
+            for code, start in zip(present.tolist(), starts.tolist())
+        ]
+
+        hosts = self._hosts(states)
+
+        contexts, state_contexts, suffixes = self._build_contexts(
+            states, hosts
+        )
+
+        block_contexts = state_contexts[block_states].astype(
+            code_dtype(len(contexts))
+        )
+
+        by_context = np.argsort(block_contexts, kind='stable')
+        bounds = np.concatenate(
+            ([0], np.cumsum(np.bincount(block_contexts)))
+        ).tolist()
+
+        coordinates = np.column_stack(
+            (blocks['x'], blocks['y'], blocks['z'])
+        ).astype(np.int64)
+
+        for n, context in enumerate(contexts):
+
+            rows = by_context[bounds[n]:bounds[n + 1]]
+
+            context.offset, context.coordinates = self._offset(
+                coordinates[rows]
+            )
+
+            if context.fields:
+                context.suffixes = suffixes[block_states[rows]]
+
+        return contexts
+
+    @staticmethod
+    def _hosts(states):
+        '''Map each state to the state whose context it goes into.'''
+
+        hosts = {}
+        largest = {}
+
+        # states can only share a context with the same operation, and a
+        # missing facing can't be given as a suffix
+        def partition(state):
+            return state.operation, state.facing is None
+
+        for n, state in enumerate(states):
+
+            key = partition(state)
+
+            if key not in largest or state.count > states[largest[key]].count:
+                largest[key] = n
+
+        for n, state in enumerate(states):
+
+            host = largest[partition(state)]
+
+            if (n == host or not state.suffixable or
+                    state.count * state.suffix_cost > state.own_cost):
+                hosts[n] = n
+            else:
+                hosts[n] = host
+
+        return hosts
+
+    @staticmethod
+    def _build_contexts(states, hosts):
+
+        members = {}
+
+        for n, host in hosts.items():
+            members.setdefault(host, []).append(n)
+
+        # contexts in the order of their first block
+        order = sorted(
+            members,
+            key=lambda host: min(states[n].first for n in members[host])
+        )
+
+        contexts = []
+        state_contexts = np.zeros(len(states), dtype=np.intp)
+        suffixes = np.empty(len(states), dtype=object)
+        suffixes[:] = ''
+
+        for host in order:
+
+            state = states[host]
+            guests = [states[n] for n in members[host] if n != host]
+
+            if not guests:
+                fields = []
+            elif all(g.facing == state.facing for g in guests):
+                fields = ['material']
+            elif all(g.material == state.material for g in guests):
+                fields = ['facing']
+            else:
+                fields = ['material', 'facing']
+
+            for n in members[host]:
+
+                state_contexts[n] = len(contexts)
+
+                if n != host:
+                    suffixes[n] = states[n].suffix(fields)
+
+            contexts.append(EncodedContext(
+                state.material,
+                state.facing,
+                state.operation,
+                fields
+            ))
+
+        return contexts, state_contexts, suffixes
+
+    @staticmethod
+    def _offset(coordinates):
+        '''Move each axis's minimum into the context where that pays.'''
+
+        offset = []
+
+        for axis, name in enumerate(('x', 'y', 'z')):
+
+            values = coordinates[:, axis]
+            low = int(values.min())
+
+            saved = int(_digits(values).sum() - _digits(values - low).sum())
+            cost = len('{}{}: {}\n'.format(INDENT, name, low))
+
+            offset.append(low if saved > cost else 0)
+
+        return tuple(offset), coordinates - np.array(offset, dtype=np.int64)
+
+    def write(self, fout, arrays, meta=None):
+        '''Write arrays to fout as an mc-sdf-1 document.'''
+
+        fout.write('mc-sdf-1:\n')
+        fout.write('  version: 1.0\n')
+
+        if meta:
+
+            fout.write('  meta:\n')
+
+            text = yaml.safe_dump(meta, default_flow_style=False)
+            fout.writelines('    ' + line + '\n' for line in text.splitlines())
+
+        contexts = self.contexts(arrays)
+
+        if not contexts:
+            fout.write('  cells: []\n')
+            return
+
+        fout.write('  cells:\n')
+        fout.write('  - cell:\n')
+        fout.write('      structure:\n')
+
+        for context in contexts:
+            self._write_context(fout, context)
+
+    def _write_context(self, fout, context):
+
+        fout.write('      - context:\n')
+
+        if context.material is not None:
+            fout.write('{}material: {}\n'.format(
+                INDENT, scalar(context.material)
+            ))
+
+        if context.facing is not None:
+            fout.write('{}facing: {}\n'.format(INDENT, context.facing))
+
+        if context.operation not in (None, BlockOperation.Replace):
+            fout.write('{}operation: {}\n'.format(
+                INDENT, context.operation.name
+            ))
+
+        for name, value in zip(('x', 'y', 'z'), context.offset):
+
+            if value:
+                fout.write('{}{}: {}\n'.format(INDENT, name, value))
+
+        if context.fields:
+            fout.write('{}item_suffix: [{}]\n'.format(
+                INDENT, ', '.join(context.fields)
+            ))
+
+        fout.write('{}items: ['.format(INDENT))
+
+        if context.fields:
+
+            args = np.empty((len(context.coordinates), 4), dtype=object)
+            args[:, :3] = context.coordinates
+            args[:, 3] = context.suffixes
+
+            template = SUFFIXED_ENTRY_TEMPLATE
+
+        else:
+
+            args = context.coordinates
+            template = ENTRY_TEMPLATE
+
+        width = args.shape[1]
+        args = args.ravel().tolist()
+
+        per_line = self.items_per_line
+        line_template = ','.join([template] * per_line)
+        step = per_line * width
+
+        full = len(args) // step * step
+
+        # one format call per line rather than per item
+        lines = [
+            line_template.format(*args[n:n + step])
+            for n in range(0, full, step)
+        ]
+
+        if full < len(args):
+            lines.append(
+                ','.join([template] * ((len(args) - full) // width)).format(
+                    *args[full:]
+                )
+            )
+
+        fout.write((',\n' + ITEMS_INDENT).join(lines))
+        fout.write(']\n')
+
+
+def encode_document(fout, arrays, meta=None):
+    '''Write arrays (a BlockArrays) to fout as a compact mc-sdf-1
+    document.'''
+
+    DocumentEncoder().write(fout, arrays, meta)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Write compact mc-sdf-1 documents.'
+    )
+
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    compact_parser = commands.add_parser(
+        'compact',
+        help='re-encode an mc-sdf-1 document (its cells become one cell)'
+    )
+    compact_parser.add_argument('source')
+    compact_parser.add_argument('target')
+
+    args = parser.parse_args()
+
+    with open(args.source, 'r') as fin:
+
+        source = StreamingParser(fin)
+
+        meta = {
+            k: v for k, v in source.meta.dict_repr.items() if v is not None
+        }
+
+        arrays = ParseGenerator(source).generate_arrays()
+
+    with open(args.target, 'w') as fout:
+        encode_document(fout, arrays, meta)
+
+
+if __name__ == '__main__':
+
+    main()
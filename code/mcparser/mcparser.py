@@ -1,7 +1,12 @@
 '''
 '''
 
+import copy
 from enum import Enum
+import warnings
+
+import numpy as np
+import yaml
 
 
 class ParserException(RuntimeError):
@@ -28,6 +33,27 @@ class UnexpectedSuffixException(ParserException):
     pass
 
 
+class BadRepeatException(ParserException):
+    pass
+
+
+# row layout of the columnar block buffer returned by
+# ParseGenerator.generate_arrays() - material, facing and operation are
+# indices into the LookupTables that accompany the buffer
+BLOCK_DTYPE = np.dtype([
+    ('x', '<i4'),
+    ('y', '<i4'),
+    ('z', '<i4'),
+    ('material', '<u2'),
+    ('facing', 'u1'),
+    ('operation', 'u1')
+])
+
+# the grid last_occurrences() uses to find repeated coordinates may be this
+# many times larger than the number of blocks
+DENSE_FACTOR = 8
+
+
 class Parser:
 
     BASE_NAME = 'mc-sdf-1'
@@ -58,15 +84,34 @@ class Parser:
                 )
             )
 
+        self.invalidate()
+
         self.meta
 
+    def invalidate(self):
+        '''Drop the cached meta and cells (call after changing self.data).'''
+
+        self._meta = None
+        self._cells = None
+
     @property
     def meta(self):
 
-        return Meta(self.data[self.BASE_NAME].get('meta'))
+        if self._meta is None:
+            self._meta = Meta(self.data[self.BASE_NAME].get('meta'))
+
+        return self._meta
 
     @property
     def cells(self):
+        '''A CellIndex of the document's cells, built on first access.'''
+
+        if self._cells is None:
+            self._cells = CellIndex(self._build_cells())
+
+        return self._cells
+
+    def _build_cells(self):
 
         retval = []
 
@@ -78,6 +123,54 @@ class Parser:
         return retval
 
 
+class CellIndex:
+    '''The cells of a document in order, with lookups by position, by name
+    (the "name" entry of a cell's meta) and by context.'''
+
+    def __init__(self, cells):
+
+        self.cells = list(cells)
+        self.names = {}
+
+        for n, cell in enumerate(self.cells):
+
+            if isinstance(cell.meta, dict) and 'name' in cell.meta:
+                self.names.setdefault(cell.meta['name'], n)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    def __getitem__(self, key):
+
+        if isinstance(key, str):
+            return self.by_name(key)
+
+        return self.cells[key]
+
+    def by_name(self, name):
+
+        try:
+            return self.cells[self.names[name]]
+        except KeyError:
+            raise KeyError('No cell named "{}".'.format(name))
+
+    def context(self, cell, index):
+        '''The index'th context of a cell (given by position or name).'''
+
+        return self[cell].structure[index]
+
+    def contexts(self):
+        '''Yield (cell index, context index, context) for every context.'''
+
+        for n, cell in enumerate(self.cells):
+
+            for m, context in enumerate(cell.structure or []):
+                yield n, m, context
+
+
 class Meta:
 
     FIELDS = (
@@ -143,11 +236,7 @@ class Cell:
 
                 for context in data[key]:
 
-                    if len(context) != 1:
-                        # TODO need a better exception here
-                        raise Exception('Expected context values.')
-
-                    structure.append(Context(context['context']))
+                    structure.append(self.make_context(context))
 
                     setattr(self, 'structure', structure)
 
@@ -155,6 +244,285 @@ class Cell:
 
                 setattr(self, key, data[key])
 
+    @staticmethod
+    def make_context(data):
+        '''Build a Context from a "- context: ..." structure entry.'''
+
+        if len(data) != 1:
+            # TODO need a better exception here
+            raise Exception('Expected context values.')
+
+        return Context(data['context'])
+
+
+class StreamingParser(Parser):
+    '''A Parser that reads a YAML stream incrementally.
+
+    Only the document header is loaded up front; cells (and the contexts in
+    their structure) are built one at a time as they are iterated, so memory
+    use is bounded by the largest context rather than by the whole file.
+
+    Because of that "cells" can only be iterated once, the header fields
+    ("version", "meta", ...) must come before "cells", and YAML aliases are
+    not supported.'''
+
+    CELLS_NAME = 'cells'
+
+    def __init__(self, stream, loader=None):
+
+        if loader is None:
+            loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+        self.loader = loader(stream)
+        self.iterated = False
+
+        header = self._read_header()
+
+        super().__init__({} if header is None else {self.BASE_NAME: header})
+
+    @property
+    def cells(self):
+
+        if self.iterated:
+            raise ParserException('Streamed cells can only be iterated once.')
+
+        self.iterated = True
+
+        return self._iter_cells()
+
+    def _read_header(self):
+
+        self._expect(yaml.StreamStartEvent)
+        self._expect(yaml.DocumentStartEvent)
+        self._expect(yaml.MappingStartEvent)
+
+        while not self.loader.check_event(yaml.MappingEndEvent):
+
+            if self._scalar() != self.BASE_NAME:
+                self._compose()
+                continue
+
+            self._expect(yaml.MappingStartEvent)
+
+            header = {}
+
+            while not self.loader.check_event(yaml.MappingEndEvent):
+
+                key = self._scalar()
+
+                # leave the stream positioned at the start of the cells
+                if key == self.CELLS_NAME:
+                    return header
+
+                header[key] = self.loader.construct_document(self._compose())
+
+            self.loader.get_event()
+
+            return header
+
+        return None
+
+    def _iter_cells(self):
+
+        if not self.loader.check_event(yaml.SequenceStartEvent):
+            return
+
+        self.loader.get_event()
+
+        while not self.loader.check_event(yaml.SequenceEndEvent):
+
+            # as in Parser.cells only the first value of "- cell:" is used
+            self._expect(yaml.MappingStartEvent)
+            self._scalar()
+
+            cell = StreamedCell(self)
+
+            yield cell
+
+            cell.finish()
+
+            while not self.loader.check_event(yaml.MappingEndEvent):
+                self._compose()
+
+            self.loader.get_event()
+
+        self.loader.get_event()
+
+    def _expect(self, event_class):
+
+        event = self.loader.get_event()
+
+        if not isinstance(event, event_class):
+            raise BadDocumentException(
+                'Expected {} but got {}.'.format(
+                    event_class.__name__,
+                    event.__class__.__name__
+                )
+            )
+
+        return event
+
+    def _scalar(self):
+
+        return self.loader.construct_document(self._compose())
+
+    def _compose(self):
+        '''Build a yaml node tree from the next complete value.'''
+
+        event = self.loader.get_event()
+
+        if isinstance(event, yaml.ScalarEvent):
+
+            tag = event.tag
+
+            if tag is None or tag == '!':
+                tag = self.loader.resolve(
+                    yaml.ScalarNode,
+                    event.value,
+                    event.implicit
+                )
+
+            return yaml.ScalarNode(
+                tag,
+                event.value,
+                event.start_mark,
+                event.end_mark,
+                style=event.style
+            )
+
+        if isinstance(event, yaml.SequenceStartEvent):
+
+            tag = event.tag
+
+            if tag is None or tag == '!':
+                tag = self.loader.resolve(
+                    yaml.SequenceNode,
+                    None,
+                    event.implicit
+                )
+
+            value = []
+
+            while not self.loader.check_event(yaml.SequenceEndEvent):
+                value.append(self._compose())
+
+            end = self.loader.get_event()
+
+            return yaml.SequenceNode(
+                tag,
+                value,
+                event.start_mark,
+                end.end_mark,
+                flow_style=event.flow_style
+            )
+
+        if isinstance(event, yaml.MappingStartEvent):
+
+            tag = event.tag
+
+            if tag is None or tag == '!':
+                tag = self.loader.resolve(
+                    yaml.MappingNode,
+                    None,
+                    event.implicit
+                )
+
+            value = []
+
+            while not self.loader.check_event(yaml.MappingEndEvent):
+                value.append((self._compose(), self._compose()))
+
+            end = self.loader.get_event()
+
+            return yaml.MappingNode(
+                tag,
+                value,
+                event.start_mark,
+                end.end_mark,
+                flow_style=event.flow_style
+            )
+
+        if isinstance(event, yaml.AliasEvent):
+            raise BadDocumentException(
+                'Aliases are not supported when streaming ("{}").'.format(
+                    event.anchor
+                )
+            )
+
+        raise BadDocumentException(
+            'Unexpected {}.'.format(event.__class__.__name__)
+        )
+
+
+class StreamedCell(Cell):
+    '''A Cell read from a StreamingParser.
+
+    "structure" is a one-shot iterator of Contexts. Fields that follow the
+    structure in the document are only set once it has been exhausted.'''
+
+    def __init__(self, parser):
+
+        self.data = None
+        self.parser = parser
+        self.finished = False
+
+        for field in self.FIELDS:
+            setattr(self, field, None)
+
+        parser._expect(yaml.MappingStartEvent)
+
+        self._read_fields()
+
+    def finish(self):
+        '''Skip whatever the caller didn't consume of this cell.'''
+
+        if not self.finished:
+            for context in self.structure:
+                pass
+
+    def _read_fields(self):
+
+        loader = self.parser.loader
+
+        while not loader.check_event(yaml.MappingEndEvent):
+
+            key = self.parser._scalar()
+
+            if key not in self.FIELDS:
+                raise InvalidKeyException(
+                    'The key "{}" is not recognized.'.format(key)
+                )
+
+            if key == 'structure':
+                self.structure = self._contexts()
+                return
+
+            setattr(
+                self,
+                key,
+                loader.construct_document(self.parser._compose())
+            )
+
+        loader.get_event()
+
+        self.finished = True
+
+    def _contexts(self):
+
+        loader = self.parser.loader
+
+        self.parser._expect(yaml.SequenceStartEvent)
+
+        while not loader.check_event(yaml.SequenceEndEvent):
+
+            yield self.make_context(
+                loader.construct_document(self.parser._compose())
+            )
+
+        loader.get_event()
+
+        self._read_fields()
+
 
 class BlockOperation(Enum):
 
@@ -178,6 +546,9 @@ class Facing(Enum):
     @classmethod
     def resolve(clz, value):
 
+        if isinstance(value, clz):
+            return value
+
         SHORTHAND_MAP = {
             'N': clz.North,
             'E': clz.East,
@@ -195,20 +566,26 @@ class Facing(Enum):
 
 class Context:
 
-    values = {}              # block entity data
-    meta = {}                # user-supplied key/value pairs
-    operation = BlockOperation.Replace
-    material = None           # material i.e. gravel, dirt, wool.red, wood.oak
-    x = 0
-    y = 0
-    z = 0
-    facing = None     # cardinal directions plus UP, DOWN, and OTHER
-
-    # type (and implied order) of attribs that appear after x,y,z in
-    # tuple format
-    item_suffix = None
-
-    items = []
+    __slots__ = (
+        'values',       # block entity data
+        'meta',         # user-supplied key/value pairs
+        'operation',
+        'material',     # material i.e. gravel, dirt, wool.red, wood.oak
+        'x',
+        'y',
+        'z',
+        'facing',       # cardinal directions plus UP, DOWN, and OTHER
+
+        # type (and implied order) of attribs that appear after x,y,z in
+        # tuple format
+        'item_suffix',
+
+        'repeat',       # a Repeat, or None
+        'nested',       # whether items holds nested contexts
+
+        '_items',
+        '_arrays'
+    )
 
     def __init__(self, data):
 
@@ -232,29 +609,455 @@ class Context:
 
         self.item_suffix = ItemSuffix(data.get('item_suffix'))
 
-        self.items = []
+        self.repeat = Repeat.parse(data.get('repeat'))
+
+        self._items = []
+        self._arrays = None
 
         # load items
-        for item in data.get('items', []):
+        items = data.get('items', [])
 
-            if isinstance(item, str):
-                self.add_item(item)
-            else:
-                self.items.append(Context(item['context']))
+        self.nested = not all(isinstance(item, str) for item in items)
+
+        if not self.nested:
+
+            # the common case - decode everything in one pass and only
+            # create Item objects if someone asks for them
+            self._arrays = parse_items(items, self.item_suffix)
+            self._items = None
+
+        else:
+
+            for item in items:
+
+                if isinstance(item, str):
+                    self.add_item(item)
+                else:
+                    self._items.append(Context(item['context']))
+
+    @property
+    def items(self):
+
+        if self._items is None:
+            self._items = items_from_arrays(*self._arrays)
+
+        return self._items
+
+    @items.setter
+    def items(self, value):
+
+        self._items = value
+        self._arrays = None
 
     def add_item(self, data):
 
         item = Item(self.item_suffix, data)
         self.items.append(item)
 
+        self._arrays = None
 
-class Item:
+    def item_arrays(self):
+        '''Return the items as (coordinates, suffixes).
+
+        coordinates is an (n, 3) int32 array of the items' x, y, z. suffixes
+        holds a (codes, values) pair per item_suffix field: values is a list
+        of the distinct suffix strings with values[0] = None, and codes maps
+        each item to one of them (0 for items without suffix values).
+
+        Nested contexts are left out; see parts().'''
+
+        if self._arrays is None:
+            self._arrays = item_arrays(
+                [item for item in self.items if not isinstance(item, Context)],
+                self.item_suffix.fields
+            )
+
+        return self._arrays
+
+    def parts(self):
+        '''Yield the items in document order as item_arrays() style
+        (coordinates, suffixes) pairs for runs of items, and the nested
+        contexts between them.'''
+
+        if not self.nested:
+            yield self.item_arrays()
+            return
+
+        run = []
+
+        for item in self.items:
+
+            if not isinstance(item, Context):
+                run.append(item)
+                continue
+
+            if run:
+                yield item_arrays(run, self.item_suffix.fields)
+                run = []
+
+            yield item
+
+        if run:
+            yield item_arrays(run, self.item_suffix.fields)
+
+
+class Repeat:
+    '''A context's "repeat: {count: n, step: x,y,z}": its items (and nested
+    contexts) are placed count times, each copy moved by step from the one
+    before. step may also be given as [x, y, z] or as an x/y/z mapping.'''
+
+    __slots__ = ('count', 'step')
+
+    AXES = ('x', 'y', 'z')
+
+    def __init__(self, count, step):
+
+        self.count = count
+        self.step = step
+
+    @classmethod
+    def parse(clz, data):
+
+        if data is None:
+            return None
+
+        try:
+
+            count = int(data['count'])
+            step = data.get('step', (0, 0, 0))
+
+            if isinstance(step, str):
+                step = step.split(',')
+            elif isinstance(step, dict):
+                step = [step.get(axis, 0) for axis in clz.AXES]
+
+            step = tuple(int(value) for value in step)
+
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise BadRepeatException('Bad repeat "{}" ({}).'.format(data, e))
+
+        if count < 0 or len(step) != 3:
+            raise BadRepeatException(
+                'A repeat needs a count of at least 0 and an x,y,z step '
+                '(got "{}").'.format(data)
+            )
+
+        return clz(count, step)
+
+    @property
+    def data(self):
+        '''The document form of the repeat.'''
+
+        return {'count': self.count, 'step': list(self.step)}
+
+    def offsets(self):
+        '''Yield the (x, y, z) offset of every copy.'''
+
+        dx, dy, dz = self.step
+
+        for n in range(self.count):
+            yield n * dx, n * dy, n * dz
+
+    def expand(self, blocks):
+        '''Repeat a BLOCK_DTYPE array count times, moving each copy.'''
+
+        retval = np.tile(blocks, self.count)
+
+        copies = np.repeat(
+            np.arange(self.count, dtype=np.int32),
+            len(blocks)
+        )
+
+        for axis, step in zip(self.AXES, self.step):
+
+            if step:
+                retval[axis] += copies * np.int32(step)
+
+        return retval
+
+
+def item_arrays(items, fields):
+    '''Build Context.item_arrays() style arrays from Item objects.'''
+
+    count = len(items)
+
+    coordinates = np.array(
+        [(item.x, item.y, item.z) for item in items],
+        dtype=np.int32
+    ).reshape(count, 3)
+
+    suffixes = []
+
+    for n, field_name in enumerate(fields):
+
+        values = LookupTable([None])
+
+        codes = np.fromiter(
+            (
+                values.intern(item.suffix_values[n])
+                if item.suffix_values else 0
+                for item in items
+            ),
+            dtype=np.uint32,
+            count=count
+        )
+
+        suffixes.append((codes, values.values))
+
+    return coordinates, suffixes
+
+
+def items_from_arrays(coordinates, suffixes):
+    '''The inverse of item_arrays().'''
+
+    retval = []
+
+    for row, (x, y, z) in enumerate(coordinates.tolist()):
+
+        suffix_values = ()
+
+        if suffixes and suffixes[0][0][row]:
+            suffix_values = [values[codes[row]] for codes, values in suffixes]
+
+        retval.append(Item.make(x, y, z, suffix_values))
+
+    return retval
+
+
+def parse_items(strings, item_suffix):
+    '''Decode tuple-format item strings ("x,y,z[,suffix...]") in bulk.
+
+    Returns the same (coordinates, suffixes) pair as Context.item_arrays()
+    and raises the same exceptions as building an Item from every string
+    would. Anything that isn't plainly formatted (tabs, "+1", non-ASCII
+    digits, ...) is handed to Item so that the two never disagree.'''
+
+    count = len(strings)
+    fields = item_suffix.fields
 
-    x = 0
-    y = 0
-    z = 0
+    if not count:
+        return item_arrays([], fields)
 
-    suffix_values = []
+    raw = '\n'.join(strings).encode('utf-8') + b'\n'
+    text = np.frombuffer(raw, dtype=np.uint8)
+
+    is_newline = text == ord('\n')
+
+    newlines = np.flatnonzero(is_newline)
+    commas = np.flatnonzero(text == ord(','))
+
+    # a comma's line number is the count of newlines in front of it
+    comma_lines = np.cumsum(is_newline, dtype=np.int32)[commas]
+    comma_counts = np.bincount(comma_lines, minlength=count)
+
+    if len(newlines) != count or comma_counts.min() < 2:
+        return _parse_items_slowly(strings, item_suffix)
+
+    # index (into commas) of the first comma on every line
+    first = np.zeros(count, dtype=np.int64)
+    np.cumsum(comma_counts[:-1], out=first[1:])
+
+    has_suffix = comma_counts > 2
+    suffix_lines = np.flatnonzero(has_suffix)
+
+    third = commas[np.minimum(first + 2, len(commas) - 1)]
+
+    # blank out the suffixes and turn line breaks into separators so that
+    # numpy can parse all of the coordinates in one call
+    blanks = np.zeros(len(text) + 1, dtype=np.int8)
+    blanks[third[suffix_lines]] = 1
+    blanks[newlines[suffix_lines]] = -1
+
+    coordinate_text = text.copy()
+    coordinate_text[np.cumsum(blanks[:-1], dtype=np.int8).view(bool)] = \
+        ord(' ')
+    coordinate_text[newlines] = ord(',')
+
+    values = _parse_ints(coordinate_text, 3 * count)
+
+    if values is None:
+        return _parse_items_slowly(strings, item_suffix)
+
+    coordinates = values.astype(np.int32).reshape(count, 3)
+
+    if not len(suffix_lines):
+        return coordinates, [
+            (np.zeros(count, dtype=np.uint32), [None]) for _ in fields
+        ]
+
+    # intern the raw suffix text so that each distinct value is decoded and
+    # checked only once (in order of first appearance, so the item that
+    # raises is the same one Item would have raised on)
+    suffix_codes, distinct = _intern_ranges(
+        raw,
+        text,
+        third[suffix_lines] + 1,
+        newlines[suffix_lines]
+    )
+
+    parsed = [item_suffix.parse(value.decode('utf-8').strip())
+              for value in distinct]
+
+    suffixes = []
+
+    for n in range(len(fields)):
+
+        table = LookupTable([None])
+
+        lookup = np.array(
+            [table.intern(values[n]) for values in parsed],
+            dtype=np.uint32
+        )
+
+        codes = np.zeros(count, dtype=np.uint32)
+        codes[suffix_lines] = lookup[suffix_codes]
+
+        suffixes.append((codes, table.values))
+
+    return coordinates, suffixes
+
+
+def _parse_items_slowly(strings, item_suffix):
+
+    return item_arrays(
+        [Item(item_suffix, data) for data in strings],
+        item_suffix.fields
+    )
+
+
+def _intern_ranges(raw, text, starts, ends, max_width=64):
+    '''Give every raw[starts[i]:ends[i]] a code, numbering the distinct
+    values in order of first appearance. Returns (codes, distinct values).'''
+
+    lengths = ends - starts
+    width = int(lengths.max())
+
+    if width <= max_width:
+
+        # read the values eight bytes at a time through an overlapping
+        # (stride 1) uint64 view of the text
+        padded = np.zeros(len(text) + width + 8, dtype=np.uint8)
+        padded[:len(text)] = text
+
+        words = np.ndarray(
+            (len(text) + width + 1,),
+            dtype='<u8',
+            buffer=padded,
+            strides=(1,)
+        )
+
+        def word(n):
+
+            remaining = np.clip(lengths - 8 * n, 0, 8).astype(np.uint64)
+
+            # keep only the bytes that belong to the value
+            mask = np.where(
+                remaining == 8,
+                np.uint64(0xffffffffffffffff),
+                (np.uint64(1) << (remaining * np.uint64(8))) - np.uint64(1)
+            )
+
+            return words[starts + 8 * n] & mask
+
+        word_count = (width + 7) // 8
+
+        keys = lengths.astype(np.uint64)
+
+        for n in range(word_count):
+            keys = keys * np.uint64(1099511628211) + word(n)
+
+        _, first, inverse = np.unique(
+            keys,
+            return_index=True,
+            return_inverse=True
+        )
+        inverse = inverse.reshape(-1)
+
+        # a hash collision would merge different values - check for it
+        collision = not np.array_equal(lengths, lengths[first][inverse])
+
+        for n in range(word_count):
+
+            if collision:
+                break
+
+            values = word(n)
+            collision = not np.array_equal(values, values[first][inverse])
+
+        if not collision:
+
+            order = np.argsort(first)
+
+            rank = np.empty_like(order)
+            rank[order] = np.arange(len(order))
+
+            distinct = [
+                raw[start:end]
+                for start, end in zip(
+                    starts[first[order]].tolist(),
+                    ends[first[order]].tolist()
+                )
+            ]
+
+            return rank[inverse].astype(np.uint32), distinct
+
+    table = {}
+
+    codes = np.fromiter(
+        (
+            table.setdefault(raw[start:end], len(table))
+            for start, end in zip(starts.tolist(), ends.tolist())
+        ),
+        dtype=np.uint32,
+        count=len(starts)
+    )
+
+    return codes, list(table)
+
+
+def _parse_ints(text, count):
+    '''Parse exactly count comma separated integers out of text (a uint8
+    array), accepting only what int() would. Returns None otherwise.'''
+
+    is_sign = (text == ord('-')) | (text == ord('+'))
+    is_space = (text == ord(' ')) | ((text >= ord('\t')) & (text <= ord('\r')))
+
+    # numpy reads "- 1" as -1, int() refuses it
+    if np.any(is_sign[:-1] & is_space[1:]):
+        return None
+
+    # numpy reads a field without digits ("", " ", "-") as 0, int() refuses
+    # it too
+    is_digit = (text >= ord('0')) & (text <= ord('9'))
+    fields = np.cumsum(text == ord(','))[is_digit]
+
+    if np.bincount(fields, minlength=count)[:count].min() == 0:
+        return None
+
+    with warnings.catch_warnings():
+
+        # numpy only warns (and stops) when it meets something unparseable
+        warnings.simplefilter('error', DeprecationWarning)
+
+        try:
+            retval = np.fromstring(text.tobytes(), dtype=np.int64, sep=',')
+        except (DeprecationWarning, ValueError):
+            return None
+
+    if len(retval) != count:
+        return None
+
+    limits = np.iinfo(np.int32)
+
+    if count and (retval.min() < limits.min or retval.max() > limits.max):
+        return None
+
+    return retval
+
+
+class Item:
+
+    __slots__ = ('x', 'y', 'z', 'suffix_values')
 
     def __init__(self, suffix, data):
 
@@ -263,19 +1066,34 @@ class Item:
         self.x, self.y, self.z = [int(i) for i in items[0:3]]
         remainder = items[3:]
 
+        self.suffix_values = ()
+
         if remainder:
 
             self.suffix_values = suffix.parse(remainder[0].strip())
 
+    @classmethod
+    def make(clz, x, y, z, suffix_values=()):
+        '''Create an Item from already decoded values.'''
+
+        retval = clz.__new__(clz)
+
+        retval.x = x
+        retval.y = y
+        retval.z = z
+        retval.suffix_values = suffix_values
+
+        return retval
+
     def __str__(self):
-        return '<{}.{} object at 0x{:x} (x={}, y={}, z={}, facing={})>'.format(
+        return '<{}.{} object at 0x{:x} (x={}, y={}, z={}, suffix={})>'.format(
             self.__module__,
             self.__class__.__name__,
             id(self),
             self.x,
             self.y,
             self.z,
-            self.facing
+            self.suffix_values
         )
 
 
@@ -334,15 +1152,28 @@ class ItemSuffix:
 
 class GeneratorContext:
 
-    x = 0
-    y = 0
-    z = 0
-    _facing = None
-    material = None
-    operation = None
-    values = []
+    __slots__ = (
+        'x',
+        'y',
+        'z',
+        '_facing',
+        'material',
+        'operation',
+        'values',
+        'item_suffix'
+    )
 
-    item_suffix = None
+    def __init__(self):
+
+        self.x = 0
+        self.y = 0
+        self.z = 0
+        self._facing = None
+        self.material = None
+        self.operation = None
+        self.values = []
+
+        self.item_suffix = None
 
     def construct(self, context):
 
@@ -352,13 +1183,16 @@ class GeneratorContext:
         retval.y = self.y + context.y
         retval.z = self.z + context.z
 
-        retval.facing = context.facing
+        # nested contexts inherit what they don't set themselves
+        retval.facing = self.facing if context.facing is None \
+            else context.facing
 
-        retval.material = context.material
+        retval.material = self.material if context.material is None \
+            else context.material
 
         retval.operation = context.operation
 
-        retval.values = context.values
+        retval.values = context.values or self.values
 
         retval.item_suffix = context.item_suffix
 
@@ -378,7 +1212,7 @@ class GeneratorContext:
 
         retval.operation = self.operation
 
-        retval.values = [x for x in self.values]
+        retval.values = copy.copy(self.values)
 
         retval.item_suffix = self.item_suffix
 
@@ -412,9 +1246,13 @@ class GeneratorContext:
 
 class GeneratorItem:
 
-    x = 0
-    y = 0
-    z = 0
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self):
+
+        self.x = 0
+        self.y = 0
+        self.z = 0
 
     @classmethod
     def construct(clz, gencontext, item):
@@ -458,7 +1296,59 @@ class ParseGenerator:
 
     def generate(self):
 
-        gencons = []
+        gc = GeneratorContext()
+
+        gc.x = self.x_offset
+        gc.y = self.y_offset
+        gc.z = self.z_offset
+
+        for cell in self.parser.cells:
+
+            for context in cell.structure:
+
+                yield from self._generate(gc, context)
+
+    def _generate(self, parent, context):
+
+        items = context.items
+
+        for gencontext in self._copies(parent.construct(context), context):
+
+            for item in items:
+
+                if isinstance(item, Context):
+                    yield from self._generate(gencontext, item)
+                else:
+                    yield GeneratorItem.construct(gencontext, item)
+
+    @staticmethod
+    def _copies(gencontext, context):
+        '''The generator contexts of a context's copies, made as they are
+        needed.'''
+
+        if context.repeat is None:
+            yield gencontext
+            return
+
+        for dx, dy, dz in context.repeat.offsets():
+
+            retval = gencontext.clone()
+
+            retval.x += dx
+            retval.y += dy
+            retval.z += dz
+
+            yield retval
+
+    def generate_arrays(self):
+        '''Generate every block into a single BlockArrays buffer.
+
+        Unlike generate() no per-block objects are created; each context is
+        converted in bulk.'''
+
+        materials = LookupTable()
+        facings = LookupTable()
+        operations = LookupTable()
 
         gc = GeneratorContext()
 
@@ -466,16 +1356,235 @@ class ParseGenerator:
         gc.y = self.y_offset
         gc.z = self.z_offset
 
-        gencons.append(gc)
+        chunks = []
 
         for cell in self.parser.cells:
 
             for context in cell.structure:
 
-                gencons.append(gencons[-1].construct(context))
+                chunks.append(
+                    self._context_arrays(
+                        gc.construct(context),
+                        context,
+                        materials,
+                        facings,
+                        operations
+                    )
+                )
+
+        if chunks:
+            blocks = np.concatenate(chunks)
+        else:
+            blocks = np.zeros(0, dtype=BLOCK_DTYPE)
+
+        return BlockArrays(blocks, materials, facings, operations)
+
+    @classmethod
+    def _context_arrays(clz, gencontext, context, materials, facings,
+                        operations):
+        '''The blocks of a context (generated through gencontext), its
+        nested contexts and its repeats.'''
+
+        chunks = []
+
+        for part in context.parts():
+
+            if isinstance(part, Context):
+                chunks.append(clz._context_arrays(
+                    gencontext.construct(part),
+                    part,
+                    materials,
+                    facings,
+                    operations
+                ))
+            else:
+                chunks.append(clz._item_arrays(
+                    gencontext,
+                    part,
+                    materials,
+                    facings,
+                    operations
+                ))
+
+        if len(chunks) == 1:
+            retval = chunks[0]
+        elif chunks:
+            retval = np.concatenate(chunks)
+        else:
+            retval = np.zeros(0, dtype=BLOCK_DTYPE)
+
+        if context.repeat is not None:
+            retval = context.repeat.expand(retval)
+
+        return retval
+
+    @staticmethod
+    def _item_arrays(gencontext, arrays, materials, facings, operations):
+
+        coordinates, suffixes = arrays
+
+        retval = np.empty(len(coordinates), dtype=BLOCK_DTYPE)
+
+        for n, axis in enumerate(('x', 'y', 'z')):
+
+            retval[axis] = coordinates[:, n]
+            retval[axis] += getattr(gencontext, axis)
+
+        retval['operation'] = operations.intern(gencontext.operation)
+
+        defaults = {
+            'material': materials.intern(gencontext.material),
+            'facing': facings.intern(gencontext.facing)
+        }
+
+        retval['material'] = defaults['material']
+        retval['facing'] = defaults['facing']
+
+        # per-item overrides declared through the context's item_suffix
+        for field_name, (codes, values) in zip(
+            gencontext.item_suffix.fields,
+            suffixes
+        ):
+
+            if field_name == 'facing':
+                interned = [facings.intern(Facing.resolve(value))
+                            for value in values[1:]]
+            else:
+                interned = [materials.intern(value) for value in values[1:]]
+
+            # code 0 means the item has no suffix values
+            lookup = np.array([defaults[field_name]] + interned)
+
+            retval[field_name] = lookup[codes]
+
+        return retval
+
+
+class LookupTable:
+    '''An append-only table that maps values to small integer codes.'''
+
+    def __init__(self, values=()):
+
+        self.values = []
+        self.codes = {}
+
+        for value in values:
+            self.intern(value)
+
+    def intern(self, value):
+
+        try:
+            return self.codes[value]
+        except KeyError:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+
+def code_dtype(count):
+    '''The smallest unsigned dtype for codes into a table of count
+    values.'''
+
+    return np.uint16 if count <= 1 << 16 else np.uint32
+
+
+def last_occurrences(coordinates):
+    '''Indexes (in order) of the last block at each distinct coordinate.'''
+
+    count = len(coordinates)
+
+    if not count:
+        return np.zeros(0, dtype=np.intp)
+
+    coordinates = coordinates.astype(np.int64)
+    spans = coordinates.max(axis=0) - coordinates.min(axis=0) + 1
+
+    volume = int(spans[0]) * int(spans[1]) * int(spans[2])
+
+    if volume <= DENSE_FACTOR * count:
+
+        keys = np.ravel_multi_index(
+            (coordinates - coordinates.min(axis=0)).T, spans
+        )
+
+        if np.bincount(keys, minlength=volume).max() <= 1:
+            return np.arange(count)
+
+    # sort (newest first) and keep the first of every run of equal rows
+    order = np.lexsort(coordinates[::-1].T[::-1])
+
+    ordered = coordinates[::-1][order]
+
+    first = np.ones(count, dtype=bool)
+    first[1:] = (ordered[1:] != ordered[:-1]).any(axis=1)
+
+    return np.sort(count - 1 - order[first])
+
+
+class BlockArrays:
+    '''Columnar representation of generated blocks.
+
+    "blocks" is a structured array of BLOCK_DTYPE rows (in generation order);
+    its material/facing/operation columns index into the accompanying
+    LookupTables.'''
+
+    def __init__(self, blocks, materials, facings, operations):
+
+        self.blocks = blocks
+        self.materials = materials
+        self.facings = facings
+        self.operations = operations
+
+    def __len__(self):
+        return len(self.blocks)
+
+    @property
+    def x(self):
+        return self.blocks['x']
+
+    @property
+    def y(self):
+        return self.blocks['y']
+
+    @property
+    def z(self):
+        return self.blocks['z']
+
+    @property
+    def coordinates(self):
+        '''An (n, 3) int32 array of x, y, z.'''
+
+        return np.column_stack((self.x, self.y, self.z))
+
+    def generate(self):
+        '''Yield (GeneratorContext, GeneratorItem) pairs like
+        ParseGenerator.generate(): blocks in the same state share one
+        GeneratorContext and contexts' values aren't carried.'''
+
+        contexts = {}
+
+        for x, y, z, material, facing, operation in self.blocks.tolist():
+
+            key = material, facing, operation
+
+            if key not in contexts:
+
+                context = contexts[key] = GeneratorContext()
 
-                for item in context.items:
+                context.material = self.materials[material]
+                context.facing = self.facings[facing]
+                context.operation = self.operations[operation]
 
-                    yield GeneratorItem.construct(gencons[-1], item)
+            item = GeneratorItem()
+            item.x, item.y, item.z = x, y, z
 
-                gencons.pop()
+            yield contexts[key], item
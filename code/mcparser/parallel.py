@@ -0,0 +1,421 @@
+'''
+    Parallel generation of mc-sdf-1 YAML documents.
+
+    Loading the YAML is by far the largest part of reading a document (for
+    a million items, several seconds against a fraction of a second to
+    build the cells and generate the blocks), so the work is split on the
+    document's text: the "cells" block sequence is cut into cell entries
+    and large cells into their "structure" context entries, and each
+    worker process loads, parses and generates a run of them. Workers
+    return a BLOCK_DTYPE array plus the material/facing/operation tables it
+    indexes, which are merged in document order, so the result is the same
+    as ParseGenerator.generate_arrays() on the whole document.
+
+    Documents whose layout isn't recognised (a flow style "cells" list,
+    for instance) are generated serially, as are documents with anchors or
+    aliases: an alias can refer to an anchor in another worker's text. So
+    are documents whose pieces don't load once split, which happens when
+    a flow collection or a quoted scalar continues on a line indented less
+    than the entry it belongs to.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import re
+
+import numpy as np
+import yaml
+
+from mcparser import (
+    BLOCK_DTYPE,
+    BlockArrays,
+    Cell,
+    GeneratorContext,
+    LookupTable,
+    Parser,
+    ParseGenerator
+)
+
+
+CELL = 'cell'
+CONTEXT = 'context'
+
+# each worker gets about this many tasks, to even out their sizes
+TASKS_PER_WORKER = 4
+
+# cells larger than this (in characters) are split into their contexts
+SPLIT_SIZE = 1 << 20
+
+LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+BASE_REGEX = re.compile('^{}:[ \\t]*(#.*)?$'.format(re.escape(
+    Parser.BASE_NAME
+)), re.M)
+
+# an anchor or alias token (this also matches some that are really inside
+# strings or comments, which only costs the parallelism)
+ANCHOR_REGEX = re.compile(
+    '(?:^|[ \\t\\[{,:])[&*][^ \\t\\n,\\[\\]{}]', re.M
+)
+
+# the indentation and first character of a line with content
+CONTENT_REGEX = re.compile('^( *)([^ \\n#])', re.M)
+
+
+def _key_regex(key, indent):
+
+    return re.compile(
+        '^ {%d}%s:[ \\t]*(#.*)?$' % (indent, re.escape(key)), re.M
+    )
+
+
+def _content(text, pos):
+    '''(indent, position) of the first character of the next line with
+    content at or after pos, or None.'''
+
+    match = CONTENT_REGEX.search(text, pos)
+
+    if match is None:
+        return None
+
+    return len(match.group(1)), match.start(2)
+
+
+def block_sequence(text, pos, end, min_indent):
+    '''Return (entries, sequence end) for the block sequence that starts on
+    the next line with content after pos (and before end): entries are the
+    (start, end) text spans of its entries, from the start of their line.
+    Returns None if no block sequence indented at least min_indent starts
+    there.'''
+
+    content = _content(text, pos)
+
+    if content is None or content[1] >= end:
+        return None
+
+    column, first = content
+
+    if column < min_indent or not text.startswith(('- ', '-\n'), first):
+        return None
+
+    # the sequence ends at the first line with content that is indented
+    # less than its entries, or as much but isn't an entry (the patterns
+    # start with the newline, which searches much faster than ^)
+    ending = [' {%d}(?!-[ \\n])[^ \\n#]' % column]
+
+    if column:
+        ending.append(' {0,%d}[^ \\n#]' % (column - 1))
+
+    match = re.compile('\\n(?:{})'.format('|'.join(ending))).search(
+        text, first, end
+    )
+    stop = end if match is None else match.start() + 1
+
+    starts = [
+        m.start() + 1
+        for m in re.compile('\\n {%d}-[ \\n]' % column).finditer(
+            text, first - column - 1, stop
+        )
+    ]
+
+    return list(zip(starts, starts[1:] + [stop])), stop
+
+
+class DocumentLayout:
+    '''Where the cells (and the contexts of large cells) of a YAML
+    document's text are.
+
+    header is the document with an empty cells list, units the document
+    ordered (kind, start, end) spans of cell and context entries and
+    cell_heads, for every split cell, the text of the cell without its
+    structure (so its other fields can still be checked).'''
+
+    def __init__(self, text, split_size=SPLIT_SIZE):
+
+        self.text = text
+        self.header = None
+        self.units = []
+        self.cell_heads = []
+
+        self._find(split_size)
+
+    @property
+    def recognised(self):
+        return self.header is not None
+
+    def _find(self, split_size):
+
+        text = self.text
+
+        base = BASE_REGEX.search(text)
+
+        if base is None or ANCHOR_REGEX.search(text):
+            return
+
+        content = _content(text, base.end())
+
+        if content is None or content[0] == 0:
+            return
+
+        indent = content[0]
+
+        key = _key_regex('cells', indent).search(text, base.end())
+
+        if key is None:
+            return
+
+        sequence = block_sequence(text, key.end(), len(text), indent)
+
+        if sequence is None:
+            return
+
+        cells, stop = sequence
+
+        for start, end in cells:
+
+            if end - start <= split_size or not self._split(start, end):
+                self.units.append((CELL, start, end))
+
+        self.header = self._without(0, key, stop, len(text))
+
+    def _split(self, start, end):
+
+        text = self.text
+
+        content = _content(text, text.index('-', start) + 1)
+
+        if content is None or content[1] >= end:
+            return False
+
+        line_end = text.find('\n', start)
+
+        if not re.match('- {}:[ \\t]*(#.*)?$'.format(CELL),
+                        text[text.index('-', start):line_end]):
+            return False
+
+        # the cell's fields start on the next line
+        indent = content[0]
+
+        key = _key_regex('structure', indent).search(text, start, end)
+
+        if key is None:
+            return False
+
+        sequence = block_sequence(text, key.end(), end, indent)
+
+        if sequence is None:
+            return False
+
+        contexts, stop = sequence
+
+        self.cell_heads.append(self._without(start, key, stop, end))
+
+        self.units.extend((CONTEXT, s, e) for s, e in contexts)
+
+        return True
+
+    def _without(self, start, key, stop, end):
+        '''The text from start to end with the sequence under key (which
+        ends at stop) emptied.'''
+
+        return '{}{} []\n{}'.format(
+            self.text[start:key.start()],
+            self.text[key.start():key.end()].split('#')[0].rstrip(),
+            self.text[stop:end]
+        )
+
+    def tasks(self, count):
+        '''Split the units into about count runs of similar size; each is a
+        list of (kind, text) blocks of consecutive entries.'''
+
+        if not self.units:
+            return []
+
+        total = sum(end - start for _, start, end in self.units)
+        target = max(total // count, 1)
+
+        retval = []
+        task = []
+        size = 0
+
+        for kind, start, end in self.units:
+
+            if task and task[-1][0] == kind and task[-1][2] == start:
+                task[-1][2] = end
+            else:
+                task.append([kind, start, end])
+
+            size += end - start
+
+            if size >= target:
+                retval.append(task)
+                task = []
+                size = 0
+
+        if task:
+            retval.append(task)
+
+        return [
+            [(kind, self.text[start:end]) for kind, start, end in task]
+            for task in retval
+        ]
+
+
+def _generate_task(task, offset):
+    '''Worker: generate a run of cell/context entries; returns (blocks,
+    materials, facings, operations) with the tables as lists.'''
+
+    gc = GeneratorContext()
+    gc.x, gc.y, gc.z = offset
+
+    materials = LookupTable()
+    facings = LookupTable()
+    operations = LookupTable()
+
+    chunks = []
+
+    for kind, text in task:
+
+        entries = yaml.load(text, Loader=LOADER) or []
+
+        if kind == CELL:
+            contexts = [
+                context
+                for entry in entries
+                for context in Cell(list(entry.values())[0]).structure or []
+            ]
+        else:
+            contexts = [Cell.make_context(entry) for entry in entries]
+
+        for context in contexts:
+
+            chunks.append(ParseGenerator._context_arrays(
+                gc.construct(context),
+                context,
+                materials,
+                facings,
+                operations
+            ))
+
+    blocks = np.concatenate(chunks) if chunks else \
+        np.zeros(0, dtype=BLOCK_DTYPE)
+
+    return blocks, materials.values, facings.values, operations.values
+
+
+def merge_arrays(results):
+    '''Merge (blocks, materials, facings, operations) results, in order,
+    into one BlockArrays.'''
+
+    tables = {
+        'material': LookupTable(),
+        'facing': LookupTable(),
+        'operation': LookupTable()
+    }
+
+    chunks = []
+
+    for blocks, *values in results:
+
+        for (name, table), table_values in zip(tables.items(), values):
+
+            lookup = np.array(
+                [table.intern(value) for value in table_values] or [0],
+                dtype=blocks.dtype[name]
+            )
+
+            blocks[name] = lookup[blocks[name]]
+
+        chunks.append(blocks)
+
+    blocks = np.concatenate(chunks) if chunks else \
+        np.zeros(0, dtype=BLOCK_DTYPE)
+
+    return BlockArrays(
+        blocks,
+        tables['material'],
+        tables['facing'],
+        tables['operation']
+    )
+
+
+class ParallelGenerator:
+    '''A ParseGenerator for YAML document text that generates its cells in
+    up to "workers" processes (one per CPU by default). "parser" is a
+    Parser for the document's header (version and meta).'''
+
+    def __init__(self, text, workers=None, split_size=SPLIT_SIZE):
+
+        self.workers = workers or os.cpu_count() or 1
+
+        self.x_offset = 0
+        self.y_offset = 0
+        self.z_offset = 0
+
+        self.text = text
+        self.layout = DocumentLayout(text, split_size)
+        self.serial = not self.layout.recognised
+
+        if not self.serial:
+
+            try:
+
+                self.parser = Parser(
+                    yaml.load(self.layout.header, Loader=LOADER)
+                )
+
+                for head in self.layout.cell_heads:
+                    Cell(list(yaml.load(head, Loader=LOADER)[0].values())[0])
+
+            except yaml.YAMLError:
+                self.serial = True
+
+        if self.serial:
+            self.parser = Parser(yaml.load(text, Loader=LOADER))
+
+    @classmethod
+    def from_file(clz, filename, workers=None):
+
+        with open(filename, 'r') as fin:
+            return clz(fin.read(), workers)
+
+    @property
+    def offset(self):
+        return self.x_offset, self.y_offset, self.z_offset
+
+    def generate_arrays(self):
+        '''Generate every block into a single BlockArrays buffer, in
+        document order.'''
+
+        if not self.serial:
+
+            try:
+                return merge_arrays(self._results())
+            except yaml.YAMLError:
+                self.serial = True
+                self.parser = Parser(yaml.load(self.text, Loader=LOADER))
+
+        gen = ParseGenerator(self.parser)
+        gen.x_offset, gen.y_offset, gen.z_offset = self.offset
+
+        return gen.generate_arrays()
+
+    def _results(self):
+
+        tasks = self.layout.tasks(self.workers * TASKS_PER_WORKER)
+
+        if self.workers == 1 or len(tasks) <= 1:
+            return [_generate_task(task, self.offset) for task in tasks]
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(
+                _generate_task, tasks, [self.offset] * len(tasks)
+            ))
+
+    def generate(self):
+        '''Yield (GeneratorContext, GeneratorItem) pairs like
+        ParseGenerator.generate(), built from generate_arrays(): blocks
+        in the same state share one GeneratorContext and contexts' values
+        aren't carried.'''
+
+        yield from self.generate_arrays().generate()
@@ -0,0 +1,443 @@
+'''
+    sdfb.py compile model.yaml model.sdfb
+
+    A compiled binary companion format for mc-sdf-1 documents.
+
+    Layout (all little-endian):
+
+        header      magic "SDFB", format version (uint16), flags (uint16),
+                    index offset (uint64), index length (uint64)
+        arrays      per run of items: an (n, 3) int16 or int32 coordinate
+                    array, then one code array per item_suffix field; every
+                    array starts on an 8 byte boundary
+        index       UTF-8 JSON holding the document header, the material and
+                    facing string tables and, for every context, its fields
+                    and the offsets/dtypes of its arrays; a context with
+                    nested contexts has "parts" instead, its runs of items
+                    and (recursively) its nested contexts in document order
+
+    SdfbParser memory-maps the file and hands out numpy views of the arrays,
+    so opening a model only costs reading the index.
+'''
+
+import argparse
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from mcparser import (
+    BlockOperation,
+    Cell,
+    Context,
+    Item,
+    ItemSuffix,
+    Parser,
+    ParserException,
+    Repeat,
+    StreamingParser
+)
+
+
+MAGIC = b'SDFB'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<4sHHQQ')
+
+ALIGNMENT = 8
+
+CELL_FIELDS = ('notes', 'meta', 'materials')
+
+
+class BadSdfbException(ParserException):
+    pass
+
+
+def _smallest_dtype(values, candidates):
+
+    if not len(values):
+        return np.dtype(candidates[0])
+
+    low, high = values.min(), values.max()
+
+    for candidate in candidates:
+
+        info = np.iinfo(candidate)
+
+        if info.min <= low and high <= info.max:
+            return np.dtype(candidate)
+
+    raise BadSdfbException('Values out of range for {}.'.format(candidates))
+
+
+class SdfbWriter:
+    '''Writes a parsed mc-sdf-1 document to an .sdfb file, one context at a
+    time (so a StreamingParser input is never fully held in memory).'''
+
+    def __init__(self, fout):
+
+        self.fout = fout
+
+        # index 0 of both tables stands for "not set"
+        self.materials = {None: 0}
+        self.facings = {None: 0}
+
+    def write(self, parser):
+
+        self.fout.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, 0))
+
+        cells = []
+
+        for cell in parser.cells:
+
+            structure = [self._write_context(c) for c in cell.structure]
+
+            cells.append({
+                'fields': {k: getattr(cell, k) for k in CELL_FIELDS},
+                'structure': structure
+            })
+
+        header = {
+            k: v for k, v in parser.data[parser.BASE_NAME].items()
+            if k != 'cells'
+        }
+
+        index = {
+            'header': header,
+            'materials': self._table(self.materials),
+            'facings': self._table(self.facings),
+            'cells': cells
+        }
+
+        index_offset = self.fout.tell()
+        index_data = json.dumps(index, separators=(',', ':')).encode('utf-8')
+
+        self.fout.write(index_data)
+
+        self.fout.seek(0)
+        self.fout.write(HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            0,
+            index_offset,
+            len(index_data)
+        ))
+
+    @staticmethod
+    def _table(codes):
+
+        retval = [None] * len(codes)
+
+        for value, code in codes.items():
+            retval[code] = value
+
+        return retval
+
+    def _write_context(self, context):
+
+        retval = {
+            'material': self._intern(self.materials, context.material),
+            'facing': self._intern(self.facings, context.facing),
+            'operation': context.operation.name,
+            'x': context.x,
+            'y': context.y,
+            'z': context.z,
+            'values': context.values,
+            'meta': context.meta,
+            'item_suffix': context.item_suffix.fields,
+            'repeat': context.repeat and context.repeat.data
+        }
+
+        if not context.nested:
+
+            retval.update(self._write_run(context, context.item_arrays()))
+
+        else:
+
+            retval['parts'] = [
+                {'context': self._write_context(part)}
+                if isinstance(part, Context)
+                else self._write_run(context, part)
+                for part in context.parts()
+            ]
+
+        return retval
+
+    def _write_run(self, context, arrays):
+
+        coordinates, suffixes = arrays
+
+        dtype = _smallest_dtype(coordinates, ('<i2', '<i4'))
+
+        retval = {
+            'count': len(coordinates),
+            'coordinates': self._write_array(coordinates.astype(dtype)),
+            'suffixes': []
+        }
+
+        for field_name, (codes, values) in zip(
+            context.item_suffix.fields,
+            suffixes
+        ):
+
+            table = self.materials if field_name == 'material' \
+                else self.facings
+
+            lookup = np.array(
+                [0] + [self._intern(table, value) for value in values[1:]],
+                dtype=np.uint32
+            )
+
+            global_codes = lookup[codes]
+            dtype = _smallest_dtype(global_codes, ('<u1', '<u2', '<u4'))
+
+            retval['suffixes'].append(
+                self._write_array(global_codes.astype(dtype))
+            )
+
+        return retval
+
+    @staticmethod
+    def _intern(table, value):
+
+        return table.setdefault(value, len(table))
+
+    def _write_array(self, array):
+
+        offset = self.fout.tell()
+        padding = -offset % ALIGNMENT
+
+        self.fout.write(b'\x00' * padding)
+        self.fout.write(np.ascontiguousarray(array).tobytes())
+
+        return [offset + padding, array.dtype.str]
+
+
+def compile_document(parser, filename):
+    '''Write parser's document to filename in .sdfb format.'''
+
+    with open(filename, 'wb') as fout:
+
+        SdfbWriter(fout).write(parser)
+
+
+class SdfbContext(Context):
+    '''A Context whose items are views into a memory-mapped .sdfb file.'''
+
+    __slots__ = (
+        'buffer',
+        'materials',
+        'facings',
+        'contents'
+    )
+
+    def __init__(self, data, buffer, materials, facings):
+
+        self.buffer = buffer
+        self.materials = materials
+        self.facings = facings
+
+        self.values = data['values']
+        self.meta = data['meta']
+        self.operation = BlockOperation[data['operation']]
+        self.material = materials[data['material']]
+        self.facing = facings[data['facing']]
+
+        self.x = data['x']
+        self.y = data['y']
+        self.z = data['z']
+
+        self.item_suffix = ItemSuffix(data['item_suffix'])
+
+        self.repeat = Repeat.parse(data.get('repeat'))
+
+        parts = data.get('parts')
+
+        self.nested = parts is not None
+
+        # runs of items (their index entries) and nested SdfbContexts
+        if self.nested:
+            self.contents = [
+                SdfbContext(part['context'], buffer, materials, facings)
+                if 'context' in part else part
+                for part in parts
+            ]
+        else:
+            self.contents = [data]
+
+    def _view(self, location, count):
+
+        offset, dtype = location
+
+        return np.frombuffer(self.buffer, dtype, count, offset)
+
+    def _run_arrays(self, run):
+
+        count = run['count']
+
+        coordinates = self._view(run['coordinates'], count * 3)
+        coordinates = coordinates.reshape(count, 3)
+
+        suffixes = []
+
+        for field_name, location in zip(
+            self.item_suffix.fields,
+            run['suffixes']
+        ):
+
+            table = self.materials if field_name == 'material' \
+                else self.facings
+
+            suffixes.append((self._view(location, count), table))
+
+        return coordinates, suffixes
+
+    def item_arrays(self):
+
+        runs = [
+            self._run_arrays(part) for part in self.contents
+            if not isinstance(part, Context)
+        ]
+
+        if len(runs) == 1:
+            return runs[0]
+
+        coordinates = np.concatenate(
+            [c for c, _ in runs] or [np.zeros((0, 3), dtype=np.int32)]
+        )
+
+        suffixes = [
+            (
+                np.concatenate(
+                    [s[n][0] for _, s in runs] or [np.zeros(0, np.uint32)]
+                ),
+                self.materials if field_name == 'material' else self.facings
+            )
+            for n, field_name in enumerate(self.item_suffix.fields)
+        ]
+
+        return coordinates, suffixes
+
+    def parts(self):
+
+        for part in self.contents:
+
+            if isinstance(part, Context):
+                yield part
+            else:
+                yield self._run_arrays(part)
+
+    @property
+    def items(self):
+        '''Item objects (and nested contexts) built on demand, for
+        ParseGenerator.generate().'''
+
+        retval = []
+
+        for part in self.parts():
+
+            if isinstance(part, Context):
+                retval.append(part)
+                continue
+
+            coordinates, suffixes = part
+
+            for row, (x, y, z) in enumerate(coordinates.tolist()):
+
+                values = [table[codes[row]] for codes, table in suffixes]
+
+                if not any(value is not None for value in values):
+                    values = ()
+
+                retval.append(Item.make(x, y, z, values))
+
+        return retval
+
+
+class SdfbCell(Cell):
+
+    def __init__(self, data, structure):
+
+        self.data = None
+
+        for field in self.FIELDS:
+            setattr(self, field, data['fields'].get(field))
+
+        self.structure = structure
+
+
+class SdfbParser(Parser):
+    '''Reads an .sdfb file through mmap; usable wherever a Parser is.'''
+
+    def __init__(self, filename):
+
+        with open(filename, 'rb') as fin:
+            self.buffer = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.buffer) < HEADER.size:
+            raise BadSdfbException('Truncated file.')
+
+        magic, version, flags, index_offset, index_length = HEADER.unpack(
+            self.buffer[:HEADER.size]
+        )
+
+        if magic != MAGIC:
+            raise BadSdfbException('Not an .sdfb file.')
+
+        if version != FORMAT_VERSION:
+            raise BadSdfbException(
+                'Unsupported .sdfb version {}.'.format(version)
+            )
+
+        self.index = json.loads(
+            self.buffer[index_offset:index_offset + index_length].decode(
+                'utf-8'
+            )
+        )
+
+        super().__init__({self.BASE_NAME: self.index['header']})
+
+    def _build_cells(self):
+
+        materials = self.index['materials']
+        facings = self.index['facings']
+
+        return [
+            SdfbCell(
+                cell,
+                [
+                    SdfbContext(c, self.buffer, materials, facings)
+                    for c in cell['structure']
+                ]
+            )
+            for cell in self.index['cells']
+        ]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Work with compiled (.sdfb) mc-sdf-1 models.'
+    )
+
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    compile_parser = commands.add_parser(
+        'compile',
+        help='compile an mc-sdf-1 YAML document'
+    )
+    compile_parser.add_argument('source')
+    compile_parser.add_argument('target')
+
+    args = parser.parse_args()
+
+    with open(args.source, 'r') as fin:
+
+        compile_document(StreamingParser(fin), args.target)
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,547 @@
+'''
+    spatial.py index model.yaml model.idx
+    spatial.py info model.idx
+    spatial.py overlap first.idx second.idx
+
+    A sparse voxel map of generated blocks, for bounding box, region,
+    duplicate and overlap questions about a model before it is built.
+
+    Space is hashed into 16x16x16 chunks: a dict maps every occupied
+    chunk's (x >> 4, y >> 4, z >> 4) to a flat array of its 4096 cells (in
+    y, z, x order, like an Anvil section), each holding 0 for empty or one
+    more than the code of the block's (material, facing, operation) state.
+    Looking up a point is a dict lookup and an array index; region and
+    overlap queries only visit the chunks involved and work a chunk at a
+    time with whole-array operations.
+
+    Blocks are added in bulk from BlockArrays, so an index can be built up
+    a model (or a cell) at a time. Later blocks replace earlier ones at the
+    same coordinates, as they do in a build, and add() reports where that
+    happened.
+
+    Indexes are saved as compressed .npz files holding the chunk keys, the
+    chunk cells and the state table.
+'''
+
+import argparse
+import json
+
+import numpy as np
+
+from anvil import Box
+from mcparser import (
+    BLOCK_DTYPE,
+    BlockArrays,
+    BlockOperation,
+    Facing,
+    LookupTable,
+    ParseGenerator,
+    StreamingParser
+)
+from sdfb import SdfbParser
+
+
+CHUNK_BITS = 4
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+CHUNK_VOLUME = CHUNK_SIZE ** 3
+
+CELL_DTYPE = np.uint32
+
+FORMAT_VERSION = 1
+
+SDFB_EXTENSION = '.sdfb'
+
+# the x, y, z offset within its chunk of every cell
+CELL_COORDINATES = np.stack(
+    [
+        np.unravel_index(np.arange(CHUNK_VOLUME), (CHUNK_SIZE,) * 3)[n]
+        for n in (2, 0, 1)
+    ],
+    axis=1
+).astype(np.int32)
+
+
+class SpatialIndexException(Exception):
+    pass
+
+
+class BadIndexFileException(SpatialIndexException):
+    pass
+
+
+def cell_index(coordinates):
+    '''The chunk keys ((n, 3) int32) and cell indexes of (n, 3) block
+    coordinates.'''
+
+    coordinates = np.asarray(coordinates, dtype=np.int32)
+
+    local = coordinates & CHUNK_MASK
+
+    cells = (local[:, 1] * CHUNK_SIZE + local[:, 2]) * CHUNK_SIZE + \
+        local[:, 0]
+
+    return coordinates >> CHUNK_BITS, cells
+
+
+class SpatialIndex:
+    '''A chunk-hashed sparse voxel map of blocks and their states.'''
+
+    def __init__(self):
+
+        self.chunks = {}
+        self.states = LookupTable()
+
+        self.count = 0
+
+        self._low = None
+        self._high = None
+
+    @classmethod
+    def from_generator(clz, gen):
+        '''Index everything a ParseGenerator (or ParallelGenerator)
+        generates.'''
+
+        retval = clz()
+        retval.add(gen.generate_arrays())
+
+        return retval
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, point):
+        return self.get(*point) is not None
+
+    def get(self, x, y, z):
+        '''The (material, facing, operation) of the block at x, y, z, or
+        None.'''
+
+        cells = self.chunks.get(
+            (x >> CHUNK_BITS, y >> CHUNK_BITS, z >> CHUNK_BITS)
+        )
+
+        if cells is None:
+            return None
+
+        state = cells[
+            ((y & CHUNK_MASK) * CHUNK_SIZE + (z & CHUNK_MASK)) * CHUNK_SIZE +
+            (x & CHUNK_MASK)
+        ]
+
+        return self.states[state - 1] if state else None
+
+    @property
+    def bbox(self):
+        '''The Box around every block added (None when empty).
+
+        Blocks are never removed, so this is kept as they are added.'''
+
+        if self._low is None:
+            return None
+
+        return Box(*self._low, *self._high)
+
+    def _state_codes(self, arrays):
+
+        blocks = arrays.blocks
+
+        packed = blocks['material'].astype(np.int64) << 16 | \
+            blocks['facing'].astype(np.int64) << 8 | blocks['operation']
+
+        unique, inverse = np.unique(packed, return_inverse=True)
+
+        lookup = np.array([
+            self.states.intern((
+                arrays.materials[value >> 16],
+                arrays.facings[value >> 8 & 0xff],
+                arrays.operations[value & 0xff]
+            )) + 1
+            for value in unique.tolist()
+        ], dtype=CELL_DTYPE)
+
+        return lookup[inverse.reshape(-1)]
+
+    @staticmethod
+    def _chunk_codes(keys):
+        '''A non-negative int64 per chunk key, the same for equal keys.'''
+
+        low = keys.min(axis=0).astype(np.int64)
+        spans = (keys.max(axis=0) - low + 1).tolist()
+
+        if spans[0] * spans[1] * spans[2] * CHUNK_VOLUME >= 1 << 62:
+
+            # too spread out to number the chunks of the bounding box
+            _, inverse = np.unique(keys, axis=0, return_inverse=True)
+
+            return inverse.reshape(-1).astype(np.int64)
+
+        keys = keys - low
+
+        return (keys[:, 0] * spans[1] + keys[:, 1]) * spans[2] + keys[:, 2]
+
+    def add(self, arrays):
+        '''Add a BlockArrays' blocks, the later of any at the same
+        coordinates winning. Returns an (n, 3) array of the coordinates
+        that were set more than once.'''
+
+        if not len(arrays):
+            return np.zeros((0, 3), dtype=np.int32)
+
+        coordinates = arrays.coordinates.astype(np.int32)
+        states = self._state_codes(arrays)
+
+        keys, cells = cell_index(coordinates)
+
+        # one code per (chunk, cell); the last block at each of them is
+        # found in the reversed blocks
+        combined = self._chunk_codes(keys) * CHUNK_VOLUME + cells
+
+        found, first, counts = np.unique(
+            combined[::-1], return_index=True, return_counts=True
+        )
+        last = len(combined) - 1 - first
+
+        chunk_codes = found // CHUNK_VOLUME
+        bounds = np.flatnonzero(chunk_codes[1:] != chunk_codes[:-1]) + 1
+
+        repeated = []
+        start = 0
+
+        for stop in bounds.tolist() + [len(found)]:
+
+            key = tuple(keys[last[start]].tolist())
+            local = found[start:stop] % CHUNK_VOLUME
+            rows = last[start:stop]
+            many = counts[start:stop] > 1
+            start = stop
+
+            chunk = self.chunks.get(key)
+
+            if chunk is None:
+                chunk = self.chunks[key] = np.zeros(
+                    CHUNK_VOLUME, dtype=CELL_DTYPE
+                )
+
+            was_set = chunk[local] != 0
+
+            self.count += len(local) - int(np.count_nonzero(was_set))
+
+            chunk[local] = states[rows]
+
+            local = local[was_set | many]
+
+            if len(local):
+                repeated.append(
+                    CELL_COORDINATES[local] + np.array(key, np.int32) *
+                    CHUNK_SIZE
+                )
+
+        low = coordinates.min(axis=0)
+        high = coordinates.max(axis=0)
+
+        if self._low is not None:
+            low = np.minimum(low, self._low)
+            high = np.maximum(high, self._high)
+
+        self._low = tuple(low.tolist())
+        self._high = tuple(high.tolist())
+
+        if not repeated:
+            return np.zeros((0, 3), dtype=np.int32)
+
+        return np.concatenate(repeated)
+
+    def _chunks_in(self, box):
+
+        low = [value >> CHUNK_BITS for value in box.origin]
+        high = [value >> CHUNK_BITS for value in (box.x2, box.y2, box.z2)]
+
+        if (high[0] - low[0] + 1) * (high[1] - low[1] + 1) * \
+                (high[2] - low[2] + 1) > len(self.chunks):
+
+            for key, cells in self.chunks.items():
+
+                if all(l <= k <= h for l, k, h in zip(low, key, high)):
+                    yield key, cells
+
+            return
+
+        for cx in range(low[0], high[0] + 1):
+            for cy in range(low[1], high[1] + 1):
+                for cz in range(low[2], high[2] + 1):
+
+                    cells = self.chunks.get((cx, cy, cz))
+
+                    if cells is not None:
+                        yield (cx, cy, cz), cells
+
+    def _occupied(self, chunks, box=None):
+        '''(coordinates, states) of the occupied cells of (key, cells)
+        chunks, in the box if there is one.'''
+
+        coordinates = []
+        states = []
+
+        for key, cells in chunks:
+
+            local = np.flatnonzero(cells)
+
+            found = CELL_COORDINATES[local] + \
+                np.array(key, np.int32) * CHUNK_SIZE
+
+            if box is not None:
+
+                inside = np.all(
+                    (found >= box.origin) &
+                    (found <= (box.x2, box.y2, box.z2)),
+                    axis=1
+                )
+
+                found = found[inside]
+                local = local[inside]
+
+            coordinates.append(found)
+            states.append(cells[local])
+
+        if not coordinates:
+            return np.zeros((0, 3), np.int32), np.zeros(0, CELL_DTYPE)
+
+        return np.concatenate(coordinates), np.concatenate(states)
+
+    def _arrays(self, coordinates, states):
+
+        materials = LookupTable()
+        facings = LookupTable()
+        operations = LookupTable()
+
+        columns = np.array([
+            (materials.intern(material), facings.intern(facing),
+             operations.intern(operation))
+            for material, facing, operation in self.states
+        ], dtype=np.int64).reshape(-1, 3)
+
+        blocks = np.zeros(len(coordinates), dtype=BLOCK_DTYPE)
+
+        for n, axis in enumerate(('x', 'y', 'z')):
+            blocks[axis] = coordinates[:, n]
+
+        for n, name in enumerate(('material', 'facing', 'operation')):
+            blocks[name] = columns[states.astype(np.int64) - 1, n]
+
+        return BlockArrays(blocks, materials, facings, operations)
+
+    def region(self, box):
+        '''The blocks inside a Box, as BlockArrays (in chunk order).'''
+
+        return self._arrays(*self._occupied(self._chunks_in(box), box))
+
+    def to_arrays(self):
+        '''Every block, as BlockArrays (in chunk order).'''
+
+        return self._arrays(*self._occupied(self.chunks.items()))
+
+    def intersects(self, box):
+        '''Whether any block is inside a Box.'''
+
+        return any(
+            len(self._occupied([chunk], box)[0])
+            for chunk in self._chunks_in(box)
+        )
+
+    def intersection(self, other):
+        '''An (n, 3) array of the coordinates occupied in both indexes.'''
+
+        if len(other.chunks) < len(self.chunks):
+            return other.intersection(self)
+
+        retval = []
+
+        for key, cells in self.chunks.items():
+
+            others = other.chunks.get(key)
+
+            if others is None:
+                continue
+
+            local = np.flatnonzero((cells != 0) & (others != 0))
+
+            if len(local):
+                retval.append(
+                    CELL_COORDINATES[local] + np.array(key, np.int32) *
+                    CHUNK_SIZE
+                )
+
+        if not retval:
+            return np.zeros((0, 3), dtype=np.int32)
+
+        return np.concatenate(retval)
+
+    def overlaps(self, other):
+        '''Whether the indexes share any coordinates.'''
+
+        if self.bbox is None or other.bbox is None:
+            return False
+
+        first, second = self.bbox, other.bbox
+
+        if first.x2 < second.x1 or second.x2 < first.x1 or \
+                first.y2 < second.y1 or second.y2 < first.y1 or \
+                first.z2 < second.z1 or second.z2 < first.z1:
+            return False
+
+        return len(self.intersection(other)) > 0
+
+    def save(self, fout):
+        '''Write the index to a filename or binary file object.'''
+
+        keys = np.array(list(self.chunks), dtype=np.int32).reshape(-1, 3)
+
+        cells = np.stack(list(self.chunks.values())) if self.chunks else \
+            np.zeros((0, CHUNK_VOLUME), dtype=CELL_DTYPE)
+
+        # the cells are stored as small as the state table allows
+        dtype = np.uint8 if len(self.states) < 0xff else \
+            np.uint16 if len(self.states) < 0xffff else CELL_DTYPE
+
+        states = [
+            [material, facing and facing.name, operation.name]
+            for material, facing, operation in self.states
+        ]
+
+        # savez would add ".npz" to file names without it
+        if isinstance(fout, str):
+
+            with open(fout, 'wb') as fobj:
+                return self.save(fobj)
+
+        np.savez_compressed(
+            fout,
+            version=np.array([FORMAT_VERSION]),
+            keys=keys,
+            cells=cells.astype(dtype),
+            states=np.frombuffer(
+                json.dumps(states).encode('utf-8'), dtype=np.uint8
+            ),
+            bounds=np.array(
+                [self._low or (0, 0, 0), self._high or (0, 0, 0)],
+                dtype=np.int32
+            )
+        )
+
+    @classmethod
+    def load(clz, fin):
+        '''Read an index written by save() from a filename or binary file
+        object.'''
+
+        try:
+
+            with np.load(fin) as data:
+
+                if int(data['version'][0]) != FORMAT_VERSION:
+                    raise BadIndexFileException(
+                        'Unsupported index format version {}.'.format(
+                            int(data['version'][0])
+                        )
+                    )
+
+                keys = data['keys']
+                cells = data['cells'].astype(CELL_DTYPE)
+                states = json.loads(data['states'].tobytes().decode('utf-8'))
+                bounds = data['bounds']
+
+        except (OSError, KeyError, ValueError) as e:
+            raise BadIndexFileException('Not a spatial index ({}).'.format(e))
+
+        retval = clz()
+
+        for material, facing, operation in states:
+            retval.states.intern((
+                material,
+                None if facing is None else Facing[facing],
+                BlockOperation[operation]
+            ))
+
+        retval.chunks = dict(zip(map(tuple, keys.tolist()), cells))
+        retval.count = int(np.count_nonzero(cells))
+
+        if retval.count:
+            retval._low = tuple(bounds[0].tolist())
+            retval._high = tuple(bounds[1].tolist())
+
+        return retval
+
+
+def index_model(filename):
+    '''Build the SpatialIndex of a YAML or .sdfb model.'''
+
+    if filename.endswith(SDFB_EXTENSION):
+        return SpatialIndex.from_generator(
+            ParseGenerator(SdfbParser(filename))
+        )
+
+    with open(filename, 'r') as fin:
+        return SpatialIndex.from_generator(
+            ParseGenerator(StreamingParser(fin))
+        )
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Build and query spatial indexes of mc-sdf-1 models.'
+    )
+
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    index_parser = commands.add_parser(
+        'index',
+        help='index a YAML or .sdfb model'
+    )
+    index_parser.add_argument('source')
+    index_parser.add_argument('target')
+
+    info_parser = commands.add_parser(
+        'info',
+        help='print the size and bounding box of an index'
+    )
+    info_parser.add_argument('index')
+
+    overlap_parser = commands.add_parser(
+        'overlap',
+        help='print the coordinates two indexes share'
+    )
+    overlap_parser.add_argument('first')
+    overlap_parser.add_argument('second')
+
+    args = parser.parse_args()
+
+    if args.command == 'index':
+
+        index_model(args.source).save(args.target)
+
+    elif args.command == 'info':
+
+        index = SpatialIndex.load(args.index)
+
+        print('blocks: {}'.format(len(index)))
+        print('chunks: {}'.format(len(index.chunks)))
+        print('states: {}'.format(len(index.states)))
+        print('bbox: {}'.format(index.bbox))
+
+    else:
+
+        shared = SpatialIndex.load(args.first).intersection(
+            SpatialIndex.load(args.second)
+        )
+
+        for x, y, z in shared.tolist():
+            print('{},{},{}'.format(x, y, z))
+
+        print('{} shared blocks'.format(len(shared)))
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,434 @@
+'''
+    structure.py export model.yaml directory [--name NAME]
+    structure.py info template.nbt
+
+    Exports generated blocks as vanilla structure templates (.nbt files),
+    which a structure block or a single /place template command puts into
+    a world.
+
+    A template is a gzipped NBT compound holding its size, a palette of
+    block states and a list of blocks, each a palette index and a position
+    relative to the template's origin (its lowest corner). Positions the
+    model leaves empty aren't listed, so placing a template leaves them
+    alone. The palette is deduplicated from the blocks' (material, facing)
+    pairs, which become block states as in block state commands (see
+    blockstates.py): "wool.red" is "red_wool", a log's facing its "axis"
+    and a sideways torch a "wall_torch".
+
+    Structure blocks only save and load templates of up to 48 blocks a
+    side, so larger models are split into a grid of tiles, one template
+    each, named after their grid position. Later blocks replace earlier
+    ones at the same coordinates, as they do in a build.
+
+    Every block entry has the same layout, so the blocks of a tile are
+    encoded as one numpy record array, a batch at a time, and streamed
+    into the gzip file.
+'''
+
+import argparse
+import gzip
+import os
+import struct
+
+import numpy as np
+
+from anvil import block_state, read_nbt
+import blockstates
+from mcparser import (
+    BLOCK_DTYPE,
+    BlockArrays,
+    BlockOperation,
+    Facing,
+    LookupTable,
+    ParseGenerator,
+    StreamingParser
+)
+from sdfb import SdfbParser
+
+
+# the largest template a structure block saves or loads, a side
+MAX_SIZE = 48
+
+# Minecraft 1.20.1
+DATA_VERSION = 3465
+
+NAMESPACE = 'minecraft'
+NBT_EXTENSION = '.nbt'
+SDFB_EXTENSION = '.sdfb'
+
+TILE_TEMPLATE = '{}_{}_{}_{}'
+PLACE_TEMPLATE = 'place template {}:{} {} {} {}'
+
+# blocks encoded (and written) at once
+BATCH_SIZE = 1 << 16
+
+# gzip's default of 9 costs a lot more time for very little on templates
+COMPRESS_LEVEL = 6
+
+TAG_END = 0
+TAG_INT = 3
+TAG_STRING = 8
+TAG_LIST = 9
+TAG_COMPOUND = 10
+
+def _name(name):
+
+    encoded = name.encode('utf-8')
+
+    return struct.pack('>H', len(encoded)) + encoded
+
+
+def _tag(tag, name):
+    return struct.pack('>b', tag) + _name(name)
+
+
+def _int_list(name, values):
+
+    return _tag(TAG_LIST, name) + struct.pack(
+        '>bi{}i'.format(len(values)), TAG_INT, len(values), *values
+    )
+
+
+# a block entry: {state: Int, pos: [Int, Int, Int]}, with its End tag
+BLOCK_RECORD = np.dtype([
+    ('state_tag', 'S8'),
+    ('state', '>i4'),
+    ('pos_tag', 'S11'),
+    ('pos', '>i4', (3,)),
+    ('end', 'u1')
+])
+
+STATE_TAG = _tag(TAG_INT, 'state')
+POS_TAG = _tag(TAG_LIST, 'pos') + struct.pack('>bi', TAG_INT, 3)
+
+
+class StructureException(Exception):
+    '''Base Exception class for this module.'''
+    pass
+
+
+class BadTileSizeException(StructureException):
+    pass
+
+
+def palette_entry(name, properties):
+    '''The encoded palette compound of a block state.'''
+
+    data = _tag(TAG_STRING, 'Name') + _name(name)
+
+    if properties:
+
+        data += _tag(TAG_COMPOUND, 'Properties')
+
+        for key, value in properties.items():
+            data += _tag(TAG_STRING, key) + _name(value)
+
+        data += bytes((TAG_END,))
+
+    return data + bytes((TAG_END,))
+
+
+class StructureTile:
+    '''One template written: origin is the world position of its lowest
+    corner, size its extent and count the number of blocks in it.'''
+
+    def __init__(self, filename, origin, size, count, states):
+
+        self.filename = filename
+        self.origin = origin
+        self.size = size
+        self.count = count
+        self.states = states
+
+    @property
+    def name(self):
+        return os.path.splitext(os.path.basename(self.filename))[0]
+
+    def command(self, namespace=NAMESPACE):
+        '''The command that places the template where it came from.'''
+
+        return PLACE_TEMPLATE.format(namespace, self.name, *self.origin)
+
+
+class StructureWriter:
+    '''Writes BlockArrays into directory as name.nbt, or as a tile grid of
+    name_X_Y_Z.nbt templates when they're more than tile_size blocks
+    across. facings maps blocks to their facings table, as the "facings"
+    section of materials.yaml (the default) does.'''
+
+    def __init__(self, directory, name, tile_size=MAX_SIZE,
+                 data_version=DATA_VERSION, facings=None):
+
+        if tile_size < 1:
+
+            raise BadTileSizeException(
+                'Expected a positive tile size, not {}.'.format(tile_size)
+            )
+
+        self.directory = directory
+        self.name = name
+        self.tile_size = tile_size
+        self.data_version = data_version
+        self.facings = blockstates.load_facings() if facings is None \
+            else facings
+
+    def write(self, arrays):
+        '''Write arrays (BlockArrays); returns the StructureTiles written.'''
+
+        if not len(arrays):
+            return []
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        coordinates = np.column_stack(
+            (arrays.x, arrays.y, arrays.z)
+        ).astype(np.int64)
+
+        low = coordinates.min(axis=0)
+        extent = coordinates.max(axis=0) - low + 1
+
+        offsets = coordinates - low
+        tiles = offsets // self.tile_size
+        local = offsets % self.tile_size
+
+        grid = -(-extent // self.tile_size)
+
+        # tiles in x, y, z order and blocks in y, z, x order within them,
+        # as structure blocks save them
+        tile_key = (tiles[:, 0] * grid[1] + tiles[:, 1]) * grid[2] + \
+            tiles[:, 2]
+        key = tile_key * self.tile_size ** 3 + (
+            (local[:, 1] * self.tile_size + local[:, 2]) * self.tile_size +
+            local[:, 0]
+        )
+
+        order = np.argsort(key, kind='stable')
+        key = key[order]
+
+        # the last block at every position wins
+        last = np.ones(len(key), dtype=bool)
+        last[:-1] = key[1:] != key[:-1]
+
+        order = order[last]
+        tile_key = tile_key[order]
+
+        facing_count = max(len(arrays.facings), 1)
+        pairs = arrays.blocks['material'][order].astype(np.int64) * \
+            facing_count + arrays.blocks['facing'][order]
+
+        # pairs that are the same block state share a palette entry
+        unique_pairs, pair_index = np.unique(pairs, return_inverse=True)
+        entries = LookupTable()
+
+        lookup = np.array([
+            entries.intern(self._palette_entry(
+                arrays.materials[pair // facing_count],
+                arrays.facings[pair % facing_count]
+            ))
+            for pair in unique_pairs.tolist()
+        ], dtype=np.int64)
+
+        states = lookup[pair_index.reshape(-1)]
+
+        bounds = np.flatnonzero(tile_key[1:] != tile_key[:-1]) + 1
+        bounds = [0] + bounds.tolist() + [len(order)]
+
+        single = bool((extent <= self.tile_size).all())
+
+        retval = []
+
+        for start, end in zip(bounds[:-1], bounds[1:]):
+
+            tile = tiles[order[start]]
+            origin = low + tile * self.tile_size
+            size = np.minimum(extent - tile * self.tile_size, self.tile_size)
+
+            name = self.name if single else TILE_TEMPLATE.format(
+                self.name, *tile.tolist()
+            )
+
+            used, codes = np.unique(states[start:end], return_inverse=True)
+
+            palette = [entries[state] for state in used.tolist()]
+
+            filename = os.path.join(self.directory, name + NBT_EXTENSION)
+
+            self._write_tile(
+                filename,
+                size.tolist(),
+                palette,
+                codes,
+                local[order[start:end]]
+            )
+
+            retval.append(StructureTile(
+                filename,
+                tuple(origin.tolist()),
+                tuple(size.tolist()),
+                end - start,
+                len(palette)
+            ))
+
+        return retval
+
+    def _palette_entry(self, material, facing):
+
+        return palette_entry(
+            *blockstates.block_state(material, facing, self.facings)
+        )
+
+    def _write_tile(self, filename, size, palette, codes, positions):
+
+        with gzip.open(filename, 'wb', compresslevel=COMPRESS_LEVEL) as fout:
+
+            fout.write(_tag(TAG_COMPOUND, ''))
+            fout.write(_tag(TAG_INT, 'DataVersion'))
+            fout.write(struct.pack('>i', self.data_version))
+            fout.write(_int_list('size', size))
+
+            fout.write(_tag(TAG_LIST, 'palette'))
+            fout.write(struct.pack('>bi', TAG_COMPOUND, len(palette)))
+
+            for entry in palette:
+                fout.write(entry)
+
+            fout.write(_tag(TAG_LIST, 'blocks'))
+            fout.write(struct.pack('>bi', TAG_COMPOUND, len(codes)))
+
+            records = np.zeros(min(len(codes), BATCH_SIZE), BLOCK_RECORD)
+            records['state_tag'] = STATE_TAG
+            records['pos_tag'] = POS_TAG
+
+            for start in range(0, len(codes), BATCH_SIZE):
+
+                batch = records[:len(codes) - start]
+
+                batch['state'] = codes[start:start + BATCH_SIZE]
+                batch['pos'] = positions[start:start + BATCH_SIZE]
+
+                fout.write(batch.tobytes())
+
+            fout.write(_tag(TAG_LIST, 'entities'))
+            fout.write(struct.pack('>bi', TAG_END, 0))
+
+            fout.write(bytes((TAG_END,)))
+
+
+def read_structure(filename):
+    '''Return (size, BlockArrays) of a template: blocks are relative to the
+    template's origin, materials are block names without the "minecraft:"
+    namespace.'''
+
+    with gzip.open(filename, 'rb') as fin:
+        root = read_nbt(fin.read())
+
+    materials = LookupTable()
+    facings = LookupTable()
+
+    states = [block_state(entry) for entry in root.get('palette', [])]
+
+    material_codes = [materials.intern(material) for material, _ in states]
+    facing_codes = [
+        facings.intern(None if facing is None else Facing.resolve(facing))
+        for _, facing in states
+    ]
+
+    entries = root.get('blocks', [])
+
+    blocks = np.zeros(len(entries), dtype=BLOCK_DTYPE)
+
+    if entries:
+
+        codes = np.array([entry['state'] for entry in entries])
+        positions = np.array([entry['pos'] for entry in entries])
+
+        blocks['x'] = positions[:, 0]
+        blocks['y'] = positions[:, 1]
+        blocks['z'] = positions[:, 2]
+        blocks['material'] = np.array(material_codes)[codes]
+        blocks['facing'] = np.array(facing_codes)[codes]
+
+    return tuple(root['size']), BlockArrays(
+        blocks, materials, facings, LookupTable([BlockOperation.Replace])
+    )
+
+
+def model_arrays(filename):
+    '''Generate the BlockArrays of a YAML or .sdfb model.'''
+
+    if filename.endswith(SDFB_EXTENSION):
+        return ParseGenerator(SdfbParser(filename)).generate_arrays()
+
+    with open(filename, 'r') as fin:
+        return ParseGenerator(StreamingParser(fin)).generate_arrays()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Export mc-sdf-1 models as structure templates.'
+    )
+
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    export_parser = commands.add_parser(
+        'export',
+        help='export a YAML or .sdfb model into a directory of templates'
+    )
+    export_parser.add_argument('source')
+    export_parser.add_argument('directory')
+    export_parser.add_argument(
+        '--name',
+        help='the template name (default: the model\'s file name)'
+    )
+    export_parser.add_argument(
+        '--tile-size',
+        type=int,
+        default=MAX_SIZE,
+        help='the largest template, a side'
+    )
+    export_parser.add_argument(
+        '--namespace',
+        default=NAMESPACE,
+        help='the namespace the templates are placed from'
+    )
+
+    info_parser = commands.add_parser(
+        'info',
+        help='print the size and contents of a template'
+    )
+    info_parser.add_argument('template')
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+
+        name = args.name or \
+            os.path.splitext(os.path.basename(args.source))[0]
+
+        tiles = StructureWriter(
+            args.directory, name, args.tile_size
+        ).write(model_arrays(args.source))
+
+        for tile in tiles:
+            print(tile.command(args.namespace))
+
+        print('Wrote {} blocks into {} templates.'.format(
+            sum(tile.count for tile in tiles), len(tiles)
+        ))
+
+    else:
+
+        size, arrays = read_structure(args.template)
+
+        print('size: {}'.format(size))
+        print('blocks: {}'.format(len(arrays)))
+        print('states: {}'.format(
+            len(set(arrays.blocks[['material', 'facing']].tolist()))
+        ))
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,423 @@
+import gzip
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+import yaml
+
+from anvil import (
+    AnvilExtractor,
+    BadNbtException,
+    Box,
+    GZIP,
+    read_nbt,
+    RegionFile,
+    SECTION_VOLUME,
+    UnsupportedChunkException,
+    unpack_states,
+    write_document,
+    ZLIB
+)
+from mcparser import Facing, Parser, ParseGenerator
+
+
+# test-only NBT encoding: Long/LongArray wrap values that need those tags
+
+class Long(int):
+    pass
+
+
+class LongArray(list):
+    pass
+
+
+def nbt_payload(value):
+
+    if isinstance(value, Long):
+        return 4, struct.pack('>q', value)
+
+    if isinstance(value, bool) or isinstance(value, int):
+        return 3, struct.pack('>i', value)
+
+    if isinstance(value, str):
+        data = value.encode('utf-8')
+        return 8, struct.pack('>H', len(data)) + data
+
+    if isinstance(value, LongArray):
+        return 12, struct.pack('>i', len(value)) + \
+            np.array(value, dtype=np.uint64).astype('>u8').tobytes()
+
+    if isinstance(value, list):
+
+        payloads = [nbt_payload(v) for v in value]
+        tag = payloads[0][0] if payloads else 0
+
+        return 9, struct.pack('>bi', tag, len(value)) + \
+            b''.join(p for _, p in payloads)
+
+    if isinstance(value, dict):
+
+        data = b''
+
+        for name, child in value.items():
+
+            tag, payload = nbt_payload(child)
+            encoded = name.encode('utf-8')
+
+            data += struct.pack('>bH', tag, len(encoded)) + encoded + payload
+
+        return 10, data + b'\x00'
+
+    raise TypeError(value)
+
+
+def nbt(root):
+
+    return b'\x0a\x00\x00' + nbt_payload(root)[1]
+
+
+def pack_states(indexes, bits, padded=True):
+
+    if padded:
+
+        per_long = 64 // bits
+        longs = [0] * -(-len(indexes) // per_long)
+
+        for n, index in enumerate(indexes):
+            longs[n // per_long] |= index << (bits * (n % per_long))
+
+        return LongArray(longs)
+
+    value = 0
+
+    for n, index in enumerate(indexes):
+        value |= index << (bits * n)
+
+    count = len(indexes) * bits // 64
+
+    return LongArray(
+        (value >> (64 * n)) & 0xFFFFFFFFFFFFFFFF for n in range(count)
+    )
+
+
+def state(name, **properties):
+
+    retval = {'Name': 'minecraft:' + name}
+
+    if properties:
+        retval['Properties'] = properties
+
+    return retval
+
+
+def write_region(filename, chunks, compression=ZLIB):
+    '''chunks maps (cx, cz) to a chunk's root compound.'''
+
+    locations = bytearray(4096)
+    body = b''
+
+    for (cx, cz), root in chunks.items():
+
+        data = nbt(root)
+        data = gzip.compress(data) if compression == GZIP else \
+            zlib.compress(data)
+
+        record = struct.pack('>iB', len(data) + 1, compression) + data
+        record += b'\x00' * (-len(record) % 4096)
+
+        offset = 2 + len(body) // 4096
+        index = (cx % 32) + (cz % 32) * 32
+
+        locations[index * 4:index * 4 + 4] = struct.pack(
+            '>I', (offset << 8) | (len(record) // 4096)
+        )
+
+        body += record
+
+    with open(filename, 'wb') as fout:
+        fout.write(bytes(locations) + bytes(4096) + body)
+
+
+def modern_chunk(cx, cz, sections):
+    '''A 1.18+ chunk; sections maps a section y to (palette, indexes).'''
+
+    return {
+        'DataVersion': 3465,
+        'xPos': cx,
+        'zPos': cz,
+        'sections': [
+            {
+                'Y': y,
+                'block_states': {
+                    'palette': palette,
+                    'data': pack_states(
+                        indexes, max(4, (len(palette) - 1).bit_length())
+                    )
+                } if len(palette) > 1 else {'palette': palette}
+            }
+            for y, (palette, indexes) in sections.items()
+        ]
+    }
+
+
+def section_index(x, y, z):
+
+    return (y & 15) * 256 + (z & 15) * 16 + (x & 15)
+
+
+class TestNbt(unittest.TestCase):
+
+    def test_round_trip(self):
+
+        root = {
+            'name': 'héllo',
+            'count': 7,
+            'big': Long(1 << 40),
+            'list': [{'a': 1}, {'a': 2}],
+            'empty': [],
+            'longs': LongArray([1, 2, 3])
+        }
+
+        value = read_nbt(nbt(root))
+
+        self.assertEqual(value['name'], 'héllo')
+        self.assertEqual(value['count'], 7)
+        self.assertEqual(value['big'], 1 << 40)
+        self.assertEqual(value['list'], [{'a': 1}, {'a': 2}])
+        self.assertEqual(value['empty'], [])
+        self.assertEqual(value['longs'].tolist(), [1, 2, 3])
+
+    def test_truncated(self):
+
+        with self.assertRaises(BadNbtException):
+            read_nbt(nbt({'name': 'hello'})[:-4])
+
+
+class TestUnpackStates(unittest.TestCase):
+
+    def check(self, bits, padded):
+
+        indexes = np.random.RandomState(bits).randint(
+            0, 1 << bits, SECTION_VOLUME
+        ).tolist()
+
+        data = np.array(pack_states(indexes, bits, padded), dtype=np.uint64)
+
+        self.assertEqual(
+            unpack_states(data.view(np.int64), bits, padded).tolist(),
+            indexes
+        )
+
+    def test_padded(self):
+
+        for bits in (4, 5, 7, 12):
+            self.check(bits, True)
+
+    def test_spanning(self):
+
+        for bits in (4, 5, 7, 13):
+            self.check(bits, False)
+
+
+class TestExtractor(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tempdir = tempfile.mkdtemp()
+        self.region = os.path.join(self.tempdir, 'region')
+
+        os.mkdir(self.region)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tempdir)
+
+    def extract(self, box, **kwargs):
+
+        return AnvilExtractor(self.tempdir, **kwargs).extract(box)
+
+    def blocks(self, extracted):
+
+        return {
+            tuple(xyz): extracted.states[code]
+            for xyz, code in zip(extracted.coordinates.tolist(),
+                                 extracted.codes.tolist())
+        }
+
+    def test_modern_chunk(self):
+
+        palette = [state('air'), state('stone'),
+                   state('oak_stairs', facing='west', half='bottom'),
+                   state('oak_log', axis='z')]
+
+        indexes = [0] * SECTION_VOLUME
+        indexes[section_index(1, 2, 3)] = 1
+        indexes[section_index(4, 5, 6)] = 2
+        indexes[section_index(15, 15, 15)] = 3
+
+        write_region(
+            os.path.join(self.region, 'r.0.0.mca'),
+            {(1, 0): modern_chunk(1, 0, {-1: (palette, indexes)})}
+        )
+
+        extracted = self.extract(Box(16, -16, 0, 31, -1, 15))
+
+        self.assertEqual(self.blocks(extracted), {
+            (1, 2, 3): ('stone', None),
+            (4, 5, 6): ('oak_stairs', 'W'),
+            (15, 15, 15): ('oak_log', 'N')
+        })
+
+        # a box that cuts through the section
+        extracted = self.extract(Box(17, -16, 0, 20, -11, 15))
+
+        self.assertEqual(self.blocks(extracted), {
+            (0, 2, 3): ('stone', None),
+            (3, 5, 6): ('oak_stairs', 'W')
+        })
+
+    def test_spanning_states_and_gzip(self):
+
+        # 1.15: sections under Level, indexes span longs
+        palette = [state('air')] + \
+            [state('wool_{}'.format(n)) for n in range(20)]
+
+        indexes = [(n % 21) for n in range(SECTION_VOLUME)]
+
+        root = {
+            'DataVersion': 2230,
+            'Level': {
+                'xPos': -1,
+                'zPos': -1,
+                'Sections': [
+                    {'Y': 0},
+                    {
+                        'Y': 0,
+                        'Palette': palette,
+                        'BlockStates': pack_states(indexes, 5, padded=False)
+                    }
+                ]
+            }
+        }
+
+        write_region(
+            os.path.join(self.region, 'r.-1.-1.mca'),
+            {(-1, -1): root},
+            compression=GZIP
+        )
+
+        extracted = self.extract(Box(-16, 0, -16, -1, 15, -1))
+
+        expected = {
+            ((n & 15), n >> 8, (n >> 4) & 15): ('wool_{}'.format(n % 21 - 1),
+                                                None)
+            for n in range(SECTION_VOLUME) if n % 21
+        }
+
+        self.assertEqual(self.blocks(extracted), expected)
+
+    def test_across_regions(self):
+
+        stone = [state('air'), state('stone')]
+
+        def column(x, z):
+
+            indexes = [0] * SECTION_VOLUME
+            indexes[section_index(x, 0, z)] = 1
+
+            return {0: (stone, indexes)}
+
+        write_region(os.path.join(self.region, 'r.0.0.mca'), {
+            (0, 0): modern_chunk(0, 0, column(0, 0)),
+            (31, 0): modern_chunk(31, 0, column(15, 0))
+        })
+        write_region(os.path.join(self.region, 'r.1.0.mca'), {
+            (32, 0): modern_chunk(32, 0, column(0, 0))
+        })
+
+        box = Box(0, 0, 0, 520, 10, 10)
+
+        inline = self.extract(box, workers=1, batch=4)
+        pooled = self.extract(box, workers=2, batch=4)
+
+        self.assertEqual(
+            sorted(self.blocks(inline)), [(0, 0, 0), (511, 0, 0), (512, 0, 0)]
+        )
+        self.assertEqual(inline.coordinates.tolist(),
+                         pooled.coordinates.tolist())
+        self.assertEqual(inline.states, pooled.states)
+
+    def test_old_chunks(self):
+
+        write_region(os.path.join(self.region, 'r.0.0.mca'), {
+            (0, 0): {'Level': {'Sections': [
+                {'Y': 0, 'Blocks': LongArray([0])}
+            ]}}
+        })
+
+        with self.assertRaises(UnsupportedChunkException):
+            self.extract(Box(0, 0, 0, 15, 15, 15))
+
+    def test_missing_chunks(self):
+
+        write_region(os.path.join(self.region, 'r.0.0.mca'), {})
+
+        with RegionFile(os.path.join(self.region, 'r.0.0.mca')) as region:
+            self.assertIsNone(region.chunk_data(0, 0))
+
+        self.assertEqual(len(self.extract(Box(0, 0, 0, 100, 10, 100))), 0)
+
+    def test_document(self):
+
+        palette = [state('air'), state('stone'), state('red_wool'),
+                   state('furnace', facing='north', lit='false')]
+
+        indexes = [0] * SECTION_VOLUME
+
+        for x in range(4):
+            indexes[section_index(x, 0, 0)] = 1
+
+        indexes[section_index(0, 1, 0)] = 2
+        indexes[section_index(2, 1, 0)] = 3
+
+        write_region(
+            os.path.join(self.region, 'r.0.0.mca'),
+            {(0, 0): modern_chunk(0, 0, {4: (palette, indexes)})}
+        )
+
+        extracted = self.extract(Box(0, 64, 0, 15, 79, 15))
+
+        fout = io.StringIO()
+        write_document(fout, extracted, name='test')
+
+        parser = Parser(yaml.safe_load(fout.getvalue()))
+
+        self.assertEqual(parser.meta.name, 'test')
+
+        arrays = ParseGenerator(parser).generate_arrays()
+
+        blocks = {
+            (int(row['x']), int(row['y']), int(row['z'])): (
+                arrays.materials[row['material']],
+                arrays.facings[row['facing']]
+            )
+            for row in arrays.blocks
+        }
+
+        self.assertEqual(blocks, {
+            (0, 0, 0): ('stone', None),
+            (1, 0, 0): ('stone', None),
+            (2, 0, 0): ('stone', None),
+            (3, 0, 0): ('stone', None),
+            (0, 1, 0): ('red_wool', None),
+            (2, 1, 0): ('furnace', Facing.North)
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import unittest
+
+import numpy as np
+import yaml
+
+from mcparser import (
+    Parser,
+    ParseGenerator,
+    BLOCK_DTYPE,
+    code_dtype,
+    last_occurrences
+)
+
+
+class TestArrays(unittest.TestCase):
+
+    DATA_FILE_PATH = 'data'
+    DATA_FILE_NAME = 'basics.yaml'
+
+    def setUp(self):
+
+        self.data = None
+
+        filename = os.path.join(
+            os.path.dirname(__file__),
+            self.DATA_FILE_PATH,
+            self.DATA_FILE_NAME
+        )
+
+        with open(filename, 'r') as fin:
+
+            self.data = yaml.safe_load(fin)
+
+    def test_matches_generate(self):
+
+        gen = ParseGenerator(Parser(self.data))
+        gen.x_offset, gen.y_offset, gen.z_offset = 100, 64, -20
+
+        expected = [
+            (
+                item.x, item.y, item.z,
+                context.material, context.facing, context.operation
+            )
+            for context, item in gen.generate()
+        ]
+
+        arrays = gen.generate_arrays()
+
+        self.assertEqual(arrays.blocks.dtype, BLOCK_DTYPE)
+        self.assertEqual(len(arrays), len(expected))
+
+        actual = [
+            (
+                int(row['x']), int(row['y']), int(row['z']),
+                arrays.materials[row['material']],
+                arrays.facings[row['facing']],
+                arrays.operations[row['operation']]
+            )
+            for row in arrays.blocks
+        ]
+
+        self.assertEqual(actual, expected)
+
+    def test_tables_are_interned(self):
+
+        arrays = ParseGenerator(Parser(self.data)).generate_arrays()
+
+        self.assertEqual(len(arrays.materials), len(set(arrays.materials)))
+        self.assertEqual(len(arrays.facings), len(set(arrays.facings)))
+        self.assertEqual(arrays.coordinates.shape, (len(arrays), 3))
+
+    def test_last_occurrences(self):
+
+        coordinates = np.array([[0, 0, 0], [5, 5, 5], [0, 0, 0], [1, 0, 0]])
+
+        self.assertEqual(last_occurrences(coordinates).tolist(), [1, 2, 3])
+
+        # too sparse for the grid
+        coordinates *= 100000
+
+        self.assertEqual(last_occurrences(coordinates).tolist(), [1, 2, 3])
+
+    def test_code_dtype(self):
+
+        self.assertEqual(code_dtype(1 << 16), np.uint16)
+        self.assertEqual(code_dtype((1 << 16) + 1), np.uint32)
+
+    def test_empty(self):
+
+        arrays = ParseGenerator(
+            Parser({'mc-sdf-1': {'version': '1.0'}})
+        ).generate_arrays()
+
+        self.assertEqual(len(arrays), 0)
+        self.assertEqual(arrays.blocks.dtype, BLOCK_DTYPE)
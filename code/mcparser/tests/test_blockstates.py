@@ -0,0 +1,96 @@
+import unittest
+
+import yaml
+
+from blockstates import (
+    block_name,
+    block_state,
+    format_state,
+    load_facings,
+    MATERIALS_FILE
+)
+from mcparser import Facing
+
+
+# the 1.13+ names of every legacy variant family, by variant table
+FAMILY_NAMES = {
+    'color': {
+        'wool': 'wool',
+        'carpet': 'carpet',
+        'stained_glass': 'stained_glass',
+        'stained_glass_pane': 'stained_glass_pane',
+        'stained_hardened_clay': 'terracotta',
+        'concrete': 'concrete',
+        'concrete_powder': 'concrete_powder'
+    },
+    'wood': {'planks': 'planks', 'wooden_slab': 'slab', 'sapling': 'sapling'},
+    'log': {'log': 'log'},
+    'log2': {'log2': 'log'}
+}
+
+
+class TestBlockStates(unittest.TestCase):
+
+    def test_block_names(self):
+
+        with open(MATERIALS_FILE, 'r') as fin:
+            mapping = yaml.safe_load(fin)
+
+        for block, table in mapping['variants'].items():
+
+            self.assertIn(block, FAMILY_NAMES[table])
+
+            for variant in mapping['tables'][table]:
+
+                self.assertEqual(
+                    block_name('{}.{}'.format(block, variant)),
+                    'minecraft:{}_{}'.format(
+                        variant, FAMILY_NAMES[table][block]
+                    )
+                )
+
+        for material, name in (
+            ('stained_hardened_clay.white', 'minecraft:white_terracotta'),
+            ('wooden_slab.oak', 'minecraft:oak_slab'),
+            ('log2.acacia', 'minecraft:acacia_log'),
+            ('wool', 'minecraft:white_wool'),
+            ('log2', 'minecraft:acacia_log'),
+            ('stone', 'minecraft:stone'),
+            ('red_wool', 'minecraft:red_wool'),
+            ('mod:thing', 'mod:thing')
+        ):
+            self.assertEqual(block_name(material), name)
+
+    def test_block_state(self):
+
+        facings = load_facings()
+
+        for material, facing, state in (
+            ('piston', Facing.Up, 'minecraft:piston[facing=up]'),
+            ('piston', None, 'minecraft:piston'),
+            ('log.birch', Facing.West, 'minecraft:birch_log[axis=x]'),
+            ('log', Facing.Down, 'minecraft:oak_log[axis=y]'),
+            ('log', Facing.Other, 'minecraft:oak_log'),
+            ('torch', Facing.Up, 'minecraft:torch'),
+            ('torch', Facing.South, 'minecraft:wall_torch[facing=south]'),
+            ('redstone_torch', Facing.East,
+             'minecraft:redstone_wall_torch[facing=east]'),
+            ('stone', Facing.North, 'minecraft:stone'),
+            ('wool.red', Facing.North, 'minecraft:red_wool')
+        ):
+
+            self.assertEqual(
+                format_state(*block_state(material, facing, facings)),
+                state
+            )
+
+        self.assertEqual(
+            block_state('piston', Facing.Up, {}), ('minecraft:piston', {})
+        )
+        self.assertEqual(
+            format_state('a', {'b': 'c', 'd': 'e'}), 'a[b=c,d=e]'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+from mcparser import Parser, ParseGenerator
+
+
+def make_document():
+
+    return {
+        'mc-sdf-1': {
+            'version': '1.0',
+            'meta': {'name': 'house'},
+            'cells': [
+                {'cell': {
+                    'meta': {'name': 'floor'},
+                    'structure': [
+                        {'context': {'material': 'dirt', 'items': ['0,0,0']}},
+                        {'context': {'material': 'stone', 'items': ['1,0,0']}}
+                    ]
+                }},
+                {'cell': {
+                    'meta': {'name': 'roof'},
+                    'structure': [
+                        {'context': {'material': 'wood', 'items': ['0,5,0']}}
+                    ]
+                }}
+            ]
+        }
+    }
+
+
+class TestCellIndex(unittest.TestCase):
+
+    def test_cached(self):
+
+        parser = Parser(make_document())
+
+        self.assertIs(parser.cells, parser.cells)
+        self.assertIs(parser.meta, parser.meta)
+
+        first = [context for cell in parser.cells
+                 for context in cell.structure]
+        second = [context for cell in parser.cells
+                  for context in cell.structure]
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual([id(c) for c in first], [id(c) for c in second])
+
+    def test_lookups(self):
+
+        cells = Parser(make_document()).cells
+
+        self.assertEqual(len(cells), 2)
+        self.assertIs(cells['roof'], cells[1])
+        self.assertIs(cells.by_name('floor'), cells[0])
+        self.assertEqual(cells.context('floor', 1).material, 'stone')
+        self.assertEqual(cells.context(1, 0).material, 'wood')
+
+        self.assertEqual(
+            [(n, m, c.material) for n, m, c in cells.contexts()],
+            [(0, 0, 'dirt'), (0, 1, 'stone'), (1, 0, 'wood')]
+        )
+
+        with self.assertRaises(KeyError):
+            cells['cellar']
+
+    def test_invalidate(self):
+
+        data = make_document()
+        parser = Parser(data)
+
+        cells = parser.cells
+
+        data['mc-sdf-1']['cells'].pop()
+        data['mc-sdf-1']['meta']['name'] = 'shed'
+
+        self.assertIs(parser.cells, cells)
+        self.assertEqual(parser.meta.name, 'house')
+
+        parser.invalidate()
+
+        self.assertEqual(len(parser.cells), 1)
+        self.assertEqual(parser.meta.name, 'shed')
+
+    def test_generator_reuses_cells(self):
+
+        gen = ParseGenerator(Parser(make_document()))
+
+        first = [item for _, item in gen.generate()]
+        second = [item for _, item in gen.generate()]
+
+        self.assertEqual(
+            [i.to_dict() for i in first], [i.to_dict() for i in second]
+        )
@@ -0,0 +1,209 @@
+import io
+import unittest
+
+import numpy as np
+import yaml
+
+from encoder import (
+    DocumentEncoder,
+    encode_document,
+    scalar
+)
+from mcparser import (
+    BLOCK_DTYPE,
+    BlockArrays,
+    BlockOperation,
+    Facing,
+    LookupTable,
+    Parser,
+    ParseGenerator,
+    StreamingParser
+)
+
+
+def make_arrays(rows, materials, facings=(None,), operations=None):
+    '''rows are (x, y, z, material code, facing code, operation code).'''
+
+    blocks = np.array([tuple(row) for row in rows], dtype=BLOCK_DTYPE)
+
+    return BlockArrays(
+        blocks,
+        LookupTable(materials),
+        LookupTable(facings),
+        LookupTable(operations or [BlockOperation.Replace])
+    )
+
+
+def block_set(arrays):
+
+    return {
+        (
+            int(row['x']), int(row['y']), int(row['z']),
+            arrays.materials[row['material']],
+            arrays.facings[row['facing']],
+            arrays.operations[row['operation']]
+        )
+        for row in arrays.blocks
+    }
+
+
+def random_arrays(count, seed=0):
+
+    random = np.random.RandomState(seed)
+
+    materials = ['stone', 'dirt', 'wool.red', 'planks.oak', 'glass',
+                 'furnace', 'log.birch', 'gold_block', 'true', 'a, b']
+    facings = [None, Facing.North, Facing.East, Facing.South, Facing.West,
+               Facing.Up, Facing.Down, Facing.Other]
+    operations = [BlockOperation.Replace, BlockOperation.Keep,
+                  BlockOperation.Destroy]
+
+    # a few common states and a long tail of rare ones
+    weights = np.array([200, 100] + [1] * 8, dtype=float)
+
+    blocks = np.zeros(count, dtype=BLOCK_DTYPE)
+    blocks['x'] = random.randint(-40, 40, count)
+    blocks['y'] = random.randint(0, 30, count)
+    blocks['z'] = random.randint(1000, 1040, count)
+    blocks['material'] = random.choice(len(materials), count,
+                                       p=weights / weights.sum())
+    blocks['facing'] = random.choice(len(facings), count,
+                                     p=[0.9] + [0.1 / 7] * 7)
+    blocks['operation'] = random.choice(3, count, p=[0.98, 0.01, 0.01])
+
+    return BlockArrays(blocks, LookupTable(materials), LookupTable(facings),
+                       LookupTable(operations))
+
+
+def last_block_set(arrays):
+
+    retval = {}
+
+    for row in arrays.blocks:
+        retval[(int(row['x']), int(row['y']), int(row['z']))] = row
+
+    return block_set(BlockArrays(
+        np.array(list(retval.values()), dtype=BLOCK_DTYPE),
+        arrays.materials,
+        arrays.facings,
+        arrays.operations
+    ))
+
+
+class TestEncoder(unittest.TestCase):
+
+    def encode(self, arrays, meta=None):
+
+        fout = io.StringIO()
+        encode_document(fout, arrays, meta)
+
+        return fout.getvalue()
+
+    def decode(self, text):
+
+        return ParseGenerator(Parser(yaml.safe_load(text))).generate_arrays()
+
+    def test_round_trip(self):
+
+        arrays = random_arrays(5000)
+        text = self.encode(arrays)
+
+        self.assertEqual(block_set(self.decode(text)), last_block_set(arrays))
+
+        streamed = ParseGenerator(
+            StreamingParser(io.StringIO(text))
+        ).generate_arrays()
+
+        self.assertEqual(block_set(streamed), last_block_set(arrays))
+
+    def test_rare_states_share_a_context(self):
+
+        rows = [(x, 0, 0, 0, 0, 0) for x in range(100)]
+        rows += [(0, 1, 0, 1, 0, 0), (1, 1, 0, 2, 0, 0), (0, 2, 0, 0, 1, 0)]
+
+        arrays = make_arrays(rows, ['stone', 'wool.red', 'dirt'],
+                             [None, Facing.North])
+
+        contexts = DocumentEncoder().contexts(arrays)
+
+        # the faced stone can't share the context of the unfaced stone
+        self.assertEqual(len(contexts), 2)
+        self.assertEqual(contexts[0].fields, ['material'])
+        self.assertEqual(
+            sorted(set(contexts[0].suffixes)), ['', ',dirt', ',wool.red']
+        )
+
+        text = self.encode(arrays)
+
+        self.assertIn('item_suffix: [material]', text)
+        self.assertEqual(block_set(self.decode(text)), block_set(arrays))
+
+    def test_offsets(self):
+
+        rows = [(1000 + x, 64, -2000 + z, 0, 0, 0)
+                for x in range(10) for z in range(10)]
+
+        arrays = make_arrays(rows, ['stone'])
+
+        context, = DocumentEncoder().contexts(arrays)
+
+        self.assertEqual(context.offset, (1000, 64, -2000))
+        self.assertEqual(int(context.coordinates.max()), 9)
+
+        text = self.encode(arrays)
+
+        self.assertIn('"9,0,9"', text)
+
+        # a lone block isn't worth the extra lines
+        context, = DocumentEncoder().contexts(make_arrays(rows[:1], ['stone']))
+
+        self.assertEqual(context.offset, (0, 0, 0))
+        self.assertEqual(block_set(self.decode(text)), block_set(arrays))
+
+    def test_smaller_than_one_context_per_block(self):
+
+        arrays = random_arrays(5000, seed=1)
+
+        naive = yaml.safe_dump({'mc-sdf-1': {
+            'version': '1.0',
+            'cells': [{'cell': {'structure': [
+                {'context': {
+                    'material': arrays.materials[row['material']],
+                    'items': ['{},{},{}'.format(row['x'], row['y'],
+                                                row['z'])]
+                }}
+                for row in arrays.blocks
+            ]}}]
+        }})
+
+        self.assertLess(len(self.encode(arrays)) * 5, len(naive))
+
+    def test_duplicates_keep_the_last_block(self):
+
+        rows = [(0, 0, 0, 0, 0, 0), (1, 0, 0, 0, 0, 0), (0, 0, 0, 1, 0, 0)]
+        arrays = make_arrays(rows, ['stone', 'dirt'])
+
+        self.assertEqual(
+            block_set(self.decode(self.encode(arrays))),
+            {(0, 0, 0, 'dirt', None, BlockOperation.Replace),
+             (1, 0, 0, 'stone', None, BlockOperation.Replace)}
+        )
+
+    def test_empty(self):
+
+        text = self.encode(make_arrays([], []), meta={'name': 'nothing'})
+        parser = Parser(yaml.safe_load(text))
+
+        self.assertEqual(parser.meta.name, 'nothing')
+        self.assertEqual(len(ParseGenerator(parser).generate_arrays()), 0)
+
+    def test_scalar(self):
+
+        for value in ('stone', 'true', 'null', '1.5', 'a: b', 'x #y', 'é'):
+            self.assertEqual(yaml.safe_load(scalar(value)), value)
+
+        self.assertEqual(scalar('wool.red'), 'wool.red')
+
+
+if __name__ == '__main__':
+    unittest.main()
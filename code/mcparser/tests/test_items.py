@@ -0,0 +1,223 @@
+import unittest
+
+from mcparser import (
+    Context,
+    GeneratorContext,
+    GeneratorItem,
+    Item,
+    ItemSuffix,
+    ParseGenerator,
+    Parser,
+    UnexpectedSuffixException,
+    parse_items,
+    _parse_items_slowly
+)
+
+
+class TestParseItems(unittest.TestCase):
+
+    def assertSameAsItems(self, strings, fields=None):
+
+        suffix = ItemSuffix(fields)
+
+        coordinates, suffixes = parse_items(strings, suffix)
+        expected_coordinates, expected_suffixes = _parse_items_slowly(
+            strings,
+            suffix
+        )
+
+        self.assertEqual(coordinates.tolist(), expected_coordinates.tolist())
+        self.assertEqual(len(suffixes), len(expected_suffixes))
+
+        for (codes, values), (expected_codes, expected_values) in zip(
+            suffixes,
+            expected_suffixes
+        ):
+
+            self.assertEqual(
+                [values[code] for code in codes.tolist()],
+                [expected_values[code] for code in expected_codes.tolist()]
+            )
+
+    def test_coordinates(self):
+
+        self.assertSameAsItems(['0,0,0', '1,-2,3', ' 4 , 5 ,6 ', '-0,07,8'])
+
+    def test_suffixes(self):
+
+        strings = [
+            '0,0,0,wool.red',
+            '1,0,0',
+            '2,0,0, wool.blue ',
+            '3,0,0,wool.red',
+            '4,0,0,'
+        ]
+
+        self.assertSameAsItems(strings, ['material'])
+
+    def test_two_field_suffixes(self):
+
+        strings = [
+            '{},0,0,{},{}'.format(n, 'wool.red' if n % 3 else 'stone',
+                                  ('north', 'south')[n % 2])
+            for n in range(100)
+        ]
+
+        self.assertSameAsItems(strings, ['material', 'facing'])
+
+    def test_long_suffixes(self):
+
+        strings = [
+            '0,0,0,' + 'x' * 100,
+            '1,0,0,' + 'x' * 99 + 'y',
+            '2,0,0,' + 'x' * 100
+        ]
+
+        self.assertSameAsItems(strings, ['material'])
+
+    def test_unusual_formatting(self):
+
+        for strings in (
+            ['+1,2,3'],
+            ['\t1,2,3'],
+            ['1,2,3\t'],
+            ['١,2,3'],
+            ['1,2,3,wool.réd'],
+            ['2147483647,-2147483648,0']
+        ):
+
+            self.assertSameAsItems(strings, ['material'])
+
+    def test_bad_items(self):
+
+        for strings in (
+            ['1,2'],
+            ['1,2,x'],
+            ['- 1,2,3'],
+            ['1,,3'],
+            ['1,2,3\n4,5,6'],
+            ['2147483648,0,0'],
+            ['1,2,3', '1,2, '],
+            ['1,2,-'],
+            ['1,2,+'],
+            ['1,-,3']
+        ):
+
+            with self.assertRaises((ValueError, OverflowError)):
+                _parse_items_slowly(strings, ItemSuffix(None))
+
+            with self.assertRaises((ValueError, OverflowError)):
+                parse_items(strings, ItemSuffix(None))
+
+    def test_bad_items_with_suffix(self):
+
+        for strings in (['1,2,,N'], ['1,2, ,N'], ['1,2,-,N']):
+
+            with self.assertRaises(ValueError):
+                _parse_items_slowly(strings, ItemSuffix(['facing']))
+
+            with self.assertRaises(ValueError):
+                parse_items(strings, ItemSuffix(['facing']))
+
+    def test_unexpected_suffix(self):
+
+        with self.assertRaises(UnexpectedSuffixException):
+            parse_items(['1,2,3', '4,5,6,stone'], ItemSuffix(None))
+
+        with self.assertRaises(UnexpectedSuffixException):
+            parse_items(['1,2,3,stone,north'], ItemSuffix(['material']))
+
+    def test_interned_suffixes(self):
+
+        strings = ['{},0,0,wool.red'.format(n) for n in range(10)]
+
+        _, [(codes, values)] = parse_items(strings, ItemSuffix(['material']))
+
+        self.assertEqual(values, [None, 'wool.red'])
+        self.assertEqual(codes.tolist(), [1] * 10)
+
+
+class TestRecords(unittest.TestCase):
+
+    def test_no_instance_dict(self):
+
+        context = Context({'items': ['1,2,3']})
+
+        for record in (
+            context,
+            context.items[0],
+            GeneratorContext(),
+            GeneratorItem()
+        ):
+
+            self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_item_attributes(self):
+
+        suffix = ItemSuffix(['material', 'facing'])
+
+        item = Item(suffix, '1,2,3')
+
+        self.assertEqual((item.x, item.y, item.z), (1, 2, 3))
+        self.assertFalse(item.suffix_values)
+
+        item = Item(suffix, '1,2,3,stone,north')
+
+        self.assertEqual(item.suffix_values, ['stone', 'north'])
+
+    def test_defaults_not_shared(self):
+
+        first, second = GeneratorContext(), GeneratorContext()
+        first.values.append('value')
+
+        self.assertEqual(second.values, [])
+
+        third = Context({})
+        third.items.append(Item(third.item_suffix, '1,2,3'))
+
+        self.assertEqual(Context({}).items, [])
+
+    def test_clone_copies_values(self):
+
+        gencontext = GeneratorContext().construct(
+            Context({'values': {'key': 'value'}})
+        )
+
+        clone = gencontext.clone()
+        clone.values['key'] = 'other'
+
+        self.assertEqual(clone.to_dict()['values'], {'key': 'other'})
+        self.assertEqual(gencontext.values, {'key': 'value'})
+
+    def test_clone_keeps_list_values(self):
+
+        # values as the basics.yaml command block writes them
+        data = {
+            'mc-sdf-1': {
+                'version': '1.0',
+                'cells': [{'cell': {'structure': [{'context': {
+                    'material': 'command_block',
+                    'item_suffix': ['facing'],
+                    'values': [{'command': 'give @p gravel 64'}],
+                    'items': ['0,0,0,N', '1,0,0']
+                }}]}}]
+            }
+        }
+
+        pairs = list(ParseGenerator(Parser(data)).generate())
+
+        self.assertEqual(len(pairs), 2)
+
+        for context, _ in pairs:
+            self.assertEqual(
+                context.values, [{'command': 'give @p gravel 64'}]
+            )
+
+        clone = pairs[0][0].clone()
+        clone.values.append({'other': 'value'})
+
+        self.assertEqual(len(pairs[0][0].values), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
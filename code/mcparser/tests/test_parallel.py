@@ -0,0 +1,241 @@
+import os
+import unittest
+import yaml
+
+from mcparser import InvalidKeyException, Parser, ParseGenerator
+from parallel import block_sequence, DocumentLayout, ParallelGenerator
+
+
+def serial_arrays(text, offset=(0, 0, 0)):
+
+    gen = ParseGenerator(Parser(yaml.safe_load(text)))
+    gen.x_offset, gen.y_offset, gen.z_offset = offset
+
+    return gen.generate_arrays()
+
+
+class TestParallelGenerator(unittest.TestCase):
+
+    DATA_FILE_PATH = 'data'
+    DATA_FILE_NAME = 'basics.yaml'
+
+    def setUp(self):
+
+        filename = os.path.join(
+            os.path.dirname(__file__),
+            self.DATA_FILE_PATH,
+            self.DATA_FILE_NAME
+        )
+
+        with open(filename, 'r') as fin:
+            self.text = fin.read()
+
+    def assertSameArrays(self, first, second):
+
+        self.assertEqual(first.blocks.tolist(), second.blocks.tolist())
+        self.assertEqual(first.materials.values, second.materials.values)
+        self.assertEqual(first.facings.values, second.facings.values)
+        self.assertEqual(first.operations.values, second.operations.values)
+
+    def many_cells(self, count):
+
+        data = yaml.safe_load(self.text)
+        cells = data['mc-sdf-1']['cells']
+
+        data['mc-sdf-1']['cells'] = [
+            {'cell': {'structure': [
+                {'context': {
+                    'material': 'wool.{}'.format(n % 3),
+                    'x': n,
+                    'items': ['{},0,0'.format(i) for i in range(n + 1)]
+                }}
+            ]}}
+            for n in range(count)
+        ] + cells
+
+        # yaml.dump sorts the keys, so "cells" comes before "version"
+        return yaml.safe_dump(data, default_flow_style=False)
+
+    def test_matches_serial(self):
+
+        for workers in (1, 3):
+
+            gen = ParallelGenerator(self.text, workers=workers)
+            gen.x_offset, gen.y_offset, gen.z_offset = 100, 64, -20
+
+            self.assertSameArrays(
+                gen.generate_arrays(),
+                serial_arrays(self.text, (100, 64, -20))
+            )
+
+        self.assertEqual(gen.parser.meta.author, 'smilechaser')
+
+    def test_many_cells(self):
+
+        text = self.many_cells(40)
+        gen = ParallelGenerator(text, workers=4)
+
+        self.assertEqual(len(gen.layout.units), 41)
+
+        tasks = gen.layout.tasks(16)
+
+        self.assertTrue(8 < len(tasks) <= 17)
+        self.assertEqual(
+            sum(len(text) for task in tasks for _, text in task),
+            sum(end - start for _, start, end in gen.layout.units)
+        )
+
+        self.assertSameArrays(gen.generate_arrays(), serial_arrays(text))
+
+    def test_split_cells(self):
+
+        layout = DocumentLayout(self.text, split_size=0)
+
+        self.assertEqual(
+            [kind for kind, _, _ in layout.units], ['context'] * 3
+        )
+        self.assertEqual(len(layout.cell_heads), 1)
+
+        gen = ParallelGenerator(self.text, workers=2, split_size=0)
+        self.assertSameArrays(gen.generate_arrays(), serial_arrays(self.text))
+
+    def test_flow_cells_fall_back(self):
+
+        text = 'mc-sdf-1:\n  version: 1.0\n  cells: [{cell: {structure: [' \
+            '{context: {material: stone, items: ["0,0,0", "1,0,0"]}}]}}]\n'
+
+        gen = ParallelGenerator(text, workers=2)
+
+        self.assertFalse(gen.layout.recognised)
+        self.assertSameArrays(gen.generate_arrays(), serial_arrays(text))
+
+    def test_aliases_fall_back(self):
+
+        text = (
+            'mc-sdf-1:\n'
+            '  version: 1.0\n'
+            '  cells:\n'
+            '    - cell:\n'
+            '        structure:\n'
+            '          - context: &wall\n'
+            '              material: stone\n'
+            '              items: ["0,0,0", "1,0,0"]\n'
+            '    - cell:\n'
+            '        structure:\n'
+            '          - context: *wall\n'
+        )
+
+        gen = ParallelGenerator(text, workers=2)
+
+        self.assertFalse(gen.layout.recognised)
+        self.assertEqual(len(gen.generate_arrays()), 4)
+        self.assertSameArrays(gen.generate_arrays(), serial_arrays(text))
+
+        # a "*" inside an item string isn't an alias
+        self.assertTrue(DocumentLayout(
+            text.replace('&wall', '').replace('*wall', '{items: ["2*3"]}')
+        ).recognised)
+
+    def test_continued_lines_fall_back(self):
+
+        head = (
+            'mc-sdf-1:\n'
+            '  version: 1.0\n'
+            '  cells:\n'
+            '    - cell:\n'
+            '        structure:\n'
+            '          - context:\n'
+            '              material: dirt\n'
+            '              items: ["5,0,0"]\n'
+            '          - context:\n'
+            '              material: stone\n'
+        )
+        tail = (
+            '          - context:\n'
+            '              material: sand\n'
+            '              items: ["6,0,0", "7,0,0"]\n'
+        )
+
+        serial = set()
+
+        # a flow sequence and a quoted scalar continued on dedented lines,
+        # which split the document in the wrong places
+        for column in (2, 4, 6, 10):
+
+            indent = ' ' * column
+
+            for text in (
+                head + '              items: ["0,0,0",\n'
+                       '{}"1,0,0"]\n'.format(indent) + tail,
+                head + '              notes: "first line\n'
+                       '{}- second"\n'.format(indent) +
+                       '              items: ["0,0,0", "1,0,0"]\n' + tail
+            ):
+
+                for workers, split_size in ((1, 1 << 20), (2, 0)):
+
+                    gen = ParallelGenerator(
+                        text, workers=workers, split_size=split_size
+                    )
+
+                    self.assertEqual(len(gen.generate_arrays()), 5)
+                    self.assertSameArrays(
+                        gen.generate_arrays(), serial_arrays(text)
+                    )
+
+                    if gen.serial:
+                        serial.add((column, workers))
+
+        # the header, a cell head or a worker's text didn't load
+        self.assertEqual(serial, {
+            (2, 1), (2, 2), (4, 1), (4, 2), (6, 2), (10, 2)
+        })
+
+    def test_errors(self):
+
+        bad_head = self.text.replace(
+            '            structure:', '            bogus: 1\n'
+            '            structure:'
+        )
+
+        with self.assertRaises(InvalidKeyException):
+            ParallelGenerator(bad_head, split_size=0)
+
+        bad_cell = self.many_cells(8).replace('structure:', 'bogus:', 1)
+
+        with self.assertRaises(InvalidKeyException):
+            ParallelGenerator(bad_cell, workers=2).generate_arrays()
+
+    def test_generate(self):
+
+        gen = ParallelGenerator(self.text, workers=1)
+        arrays = serial_arrays(self.text)
+
+        self.assertEqual(
+            [
+                (item.x, item.y, item.z, context.material, context.facing)
+                for context, item in gen.generate()
+            ],
+            [
+                (x, y, z, arrays.materials[m], arrays.facings[f])
+                for x, y, z, m, f, _ in arrays.blocks.tolist()
+            ]
+        )
+
+    def test_block_sequence(self):
+
+        text = 'a:\n  - 1\n  # comment\n  -\n    2\n  - 3\nb: 4\n'
+
+        entries, stop = block_sequence(text, 3, len(text), 0)
+
+        self.assertEqual(
+            [text[start:end] for start, end in entries],
+            ['  - 1\n  # comment\n', '  -\n    2\n', '  - 3\n']
+        )
+        self.assertEqual(text[stop:], 'b: 4\n')
+
+        self.assertIsNone(block_sequence('a:\n  b: 1\n', 3, 10, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mcparser import (
+    BadRepeatException,
+    Context,
+    Facing,
+    Parser,
+    ParseGenerator,
+    Repeat
+)
+from sdfb import compile_document, SdfbParser
+
+
+def document(*contexts):
+
+    return {
+        'mc-sdf-1': {
+            'version': '1.0',
+            'cells': [{'cell': {'structure': [
+                {'context': context} for context in contexts
+            ]}}]
+        }
+    }
+
+
+def generated(data):
+
+    return [
+        (item.x, item.y, item.z, context.material, context.facing)
+        for context, item in ParseGenerator(Parser(data)).generate()
+    ]
+
+
+def arrays(data):
+
+    arrays = ParseGenerator(Parser(data)).generate_arrays()
+
+    return [
+        (x, y, z, arrays.materials[m], arrays.facings[f])
+        for x, y, z, m, f, _ in arrays.blocks.tolist()
+    ]
+
+
+class TestRepeat(unittest.TestCase):
+
+    def test_repeat(self):
+
+        data = document({
+            'material': 'stone',
+            'x': 10,
+            'repeat': {'count': 3, 'step': '4,0,-1'},
+            'items': ['0,0,0', '1,0,0']
+        })
+
+        expected = [
+            (10, 0, 0, 'stone', None), (11, 0, 0, 'stone', None),
+            (14, 0, -1, 'stone', None), (15, 0, -1, 'stone', None),
+            (18, 0, -2, 'stone', None), (19, 0, -2, 'stone', None)
+        ]
+
+        self.assertEqual(generated(data), expected)
+        self.assertEqual(arrays(data), expected)
+
+    def test_step_forms(self):
+
+        for step in ('0,2,0', [0, 2, 0], {'y': 2}):
+
+            repeat = Repeat.parse({'count': 2, 'step': step})
+
+            self.assertEqual(repeat.step, (0, 2, 0))
+            self.assertEqual(Repeat.parse(repeat.data).step, (0, 2, 0))
+
+        self.assertIsNone(Repeat.parse(None))
+
+        for data in ({'step': '1,0,0'}, {'count': 2, 'step': '1,0'},
+                     {'count': -1}, {'count': 'many'}, 5):
+
+            with self.assertRaises(BadRepeatException):
+                Repeat.parse(data)
+
+    def test_nested_contexts(self):
+
+        data = document({
+            'material': 'stone',
+            'facing': 'N',
+            'x': 100,
+            'items': [
+                '0,0,0',
+                {'context': {
+                    'y': 5,
+                    'items': ['0,0,0']
+                }},
+                {'context': {
+                    'material': 'glass',
+                    'z': 1,
+                    'items': [
+                        '0,0,0',
+                        {'context': {'facing': 'E', 'items': ['1,1,1']}}
+                    ]
+                }},
+                '2,0,0'
+            ]
+        })
+
+        expected = [
+            (100, 0, 0, 'stone', Facing.North),
+            (100, 5, 0, 'stone', Facing.North),
+            (100, 0, 1, 'glass', Facing.North),
+            (101, 1, 2, 'glass', Facing.East),
+            (102, 0, 0, 'stone', Facing.North)
+        ]
+
+        self.assertEqual(generated(data), expected)
+        self.assertEqual(arrays(data), expected)
+
+    def test_nested_repeats(self):
+
+        row = {
+            'material': 'wool.red',
+            'repeat': {'count': 3, 'step': [1, 0, 0]},
+            'items': ['0,0,0']
+        }
+
+        data = document({
+            'material': 'stone',
+            'repeat': {'count': 2, 'step': [0, 0, 10]},
+            'items': ['0,9,0', {'context': row}]
+        })
+
+        expected = [(0, 9, 0, 'stone', None)] + [
+            (x, 0, 0, 'wool.red', None) for x in range(3)
+        ]
+        expected += [(x, y, z + 10, m, f) for x, y, z, m, f in expected]
+
+        self.assertEqual(generated(data), expected)
+        self.assertEqual(arrays(data), expected)
+
+    def test_lazy(self):
+
+        data = document({
+            'material': 'stone',
+            'repeat': {'count': 10000, 'step': '0,0,1'},
+            'items': ['0,0,0', '0,1,0']
+        })
+
+        parser = Parser(data)
+        context = parser.cells[0].structure[0]
+
+        self.assertEqual(len(context.item_arrays()[0]), 2)
+
+        blocks = ParseGenerator(parser).generate()
+
+        self.assertEqual(
+            [next(blocks)[1].to_dict() for _ in range(3)],
+            [{'x': 0, 'y': 0, 'z': 0}, {'x': 0, 'y': 1, 'z': 0},
+             {'x': 0, 'y': 0, 'z': 1}]
+        )
+
+        generated = ParseGenerator(parser).generate_arrays()
+
+        self.assertEqual(len(generated), 20000)
+        self.assertEqual(generated.z.max(), 9999)
+
+    def test_parts(self):
+
+        context = Context({
+            'items': ['0,0,0', '1,0,0', {'context': {}}, '2,0,0']
+        })
+
+        parts = list(context.parts())
+
+        self.assertEqual(
+            [len(part[0]) if isinstance(part, tuple) else 'context'
+             for part in parts],
+            [2, 'context', 1]
+        )
+        self.assertEqual(len(context.item_arrays()[0]), 3)
+
+    def test_sdfb(self):
+
+        tempdir = tempfile.mkdtemp()
+
+        try:
+
+            filename = os.path.join(tempdir, 'model.sdfb')
+
+            data = document({
+                'material': 'stone',
+                'repeat': {'count': 4, 'step': '2,0,0'},
+                'items': ['0,0,0', '0,1,0']
+            })
+
+            compile_document(Parser(data), filename)
+
+            parser = SdfbParser(filename)
+
+            self.assertEqual(
+                [
+                    (item.x, item.y, item.z, context.material)
+                    for context, item in ParseGenerator(parser).generate()
+                ],
+                [(x, y, z, m) for x, y, z, m, _ in generated(data)]
+            )
+
+        finally:
+            shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
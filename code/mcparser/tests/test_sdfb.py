@@ -0,0 +1,167 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import yaml
+
+from mcparser import Parser, ParseGenerator, StreamingParser
+from sdfb import (
+    BadSdfbException,
+    compile_document,
+    SdfbParser
+)
+
+
+class TestSdfb(unittest.TestCase):
+
+    DATA_FILE_PATH = 'data'
+    DATA_FILE_NAME = 'basics.yaml'
+
+    def setUp(self):
+
+        filename = os.path.join(
+            os.path.dirname(__file__),
+            self.DATA_FILE_PATH,
+            self.DATA_FILE_NAME
+        )
+
+        with open(filename, 'r') as fin:
+            self.text = fin.read()
+
+        self.data = yaml.safe_load(self.text)
+
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'model.sdfb')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tempdir)
+
+    def blocks(self, parser):
+
+        gen = ParseGenerator(parser)
+        gen.x_offset = 10
+
+        return [
+            (context.to_dict(), item.to_dict())
+            for context, item in gen.generate()
+        ]
+
+    def test_round_trip(self):
+
+        compile_document(Parser(self.data), self.filename)
+
+        parser = SdfbParser(self.filename)
+
+        self.assertEqual(parser.meta.author, 'smilechaser')
+        self.assertEqual(
+            self.blocks(parser),
+            self.blocks(Parser(self.data))
+        )
+
+    def test_arrays(self):
+
+        compile_document(
+            StreamingParser(io.StringIO(self.text)),
+            self.filename
+        )
+
+        expected = ParseGenerator(Parser(self.data)).generate_arrays()
+        actual = ParseGenerator(SdfbParser(self.filename)).generate_arrays()
+
+        def decoded(arrays):
+            return [
+                (
+                    int(row['x']), int(row['y']), int(row['z']),
+                    arrays.materials[row['material']],
+                    arrays.facings[row['facing']],
+                    arrays.operations[row['operation']]
+                )
+                for row in arrays.blocks
+            ]
+
+        self.assertEqual(decoded(actual), decoded(expected))
+
+    def test_large_coordinates(self):
+
+        data = {
+            'mc-sdf-1': {
+                'version': '1.0',
+                'cells': [{'cell': {'structure': [{'context': {
+                    'material': 'stone',
+                    'items': ['0,0,0', '40000,-5,-70000']
+                }}]}}]
+            }
+        }
+
+        compile_document(Parser(data), self.filename)
+
+        arrays = ParseGenerator(SdfbParser(self.filename)).generate_arrays()
+
+        self.assertEqual(arrays.x.tolist(), [0, 40000])
+        self.assertEqual(arrays.z.tolist(), [0, -70000])
+
+    def test_nested_contexts(self):
+
+        text = (
+            'mc-sdf-1:\n'
+            '  version: 1.0\n'
+            '  cells:\n'
+            '    - cell:\n'
+            '        structure:\n'
+            '          - context:\n'
+            '              material: stone\n'
+            '              facing: N\n'
+            '              values: [{command: say hi}]\n'
+            '              item_suffix: [material]\n'
+            '              repeat: {count: 2, step: "5,0,0"}\n'
+            '              items:\n'
+            '                - 0,0,0\n'
+            '                - 1,0,0,dirt\n'
+            '                - context:\n'
+            '                    y: 1\n'
+            '                    item_suffix: [facing]\n'
+            '                    items:\n'
+            '                      - 0,0,0,E\n'
+            '                      - context:\n'
+            '                          material: wool.red\n'
+            '                          z: 40000\n'
+            '                          items: ["0,0,0"]\n'
+            '                - 2,0,0\n'
+            '                - context:\n'
+            '                    material: sand\n'
+            '                    items: []\n'
+        )
+
+        data = yaml.safe_load(text)
+
+        compile_document(StreamingParser(io.StringIO(text)), self.filename)
+
+        parser = SdfbParser(self.filename)
+        context = parser.cells.context(0, 0)
+
+        self.assertTrue(context.nested)
+        self.assertEqual(len(context.items), 5)
+        self.assertEqual(
+            context.item_arrays()[0].tolist(),
+            [[0, 0, 0], [1, 0, 0], [2, 0, 0]]
+        )
+
+        self.assertEqual(len(self.blocks(parser)), 10)
+        self.assertEqual(self.blocks(parser), self.blocks(Parser(data)))
+
+        expected = ParseGenerator(Parser(data)).generate_arrays()
+        actual = ParseGenerator(parser).generate_arrays()
+
+        self.assertEqual(actual.blocks.tolist(), expected.blocks.tolist())
+        self.assertEqual(actual.materials.values, expected.materials.values)
+        self.assertEqual(actual.facings.values, expected.facings.values)
+
+    def test_bad_file(self):
+
+        with open(self.filename, 'wb') as fout:
+            fout.write(b'not an sdfb file at all')
+
+        with self.assertRaises(BadSdfbException):
+            SdfbParser(self.filename)
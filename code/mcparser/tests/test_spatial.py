@@ -0,0 +1,229 @@
+import io
+import os
+import unittest
+
+import numpy as np
+import yaml
+
+from anvil import Box
+from mcparser import (
+    BLOCK_DTYPE,
+    BlockArrays,
+    BlockOperation,
+    Facing,
+    LookupTable,
+    Parser,
+    ParseGenerator
+)
+from spatial import BadIndexFileException, SpatialIndex
+
+
+def make_arrays(rows, materials=('stone',), facings=(None,)):
+    '''rows are (x, y, z, material code, facing code).'''
+
+    blocks = np.array([tuple(row) + (0,) for row in rows], dtype=BLOCK_DTYPE)
+
+    return BlockArrays(
+        blocks,
+        LookupTable(materials),
+        LookupTable(facings),
+        LookupTable([BlockOperation.Replace])
+    )
+
+
+def random_arrays(count, seed=0, spread=100):
+
+    random = np.random.RandomState(seed)
+
+    blocks = np.zeros(count, dtype=BLOCK_DTYPE)
+    blocks['x'] = random.randint(-spread, spread, count)
+    blocks['y'] = random.randint(0, 40, count)
+    blocks['z'] = random.randint(-spread, spread, count)
+    blocks['material'] = random.randint(0, 3, count)
+    blocks['facing'] = random.randint(0, 2, count)
+
+    return BlockArrays(
+        blocks,
+        LookupTable(['stone', 'dirt', 'glass']),
+        LookupTable([None, Facing.East]),
+        LookupTable([BlockOperation.Replace])
+    )
+
+
+def last_blocks(arrays):
+
+    retval = {}
+
+    for x, y, z, m, f, o in arrays.blocks.tolist():
+        retval[(x, y, z)] = (
+            arrays.materials[m], arrays.facings[f], arrays.operations[o]
+        )
+
+    return retval
+
+
+class TestSpatialIndex(unittest.TestCase):
+
+    def test_lookup(self):
+
+        arrays = random_arrays(5000)
+        index = SpatialIndex()
+        index.add(arrays)
+
+        expected = last_blocks(arrays)
+
+        self.assertEqual(len(index), len(expected))
+
+        for point, state in expected.items():
+            self.assertEqual(index.get(*point), state)
+
+        self.assertNotIn((1000, 0, 0), index)
+        self.assertIsNone(index.get(-1000, -1000, -1000))
+
+        self.assertEqual(last_blocks(index.to_arrays()), expected)
+
+    def test_duplicates(self):
+
+        index = SpatialIndex()
+
+        repeated = index.add(make_arrays([
+            (0, 0, 0, 0, 0), (1, 0, 0, 0, 0), (0, 0, 0, 1, 0)
+        ], materials=('stone', 'dirt')))
+
+        self.assertEqual(repeated.tolist(), [[0, 0, 0]])
+        self.assertEqual(index.get(0, 0, 0)[0], 'dirt')
+
+        repeated = index.add(make_arrays([(1, 0, 0, 0, 0), (-5, 0, 0, 0, 0)]))
+
+        self.assertEqual(repeated.tolist(), [[1, 0, 0]])
+        self.assertEqual(len(index), 3)
+
+        # too spread out to number every chunk in between
+        far = 2 ** 30
+
+        repeated = index.add(make_arrays([
+            (-far, far, -far, 0, 0), (far, -far, far, 0, 0),
+            (-far, far, -far, 0, 0)
+        ]))
+
+        self.assertEqual(repeated.tolist(), [[-far, far, -far]])
+        self.assertIn((far, -far, far), index)
+        self.assertEqual(len(index), 5)
+
+    def test_bbox(self):
+
+        index = SpatialIndex()
+
+        self.assertIsNone(index.bbox)
+
+        index.add(make_arrays([(5, 0, 3, 0, 0), (-20, 7, 3, 0, 0)]))
+        index.add(make_arrays([(0, -2, 40, 0, 0)]))
+
+        bbox = index.bbox
+
+        self.assertEqual(
+            (bbox.x1, bbox.y1, bbox.z1, bbox.x2, bbox.y2, bbox.z2),
+            (-20, -2, 3, 5, 7, 40)
+        )
+
+    def test_region(self):
+
+        arrays = random_arrays(5000, seed=1)
+        index = SpatialIndex()
+        index.add(arrays)
+
+        box = Box(-17, 5, -3, 30, 20, 33)
+
+        expected = {
+            point: state for point, state in last_blocks(arrays).items()
+            if -17 <= point[0] <= 30 and 5 <= point[1] <= 20 and
+            -3 <= point[2] <= 33
+        }
+
+        self.assertEqual(last_blocks(index.region(box)), expected)
+        self.assertTrue(index.intersects(box))
+
+        # a box larger than the index visits the index's chunks instead
+        everything = Box(-10 ** 6, -10 ** 6, -10 ** 6, 10 ** 6, 10 ** 6,
+                         10 ** 6)
+
+        self.assertEqual(len(index.region(everything)), len(index))
+        self.assertFalse(index.intersects(Box(500, 0, 0, 600, 10, 10)))
+
+    def test_intersection(self):
+
+        first = SpatialIndex()
+        first.add(random_arrays(3000, seed=2, spread=30))
+
+        second = SpatialIndex()
+        second.add(random_arrays(3000, seed=3, spread=30))
+
+        expected = set(last_blocks(first.to_arrays())) & \
+            set(last_blocks(second.to_arrays()))
+
+        shared = first.intersection(second)
+
+        self.assertTrue(expected)
+        self.assertEqual({tuple(row) for row in shared.tolist()}, expected)
+        self.assertEqual(len(second.intersection(first)), len(expected))
+        self.assertTrue(first.overlaps(second))
+
+        far = SpatialIndex()
+        far.add(make_arrays([(1000, 0, 0, 0, 0)]))
+
+        self.assertFalse(first.overlaps(far))
+        self.assertFalse(first.overlaps(SpatialIndex()))
+
+    def test_save_and_load(self):
+
+        index = SpatialIndex()
+        index.add(random_arrays(2000, seed=4))
+
+        buffer = io.BytesIO()
+        index.save(buffer)
+        buffer.seek(0)
+
+        loaded = SpatialIndex.load(buffer)
+
+        self.assertEqual(len(loaded), len(index))
+        self.assertEqual(repr(loaded.bbox), repr(index.bbox))
+        self.assertEqual(
+            last_blocks(loaded.to_arrays()), last_blocks(index.to_arrays())
+        )
+
+        # loaded indexes keep growing
+        loaded.add(make_arrays([(1000, 0, 0, 0, 0)]))
+
+        self.assertEqual(loaded.get(1000, 0, 0),
+                         ('stone', None, BlockOperation.Replace))
+        self.assertEqual(loaded.bbox.x2, 1000)
+
+        with self.assertRaises(BadIndexFileException):
+            SpatialIndex.load(io.BytesIO(b'not an index'))
+
+    def test_from_generator(self):
+
+        filename = os.path.join(
+            os.path.dirname(__file__), 'data', 'basics.yaml'
+        )
+
+        with open(filename, 'r') as fin:
+            gen = ParseGenerator(Parser(yaml.safe_load(fin)))
+
+        index = SpatialIndex.from_generator(gen)
+
+        expected = {
+            (item.x, item.y, item.z): (
+                context.material, context.facing, context.operation
+            )
+            for context, item in gen.generate()
+        }
+
+        self.assertEqual(len(index), len(expected))
+
+        for point, state in expected.items():
+            self.assertEqual(index.get(*point), state)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import io
+import os
+import unittest
+import yaml
+
+from mcparser import (
+    Parser,
+    ParseGenerator,
+    ParserException,
+    StreamingParser,
+    BadDocumentException,
+    BadVersionException,
+    InvalidKeyException
+)
+
+
+MULTI_CELL = '''
+mc-sdf-1:
+    version: 1.0
+    meta:
+        name: two cells
+    cells:
+        - cell:
+            notes: first
+            structure:
+             - context:
+                material: dirt
+                items:
+                 - 0,0,0
+                 - 1,0,0
+             - context:
+                material: stone
+                y: 5
+                items:
+                 - 0,0,0
+            materials:
+             - dirt
+             - stone
+        - cell:
+            structure:
+             - context:
+                material: piston
+                item_suffix:
+                 - facing
+                items:
+                 - 0,0,0,N
+'''
+
+
+class TestStreamingParser(unittest.TestCase):
+
+    DATA_FILE_PATH = 'data'
+    DATA_FILE_NAME = 'basics.yaml'
+
+    def setUp(self):
+
+        filename = os.path.join(
+            os.path.dirname(__file__),
+            self.DATA_FILE_PATH,
+            self.DATA_FILE_NAME
+        )
+
+        with open(filename, 'r') as fin:
+
+            self.text = fin.read()
+
+    def blocks(self, parser):
+
+        return [
+            (context.to_dict(), item.to_dict())
+            for context, item in ParseGenerator(parser).generate()
+        ]
+
+    def test_matches_parser(self):
+
+        for text in (self.text, MULTI_CELL):
+
+            expected = self.blocks(Parser(yaml.safe_load(text)))
+            actual = self.blocks(StreamingParser(io.StringIO(text)))
+
+            self.assertEqual(actual, expected)
+
+    def test_pure_python_loader(self):
+
+        parser = StreamingParser(io.StringIO(self.text), yaml.SafeLoader)
+
+        self.assertEqual(
+            self.blocks(parser),
+            self.blocks(Parser(yaml.safe_load(self.text)))
+        )
+
+    def test_meta(self):
+
+        parser = StreamingParser(io.StringIO(self.text))
+
+        self.assertEqual(parser.meta.author, 'smilechaser')
+        self.assertEqual(parser.meta.name, 'woolly piston commands')
+
+    def test_cells_are_lazy(self):
+
+        parser = StreamingParser(io.StringIO(MULTI_CELL))
+
+        cells = parser.cells
+        first = next(cells)
+
+        self.assertEqual(first.notes, 'first')
+        self.assertIsNone(first.materials)
+
+        # skip the first cell's structure entirely
+        second = next(cells)
+        self.assertEqual(first.materials, ['dirt', 'stone'])
+        self.assertEqual(
+            [c.material for c in second.structure], ['piston']
+        )
+
+        self.assertEqual(list(cells), [])
+
+        with self.assertRaises(ParserException):
+            parser.cells
+
+    def test_bad_documents(self):
+
+        with self.assertRaises(BadDocumentException):
+            StreamingParser(io.StringIO('other: 1\n'))
+
+        with self.assertRaises(BadDocumentException):
+            StreamingParser(io.StringIO('mc-sdf-1:\n    cells: []\n'))
+
+        with self.assertRaises(BadVersionException):
+            StreamingParser(io.StringIO('mc-sdf-1:\n    version: 1.1\n'))
+
+        parser = StreamingParser(io.StringIO(
+            'mc-sdf-1:\n'
+            '    version: 1.0\n'
+            '    cells:\n'
+            '        - cell:\n'
+            '            bogus: 1\n'
+        ))
+
+        with self.assertRaises(InvalidKeyException):
+            list(parser.cells)
+
+        parser = StreamingParser(io.StringIO(
+            'mc-sdf-1:\n'
+            '    version: 1.0\n'
+            '    cells:\n'
+            '        - cell: &a\n'
+            '            notes: x\n'
+            '        - cell: *a\n'
+        ))
+
+        with self.assertRaises(BadDocumentException):
+            list(parser.cells)
@@ -0,0 +1,249 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import structure
+from anvil import read_nbt
+from blockstates import block_name
+from mcparser import (
+    BLOCK_DTYPE,
+    BlockArrays,
+    BlockOperation,
+    Facing,
+    LookupTable,
+    Parser,
+    ParseGenerator
+)
+from structure import (
+    BadTileSizeException,
+    read_structure,
+    StructureWriter
+)
+
+
+def random_arrays(count, seed=0, spread=60):
+
+    random = np.random.RandomState(seed)
+
+    blocks = np.zeros(count, dtype=BLOCK_DTYPE)
+    blocks['x'] = random.randint(-spread, spread, count)
+    blocks['y'] = random.randint(0, 20, count)
+    blocks['z'] = random.randint(-spread, spread, count)
+    blocks['material'] = random.randint(0, 3, count)
+    blocks['facing'] = random.randint(0, 3, count)
+
+    return BlockArrays(
+        blocks,
+        LookupTable(['stone', 'piston', 'wool.red']),
+        LookupTable([None, Facing.East, Facing.Down]),
+        LookupTable([BlockOperation.Replace])
+    )
+
+
+def expected_blocks(arrays):
+    '''Maps coordinates to (block name, facing); the last block wins. Only
+    pistons keep their facing.'''
+
+    retval = {}
+
+    for x, y, z, m, f, _ in arrays.blocks.tolist():
+
+        material = arrays.materials[m]
+
+        retval[(x, y, z)] = (
+            block_name(material),
+            arrays.facings[f] if material == 'piston' else None
+        )
+
+    return retval
+
+
+def read_tiles(tiles):
+    '''The blocks of every tile, in world coordinates.'''
+
+    retval = {}
+
+    for tile in tiles:
+
+        size, arrays = read_structure(tile.filename)
+
+        assert size == tile.size
+
+        for x, y, z, m, f, _ in arrays.blocks.tolist():
+
+            position = (
+                x + tile.origin[0], y + tile.origin[1], z + tile.origin[2]
+            )
+
+            assert position not in retval
+
+            retval[position] = (
+                'minecraft:' + arrays.materials[m], arrays.facings[f]
+            )
+
+    return retval
+
+
+class TestStructure(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+
+        self.tempdir.cleanup()
+
+    def test_template(self):
+
+        data = {
+            'mc-sdf-1': {
+                'version': '1.0',
+                'cells': [{'cell': {'structure': [
+                    {'context': {'material': 'wool.red', 'items': ['0,0,0']}},
+                    {'context': {
+                        'material': 'piston',
+                        'item_suffix': ['facing'],
+                        'items': ['1,0,0,N', '2,0,0,N', '0,0,0,U']
+                    }}
+                ]}}]
+            }
+        }
+
+        gen = ParseGenerator(Parser(data))
+        gen.x_offset, gen.y_offset, gen.z_offset = 10, 64, -5
+
+        tiles = StructureWriter(self.tempdir.name, 'model').write(
+            gen.generate_arrays()
+        )
+
+        self.assertEqual(len(tiles), 1)
+
+        tile = tiles[0]
+
+        self.assertEqual(tile.name, 'model')
+        self.assertEqual(tile.origin, (10, 64, -5))
+        self.assertEqual(tile.size, (3, 1, 1))
+        self.assertEqual(tile.count, 3)
+        self.assertEqual(tile.command(), 'place template minecraft:model '
+                                         '10 64 -5')
+
+        with gzip.open(tile.filename, 'rb') as fin:
+            root = read_nbt(fin.read())
+
+        self.assertEqual(root['size'], [3, 1, 1])
+        self.assertEqual(root['entities'], [])
+
+        # the wool was replaced; both north pistons share an entry
+        self.assertEqual(root['palette'], [
+            {'Name': 'minecraft:piston', 'Properties': {'facing': 'north'}},
+            {'Name': 'minecraft:piston', 'Properties': {'facing': 'up'}}
+        ])
+        self.assertEqual(root['blocks'], [
+            {'state': 1, 'pos': [0, 0, 0]},
+            {'state': 0, 'pos': [1, 0, 0]},
+            {'state': 0, 'pos': [2, 0, 0]}
+        ])
+
+    def test_tiles_round_trip(self):
+
+        arrays = random_arrays(20000)
+
+        tiles = StructureWriter(
+            self.tempdir.name, 'model', tile_size=16
+        ).write(arrays)
+
+        # 120 x 20 x 120 blocks in 16 block tiles
+        self.assertEqual(len(tiles), 8 * 2 * 8)
+        self.assertEqual(
+            sorted(os.listdir(self.tempdir.name))[:2],
+            ['model_0_0_0.nbt', 'model_0_0_1.nbt']
+        )
+
+        for tile in tiles:
+            self.assertTrue(all(0 < side <= 16 for side in tile.size))
+
+        expected = expected_blocks(arrays)
+
+        self.assertEqual(sum(tile.count for tile in tiles), len(expected))
+        self.assertEqual(read_tiles(tiles), expected)
+
+    def test_batches(self):
+
+        arrays = random_arrays(5000, seed=1, spread=10)
+        batch_size = structure.BATCH_SIZE
+
+        try:
+            structure.BATCH_SIZE = 7
+            tiles = StructureWriter(self.tempdir.name, 'model').write(arrays)
+        finally:
+            structure.BATCH_SIZE = batch_size
+
+        self.assertEqual(read_tiles(tiles), expected_blocks(arrays))
+
+    def test_block_states(self):
+
+        arrays = BlockArrays(
+            np.array(
+                [(x, 0, 0, m, f, 0) for x, (m, f) in enumerate([
+                    (0, 1), (0, 2), (0, 3), (1, 2), (1, 0), (1, 1),
+                    (2, 1), (2, 0), (0, 0)
+                ])],
+                dtype=BLOCK_DTYPE
+            ),
+            LookupTable(['log2.acacia', 'torch', 'stone']),
+            LookupTable([Facing.Up, Facing.East, Facing.North, Facing.Other]),
+            LookupTable([BlockOperation.Replace])
+        )
+
+        tile, = StructureWriter(self.tempdir.name, 'model').write(arrays)
+
+        with gzip.open(tile.filename, 'rb') as fin:
+            root = read_nbt(fin.read())
+
+        self.assertEqual(
+            [
+                root['palette'][block['state']]
+                for block in sorted(root['blocks'], key=lambda b: b['pos'])
+            ],
+            [
+                {'Name': 'minecraft:acacia_log', 'Properties': {'axis': 'x'}},
+                {'Name': 'minecraft:acacia_log', 'Properties': {'axis': 'z'}},
+                {'Name': 'minecraft:acacia_log'},
+                {'Name': 'minecraft:wall_torch',
+                 'Properties': {'facing': 'north'}},
+                {'Name': 'minecraft:torch'},
+                {'Name': 'minecraft:wall_torch',
+                 'Properties': {'facing': 'east'}},
+                {'Name': 'minecraft:stone'},
+                {'Name': 'minecraft:stone'},
+                {'Name': 'minecraft:acacia_log', 'Properties': {'axis': 'y'}}
+            ]
+        )
+
+        # stone is one state whatever its facing
+        self.assertEqual(len(root['palette']), 8)
+        self.assertEqual(tile.states, 8)
+
+    def test_empty_and_bad_sizes(self):
+
+        empty = BlockArrays(
+            np.zeros(0, dtype=BLOCK_DTYPE),
+            LookupTable(),
+            LookupTable(),
+            LookupTable()
+        )
+
+        self.assertEqual(
+            StructureWriter(self.tempdir.name, 'model').write(empty), []
+        )
+
+        with self.assertRaises(BadTileSizeException):
+            StructureWriter(self.tempdir.name, 'model', tile_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+
+import numpy as np
+
+from mcparser import (
+    BLOCK_DTYPE,
+    BlockArrays,
+    BlockOperation,
+    Facing,
+    LookupTable
+)
+from transform import BadTransformException, Transform, TransformGenerator
+
+
+FACINGS = (None, Facing.North, Facing.East, Facing.Up)
+
+
+def make_arrays(rows):
+    '''rows are (x, y, z, facing code).'''
+
+    blocks = np.array(
+        [(x, y, z, 0, facing, 0) for x, y, z, facing in rows],
+        dtype=BLOCK_DTYPE
+    )
+
+    return BlockArrays(
+        blocks,
+        LookupTable(['piston']),
+        LookupTable(FACINGS),
+        LookupTable([BlockOperation.Replace])
+    )
+
+
+def block_set(arrays):
+
+    return {
+        (x, y, z, arrays.facings[facing])
+        for x, y, z, _, facing, _ in arrays.blocks.tolist()
+    }
+
+
+ROWS = [(1, 0, 0, 1), (0, 1, 2, 2), (3, 2, -1, 3), (0, 0, 0, 0)]
+
+
+class FakeGenerator:
+
+    def __init__(self, arrays):
+
+        self.arrays = arrays
+
+        self.x_offset = 0
+        self.y_offset = 0
+        self.z_offset = 0
+
+    def generate_arrays(self):
+        return self.arrays
+
+
+class TestTransform(unittest.TestCase):
+
+    def test_rotate(self):
+
+        arrays = make_arrays(ROWS)
+
+        rotated = Transform(rotate=90).apply(arrays)
+
+        # x, z becomes -z, x; north becomes east, east becomes south
+        self.assertEqual(block_set(rotated), {
+            (0, 0, 1, Facing.East),
+            (-2, 1, 0, Facing.South),
+            (1, 2, 3, Facing.Up),
+            (0, 0, 0, None)
+        })
+
+        # the input is left alone and the codes are kept
+        self.assertEqual(block_set(arrays), block_set(make_arrays(ROWS)))
+        np.testing.assert_array_equal(
+            rotated.blocks['facing'], arrays.blocks['facing']
+        )
+
+    def test_full_turn(self):
+
+        arrays = make_arrays(ROWS)
+
+        for rotate in (0, 90, 180, 270):
+
+            transform = Transform(rotate=rotate)
+
+            result = arrays
+
+            for _ in range(4):
+                result = transform.apply(result, origin=(5, 7, -3))
+
+            self.assertEqual(block_set(result), block_set(arrays))
+
+        half = Transform(rotate=180)
+
+        self.assertEqual(
+            block_set(half.apply(arrays)),
+            block_set(Transform(rotate=90).apply(
+                Transform(rotate=90).apply(arrays)
+            ))
+        )
+
+    def test_mirror(self):
+
+        arrays = make_arrays(ROWS)
+
+        self.assertEqual(block_set(Transform(mirror='x').apply(arrays)), {
+            (-1, 0, 0, Facing.North),
+            (0, 1, 2, Facing.West),
+            (-3, 2, -1, Facing.Up),
+            (0, 0, 0, None)
+        })
+
+        self.assertEqual(block_set(Transform(mirror='z').apply(arrays)), {
+            (1, 0, 0, Facing.South),
+            (0, 1, -2, Facing.East),
+            (3, 2, 1, Facing.Up),
+            (0, 0, 0, None)
+        })
+
+        # mirroring comes first: mirror x then turn = turn then mirror z
+        self.assertEqual(
+            block_set(Transform(rotate=90, mirror='x').apply(arrays)),
+            block_set(Transform(mirror='z').apply(
+                Transform(rotate=90).apply(arrays)
+            ))
+        )
+
+    def test_origin_and_translate(self):
+
+        gen = FakeGenerator(make_arrays([(10, 64, 10, 1), (11, 64, 10, 2)]))
+
+        gen.x_offset, gen.y_offset, gen.z_offset = 10, 64, 10
+
+        transformed = TransformGenerator(
+            gen, Transform(rotate=180, translate=(1, 2, 3))
+        )
+
+        self.assertEqual(block_set(transformed.generate_arrays()), {
+            (11, 66, 13, Facing.South),
+            (10, 66, 13, Facing.West)
+        })
+
+        contexts = {
+            (item.x, item.y, item.z): context.facing
+            for context, item in transformed.generate()
+        }
+
+        self.assertEqual(contexts, {
+            (11, 66, 13): Facing.South,
+            (10, 66, 13): Facing.West
+        })
+
+    def test_bad_transforms(self):
+
+        for kwargs in ({'rotate': 45}, {'mirror': 'y'},
+                       {'translate': (1, 2)}, {'translate': 'abc'}):
+
+            with self.assertRaises(BadTransformException):
+                Transform(**kwargs)
+
+        self.assertTrue(Transform(rotate=360).identity)
+        self.assertFalse(Transform(translate=(0, 1, 0)).identity)
+
+
+if __name__ == '__main__':
+    unittest.main()
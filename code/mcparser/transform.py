@@ -0,0 +1,180 @@
+'''
+    Whole-model transforms: quarter turns about the Y axis, mirroring and
+    translation of generated blocks, for placing the same structure in
+    different orientations.
+
+    A transform is an integer matrix on the horizontal (x, z) plane plus a
+    translation, applied to every coordinate of a BlockArrays buffer with a
+    handful of whole-column operations. Facings go through the same matrix
+    as unit vectors, so only the (few) values of the facing LookupTable
+    change and the blocks keep their codes; facing dependent data values
+    follow when the blocks' materials are resolved.
+
+    Blocks turn and mirror about an origin, normally the build position, so
+    the block at the position stays where it is. Mirroring comes first,
+    then rotation, then translation.
+'''
+
+import numpy as np
+
+from mcparser import BlockArrays, Facing, LookupTable, ParserException
+
+
+AXES = ('x', 'z')
+
+ROTATIONS = (0, 90, 180, 270)
+
+# a clockwise quarter turn seen from above: north (-z) becomes east (+x)
+QUARTER_TURN = np.array([[0, -1], [1, 0]], dtype=np.int64)
+
+MIRRORS = {
+    None: np.identity(2, dtype=np.int64),
+    'x': np.array([[-1, 0], [0, 1]], dtype=np.int64),
+    'z': np.array([[1, 0], [0, -1]], dtype=np.int64)
+}
+
+# (x, z) unit vectors of the horizontal facings
+FACING_VECTORS = {
+    Facing.North: (0, -1),
+    Facing.East: (1, 0),
+    Facing.South: (0, 1),
+    Facing.West: (-1, 0)
+}
+
+VECTOR_FACINGS = {
+    vector: facing for facing, vector in FACING_VECTORS.items()
+}
+
+
+class BadTransformException(ParserException):
+    '''Represents an invalid rotation, mirror axis or translation.'''
+    pass
+
+
+class Transform:
+    '''Rotate by "rotate" degrees clockwise (seen from above, a multiple of
+    90), after mirroring along the "mirror" axis ("x", "z" or None), then
+    move by "translate" (x, y, z).'''
+
+    __slots__ = ('rotate', 'mirror', 'translate', 'matrix')
+
+    def __init__(self, rotate=0, mirror=None, translate=(0, 0, 0)):
+
+        if rotate % 90:
+
+            raise BadTransformException(
+                'Can only rotate by multiples of 90 degrees, not {}.'.format(
+                    rotate
+                )
+            )
+
+        if mirror not in MIRRORS:
+
+            raise BadTransformException(
+                'Can only mirror along {}, not "{}".'.format(AXES, mirror)
+            )
+
+        try:
+            translate = tuple(int(value) for value in translate)
+        except (TypeError, ValueError):
+            translate = None
+
+        if translate is None or len(translate) != 3:
+
+            raise BadTransformException(
+                'Expected an x, y, z translation.'
+            )
+
+        self.rotate = rotate % 360
+        self.mirror = mirror
+        self.translate = translate
+
+        self.matrix = np.linalg.matrix_power(
+            QUARTER_TURN, self.rotate // 90
+        ) @ MIRRORS[mirror]
+
+    @property
+    def identity(self):
+        return not self.rotate and self.mirror is None and \
+            not any(self.translate)
+
+    @property
+    def data(self):
+
+        return {
+            'rotate': self.rotate,
+            'mirror': self.mirror,
+            'translate': list(self.translate)
+        }
+
+    def facing(self, facing):
+        '''The facing (a Facing or None) after the transform.'''
+
+        vector = FACING_VECTORS.get(facing)
+
+        if vector is None:
+            return facing
+
+        x, z = (self.matrix @ vector).tolist()
+
+        return VECTOR_FACINGS[(x, z)]
+
+    def apply(self, arrays, origin=(0, 0, 0)):
+        '''A transformed copy of arrays (BlockArrays), turned and mirrored
+        about origin.'''
+
+        blocks = arrays.blocks.copy()
+
+        ox, oy, oz = origin
+        tx, ty, tz = self.translate
+
+        x = arrays.x.astype(np.int64) - ox
+        z = arrays.z.astype(np.int64) - oz
+
+        (xx, xz), (zx, zz) = self.matrix.tolist()
+
+        blocks['x'] = xx * x + xz * z + (ox + tx)
+        blocks['z'] = zx * x + zz * z + (oz + tz)
+
+        if ty:
+            blocks['y'] += ty
+
+        # codes stay put, only the table's values turn (one to one)
+        facings = LookupTable(
+            self.facing(facing) for facing in arrays.facings
+        )
+
+        return BlockArrays(
+            blocks,
+            arrays.materials,
+            facings,
+            arrays.operations
+        )
+
+
+class TransformGenerator:
+    '''A generator whose blocks are those of another generator ("gen"),
+    transformed about its offset (the build position).'''
+
+    def __init__(self, gen, transform):
+
+        self.gen = gen
+        self.transform = transform
+
+    @property
+    def parser(self):
+        return self.gen.parser
+
+    @property
+    def origin(self):
+        return self.gen.x_offset, self.gen.y_offset, self.gen.z_offset
+
+    def generate_arrays(self):
+
+        return self.transform.apply(self.gen.generate_arrays(), self.origin)
+
+    def generate(self):
+        '''Yield (GeneratorContext, GeneratorItem) pairs like
+        ParseGenerator.generate(), built from generate_arrays().'''
+
+        yield from self.generate_arrays().generate()
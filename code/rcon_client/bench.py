@@ -0,0 +1,193 @@
+'''
+    bench.py [--sizes 10000 100000 1000000] [--connections N] [--optimize]
+
+    Runs build.py's parser -> RCON pipeline against a local FakeRconServer
+    on synthetic models and reports throughput, send latency and memory.
+'''
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+
+from build import build, RemoteConsole
+from fake_server import FakeRconServer
+from mcparser import Parser, ParseGenerator
+from sender import SenderPool
+
+
+PASSWORD = 'bench'
+
+PALETTE = (
+    'wool.red',
+    'wool.blue',
+    'wool.white',
+    'wool.black'
+)
+
+
+def synthetic_model(blocks):
+    '''A roughly cubic mc-sdf-1 document with the given number of blocks:
+    a solid stone core plus wool items that use a material suffix.'''
+
+    side = int(round(blocks ** (1.0 / 3))) or 1
+
+    stone = []
+    wool = []
+
+    for n in range(blocks):
+
+        x, rest = n % side, n // side
+        z, y = rest % side, rest // side
+
+        # every fourth layer is striped wool
+        if y % 4 == 3:
+            wool.append('{},{},{},{}'.format(
+                x, y, z, PALETTE[(x // 4) % len(PALETTE)]
+            ))
+        else:
+            stone.append('{},{},{}'.format(x, y, z))
+
+    return {
+        'mc-sdf-1': {
+            'version': '1.0',
+            'meta': {'name': 'synthetic {} block model'.format(blocks)},
+            'cells': [{
+                'cell': {
+                    'structure': [
+                        {'context': {'material': 'stone', 'items': stone}},
+                        {'context': {'item_suffix': ['material'],
+                                     'items': wool}}
+                    ]
+                }
+            }]
+        }
+    }
+
+
+def peak_rss():
+    '''Peak resident set size of this process, in bytes (Linux).'''
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run(blocks, connections=1, window=16, latency=0.0, command_cost=0.0,
+        optimize=False):
+
+    data = synthetic_model(blocks)
+
+    latencies = []
+
+    def on_result(result):
+        latencies.append(result.elapsed)
+
+    with FakeRconServer(PASSWORD, latency=latency,
+                        command_cost=command_cost) as server:
+
+        def connect():
+            return RemoteConsole(server.host, server.port, PASSWORD)
+
+        started = time.perf_counter()
+
+        gen = ParseGenerator(Parser(data))
+
+        with SenderPool(connect, size=connections, window=window,
+                        on_result=on_result) as pool:
+
+            build(gen, pool, optimize=optimize)
+
+        elapsed = time.perf_counter() - started
+
+        commands = server.command_count
+
+    latencies = np.array(latencies) * 1000
+
+    return {
+        'blocks': blocks,
+        'commands': commands,
+        'seconds': elapsed,
+        'commands_per_second': commands / elapsed if elapsed else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50)) if commands else 0.0,
+        'p99_ms': float(np.percentile(latencies, 99)) if commands else 0.0,
+        'peak_rss': peak_rss()
+    }
+
+
+ROW = '{:>10} {:>10} {:>9.2f} {:>10.0f} {:>8.3f} {:>8.3f} {:>12.1f}'
+HEADER = '{:>10} {:>10} {:>9} {:>10} {:>8} {:>8} {:>12}'.format(
+    'blocks', 'commands', 'seconds', 'cmds/sec', 'p50 ms', 'p99 ms',
+    'peak RSS MB'
+)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the build pipeline against a fake server.'
+    )
+
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        default=[10000, 100000, 1000000],
+                        help='model sizes (in blocks) to benchmark')
+    parser.add_argument('--connections', type=int, default=1,
+                        help='number of RCON connections')
+    parser.add_argument('--window', type=int, default=16,
+                        help='commands queued per connection')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='simulated round trip latency (seconds)')
+    parser.add_argument('--command-cost', type=float, default=0.0,
+                        help='simulated server time per command (seconds)')
+    parser.add_argument('--optimize', action='store_true',
+                        help='plan /fill commands before sending')
+    parser.add_argument('--json', action='store',
+                        help='also write the results to this file')
+
+    args = parser.parse_args()
+
+    results = []
+
+    print(HEADER)
+
+    for blocks in args.sizes:
+
+        # a fresh process per size so that peak RSS is per model
+        with ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+
+            result = executor.submit(
+                run,
+                blocks,
+                connections=args.connections,
+                window=args.window,
+                latency=args.latency,
+                command_cost=args.command_cost,
+                optimize=args.optimize
+            ).result()
+
+        results.append(result)
+
+        print(ROW.format(
+            result['blocks'],
+            result['commands'],
+            result['seconds'],
+            result['commands_per_second'],
+            result['p50_ms'],
+            result['p99_ms'],
+            result['peak_rss'] / 2 ** 20
+        ))
+
+    if args.json:
+
+        with open(args.json, 'w') as fout:
+            json.dump(results, fout, indent=4)
+
+
+if __name__ == '__main__':
+
+    main()
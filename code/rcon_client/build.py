@@ -16,9 +16,58 @@ sys.path.append('./minecraft-tools')
 sys.path.append('../mcparser')
 
 from api.rcon import RemoteConsole, AuthenticationError, ConnectionError
-from mcparser import Parser, ParseGenerator
-
-from materials import get_material_data
+from mcparser import Parser, ParseGenerator, StreamingParser
+from parallel import ParallelGenerator
+from sdfb import SdfbParser
+from transform import AXES, ROTATIONS, Transform, TransformGenerator
+
+from cache import CommandCache, DEFAULT_MAX_BYTES
+from checkpoint import Checkpoint, DEFAULT_INTERVAL, stream_key
+from chunks import (
+    CHUNK_SIZE,
+    chunk_key,
+    ChunkScheduler,
+    CURVES,
+    DEFAULT_CHUNK_WINDOW,
+    HILBERT
+)
+from datapack import (
+    DatapackWriter,
+    DEFAULT_NAMESPACE,
+    DEFAULT_PACK_FORMAT,
+    function_name
+)
+from journal import Journal
+from materials import (
+    BLOCK_STATES,
+    default_registry,
+    DIALECTS,
+    LEGACY,
+    MaterialTable
+)
+from metrics import Metrics, MetricsReporter, NULL_METRICS
+from optimizer import command_volume, FillPlanner, SETBLOCK_TEMPLATE
+from sender import SenderPool, target_key
+from sinks import (
+    NullSink,
+    Progress,
+    StreamSink,
+    STDOUT,
+    TeeSink,
+    VERBOSITY
+)
+from throttle import (
+    AimdController,
+    DEFAULT_LOAD_COMMAND,
+    DEFAULT_LOAD_PATTERN,
+    LoadProbe,
+    regex_parser,
+    Throttle
+)
+
+
+SDFB_EXTENSION = '.sdfb'
+CHECKPOINT_EXTENSION = '.checkpoint'
 
 
 class MCBuilderException(Exception):
@@ -174,6 +223,443 @@ class Options:
         }
 
 
+def generate_commands(gen, materials=None, metrics=NULL_METRICS):
+    '''Yield one setblock command per block produced by the generator.
+
+    /setblock <x> <y> <z> <TileName> [dataValue]
+        [oldBlockHandling] [dataTag]
+    '''
+
+    if materials is None:
+        materials = MaterialTable()
+
+    last_context = None
+
+    for context, item in metrics.time_iter('generate', gen.generate()):
+
+        # items share their context unless they carry suffix values
+        if context is not last_context:
+
+            last_context = context
+
+            with metrics.timer('materials'):
+                material_data = materials[
+                    materials.id(context.material, context.facing)
+                ]
+
+        values = {
+            'x': item.x,
+            'y': item.y,
+            'z': item.z,
+            'material': material_data.material,
+            'dataValue': material_data.dataValue
+        }
+
+        yield SETBLOCK_TEMPLATE.format(**values).rstrip()
+
+
+def array_commands(arrays, materials):
+    '''Yield one setblock command per row of arrays (mcparser.BlockArrays).'''
+
+    block_ids = materials.block_ids(arrays)
+
+    # the template with each block id's material filled in, ready to take
+    # the coordinates
+    formats = {}
+
+    for (x, y, z), block_id in zip(
+        arrays.coordinates.tolist(),
+        block_ids.tolist()
+    ):
+
+        command = formats.get(block_id)
+
+        if command is None:
+
+            material_data = materials[block_id]
+
+            command = formats[block_id] = SETBLOCK_TEMPLATE.format(
+                x='{0}',
+                y='{1}',
+                z='{2}',
+                material=_escape(material_data.material),
+                dataValue=_escape(material_data.dataValue)
+            ).rstrip().format
+
+        yield command(x, y, z)
+
+
+def _escape(value):
+    '''value, safe to put into a format string.'''
+
+    return str(value).replace('{', '{{').replace('}', '}}')
+
+
+def command_stream(gen, optimize=False, materials=None, journal=None,
+                   scheduler=None, metrics=NULL_METRICS, bulk=False,
+                   cache=None):
+    '''Like generate_stream(), but with a cache slot (cache.CacheSlot) the
+    stream comes from the cache on a hit (gen isn't used) and is recorded
+    into it on a miss; the caller finishes the slot once it knows whether
+    every command went through.'''
+
+    if cache is not None and cache.hit:
+
+        metrics.count('cache_hits')
+
+        return cache.entry.plan, cache.entry.commands()
+
+    plan, commands = generate_stream(
+        gen,
+        optimize,
+        materials,
+        journal,
+        scheduler,
+        metrics,
+        bulk
+    )
+
+    if cache is not None:
+        commands = cache.record(commands, plan)
+
+    return plan, commands
+
+
+def generate_stream(gen, optimize=False, materials=None, journal=None,
+                    scheduler=None, metrics=NULL_METRICS, bulk=False):
+    '''Return (plan, commands) for the generator's model: the FillPlan when
+    optimizing (otherwise None) and an iterator over the commands.
+
+    materials is the MaterialTable to resolve blocks with (one for the
+    default registry if not given). With a journal (journal.Journal) only
+    the blocks that differ from the journalled build are sent. With a
+    scheduler (chunks.ChunkScheduler) the commands go out chunk by chunk,
+    wrapped in forceload commands. Stage timings go to metrics
+    (metrics.Metrics).
+
+    Otherwise blocks are generated one at a time, unless bulk is set: then
+    they are all generated at once, which is a lot faster but holds the
+    whole model in memory.'''
+
+    if materials is None:
+        materials = MaterialTable()
+
+    if not (optimize or bulk) and journal is None and scheduler is None:
+        return None, generate_commands(gen, materials, metrics)
+
+    with metrics.timer('generate'):
+        arrays = gen.generate_arrays()
+
+    metrics.count('blocks_generated', len(arrays))
+
+    if journal is not None:
+
+        with metrics.timer('journal'):
+            arrays = journal.changes(arrays, materials)
+
+    if optimize:
+
+        # keep every region inside one chunk
+        planner = FillPlanner() if scheduler is None \
+            else FillPlanner(tile_size=CHUNK_SIZE)
+
+        with metrics.timer('optimize'):
+            plan = planner.plan(arrays, materials)
+
+        if scheduler is None:
+            return plan, plan.commands
+
+        with metrics.timer('schedule'):
+            regions, schedule = scheduler.order_regions(plan.regions)
+
+        return plan, scheduler.forceload(
+            (region.command for region in regions),
+            schedule
+        )
+
+    if scheduler is None:
+        return None, array_commands(arrays, materials)
+
+    with metrics.timer('schedule'):
+        arrays, schedule = scheduler.order_arrays(arrays)
+
+    return None, scheduler.forceload(
+        array_commands(arrays, materials),
+        schedule
+    )
+
+
+class ResultHandler:
+    '''A SenderPool's on_result for a build: reports each sent command to
+    progress (sinks.Progress) and metrics (metrics.Metrics), and
+    acknowledges it to the checkpoint and throttle (when there are
+    any).'''
+
+    def __init__(self, progress, metrics=NULL_METRICS, checkpoint=None,
+                 throttle=None):
+
+        self.progress = progress
+        self.metrics = metrics
+        self.checkpoint = checkpoint
+        self.throttle = throttle
+
+    def __call__(self, result):
+
+        metrics = self.metrics
+
+        if metrics.enabled:
+
+            metrics.observe('rcon_send_seconds', result.elapsed)
+            metrics.count('commands_sent')
+            metrics.count('blocks_sent', command_volume(result.command))
+
+            if result.attempts > 1:
+                metrics.count('retries', result.attempts - 1)
+
+            with metrics.timer('print'):
+                self.progress.update(result.command, result.response)
+
+        else:
+            self.progress.update(result.command, result.response)
+
+        if self.checkpoint is not None:
+            self.checkpoint.acknowledge(result.seq)
+
+        if self.throttle is not None:
+            self.throttle.acknowledge(result)
+
+
+def build(gen, pool, optimize=False, materials=None, journal=None,
+          checkpoint=None, throttle=None, scheduler=None,
+          metrics=NULL_METRICS, cache=None):
+    '''Send every command for the generator's model through pool (a
+    SenderPool, or a sink wrapping one - see sinks.py). Returns the
+    FillPlan when optimizing, otherwise None.
+
+    With a journal, only changes are sent and the journal is saved once
+    every command went through. With a checkpoint (checkpoint.Checkpoint,
+    fed by the pool's on_result) the commands it has already seen
+    acknowledged are skipped, and it is removed once the build is done.
+    A throttle (throttle.Throttle) paces the commands. For a scheduler
+    (chunks.ChunkScheduler) the pool should use chunks.chunk_key. Stage
+    timings go to metrics (metrics.Metrics). cache is passed on to
+    command_stream(); a recorded stream is only cached once the pool has
+    sent all of it.'''
+
+    plan, commands = command_stream(
+        gen,
+        optimize,
+        materials,
+        journal,
+        scheduler,
+        metrics,
+        cache=cache
+    )
+
+    commands = metrics.time_iter('command_stream', commands)
+
+    if checkpoint is not None:
+        commands = checkpoint.skip(commands)
+
+    # only wrapped when metrics are on, to keep the loop lean otherwise
+    submit = metrics.timed('submit', pool.submit)
+    wait = None if throttle is None \
+        else metrics.timed('throttle', throttle.wait)
+
+    complete = False
+
+    try:
+
+        for command in commands:
+
+            if wait is not None:
+                wait()
+
+            submit(command)
+
+        with metrics.timer('join'):
+            pool.join()
+
+        complete = True
+
+    finally:
+        if cache is not None:
+            cache.finish(complete)
+
+    if journal is not None:
+        journal.save()
+
+    if checkpoint is not None:
+        checkpoint.finish()
+
+    return plan
+
+
+def export_datapack(gen, writer, optimize=False, materials=None,
+                    journal=None, scheduler=None, metrics=NULL_METRICS,
+                    cache=None):
+    '''Write the generator's model into a datapack through writer (a
+    DatapackWriter) instead of sending it. Returns the FillPlan when
+    optimizing, otherwise None.
+
+    With a journal, only changes are written; the journal is left for the
+    caller to save once the datapack has run.'''
+
+    plan, commands = command_stream(
+        gen,
+        optimize,
+        materials,
+        journal,
+        scheduler,
+        metrics,
+        cache=cache
+    )
+
+    complete = False
+
+    try:
+
+        with metrics.timer('write'):
+            writer.write(metrics.time_iter('command_stream', commands))
+
+        complete = True
+
+    finally:
+        if cache is not None:
+            cache.finish(complete)
+
+    return plan
+
+
+def dry_run(gen, sink, optimize=False, materials=None, journal=None,
+            scheduler=None, progress=None, metrics=NULL_METRICS, bulk=True,
+            cache=None):
+    '''Put every command for the generator's model into sink (see
+    sinks.py) without a server; progress (sinks.Progress) is told about
+    each one. Returns the FillPlan when optimizing, otherwise None.
+
+    With a journal, only changes are written; the journal is left for the
+    caller to save. bulk and cache are passed on to command_stream().'''
+
+    plan, commands = command_stream(
+        gen,
+        optimize,
+        materials,
+        journal,
+        scheduler,
+        metrics,
+        bulk,
+        cache
+    )
+
+    commands = metrics.time_iter('command_stream', commands)
+    submit = metrics.timed('submit', sink.submit)
+
+    complete = False
+
+    try:
+
+        if progress is None:
+
+            for command in commands:
+                submit(command)
+
+        else:
+
+            update = progress.update
+
+            for command in commands:
+                submit(command)
+                update(command)
+
+        with metrics.timer('join'):
+            sink.join()
+
+        complete = True
+
+    finally:
+        if cache is not None:
+            cache.finish(complete)
+
+    return plan
+
+
+def run_datapack(pool, writer):
+    '''Have the server load the datapack and run its root function.'''
+
+    # both commands share a key so they stay in order on one connection
+    for command in ('reload', 'function {}'.format(writer.function)):
+        pool.submit(command, key=writer.function)
+
+    pool.join()
+
+
+def load_model(filename, stream=False, workers=None, metrics=NULL_METRICS):
+    '''Return (generator, file) for a model file: the file is left open for
+    streamed models (the caller closes it), otherwise it is None.'''
+
+    if filename.endswith(SDFB_EXTENSION):
+
+        with metrics.timer('load'):
+            return ParseGenerator(SdfbParser(filename)), None
+
+    if stream:
+
+        # the file is read while building, so it stays open until the end
+        fin = open(filename, 'r')
+
+        return ParseGenerator(StreamingParser(fin)), fin
+
+    if workers:
+
+        # loads the document header; its cells are loaded by the workers
+        with metrics.timer('load'):
+            return ParallelGenerator.from_file(filename, workers), None
+
+    with open(filename, 'r') as fin:
+
+        with metrics.timer('yaml_load'):
+            data = yaml.load(fin)
+
+    with metrics.timer('parse'):
+        return ParseGenerator(Parser(data)), None
+
+
+def select_dialect(dialect=None, datapack=False, chunked=False):
+    '''The command dialect for a build: dialect (LEGACY when None), except
+    that datapacks and chunked builds are always in BLOCK_STATES.'''
+
+    # functions, "schedule" and "forceload" only exist from 1.13 on
+    for option, needed in (('--datapack', datapack), ('--chunked', chunked)):
+
+        if not needed:
+            continue
+
+        if dialect == LEGACY:
+            raise BadConfigException(
+                '{} needs the block-states dialect'.format(option)
+            )
+
+        dialect = BLOCK_STATES
+
+    return dialect or LEGACY
+
+
+def print_plan(plan):
+
+    print('Built {} blocks with {} commands ({} saved).'.format(
+        plan.block_count,
+        plan.command_count,
+        plan.saved
+    ))
+
+
+def print_stats(stats):
+    '''Report a throttle sample (throttle.ThrottleStats).'''
+
+    print('[throttle] {}'.format(stats))
+
+
 def main():
 
     # parse our arguments
@@ -208,79 +694,493 @@ def main():
                         default='MC_SDF_PASSWORD',
                         help='')
 
+    parser.add_argument('--stream', action='store_true',
+                        help='read the model incrementally instead of '
+                             'loading the whole file up front')
+
+    parser.add_argument('--workers', type=int, default=None,
+                        help='load and generate the (YAML) model in this '
+                             'many processes')
+
+    parser.add_argument('--optimize', action='store_true',
+                        help='merge identical neighbouring blocks into '
+                             '/fill commands')
+
+    parser.add_argument('--rotate', action='store', type=int, default=0,
+                        choices=ROTATIONS,
+                        help='turn the model clockwise (seen from above) '
+                             'by this many degrees about the position')
+    parser.add_argument('--mirror', action='store', choices=AXES,
+                        help='mirror the model along this axis (before '
+                             'rotating)')
+
+    #
+    # datapack export
+    #
+    parser.add_argument('--datapack', action='store',
+                        help='write the commands into a datapack in this '
+                             'directory (e.g. <world>/datapacks/mc_sdf) and '
+                             'run it with a single "function" command')
+    parser.add_argument('--function', action='store',
+                        help='datapack function name (default: derived '
+                             'from the model file name)')
+    parser.add_argument('--namespace', action='store',
+                        default=DEFAULT_NAMESPACE,
+                        help='datapack namespace')
+    parser.add_argument('--pack-format', action='store', type=int,
+                        default=DEFAULT_PACK_FORMAT,
+                        help='datapack pack_format for pack.mcmeta')
+    parser.add_argument('--no-run', action='store_true',
+                        help='only write the datapack, don\'t connect')
+
+    parser.add_argument('--chunked', action='store_true',
+                        help='send the blocks chunk by chunk along a '
+                             'space-filling curve, force-loading a sliding '
+                             'window of chunks (needs 1.14.4+ and the '
+                             'block-states dialect)')
+    parser.add_argument('--chunk-window', action='store', type=int,
+                        default=DEFAULT_CHUNK_WINDOW,
+                        help='chunks force-loaded at a time')
+    parser.add_argument('--curve', action='store', choices=CURVES,
+                        default=HILBERT,
+                        help='order in which chunks are visited')
+
+    parser.add_argument('--journal', action='store',
+                        help='build journal file; only blocks that changed '
+                             'since the journalled build at the same '
+                             'position are sent (removed blocks become air)')
+
+    parser.add_argument('--materials', action='store',
+                        help='YAML/JSON material mapping to merge over the '
+                             'default materials.yaml')
+    parser.add_argument('--dialect', action='store', choices=DIALECTS,
+                        help='command dialect: legacy (1.12 block ids and '
+                             'data values) or block-states (1.13+ names and '
+                             'properties); legacy is the default, '
+                             'datapacks and --chunked force block-states')
+
+    #
+    # sending
+    #
+    parser.add_argument('--connections', action='store', type=int,
+                        default=1,
+                        help='number of RCON connections to send over')
+    parser.add_argument('--window', action='store', type=int, default=16,
+                        help='commands queued per connection')
+    parser.add_argument('--max-window', action='store', type=int,
+                        default=64,
+                        help='most commands queued per connection when '
+                             'throttling (the window grows up to it)')
+    parser.add_argument('--retries', action='store', type=int, default=3,
+                        help='times to retry a command after a '
+                             'connection failure')
+    parser.add_argument('--backoff', action='store', type=float,
+                        default=0.5,
+                        help='seconds to wait before reconnecting, doubled '
+                             'after every further failure')
+
+    #
+    # throttling
+    #
+    parser.add_argument('--throttle', action='store_true',
+                        help='adapt the send rate to the server\'s TPS')
+    parser.add_argument('--load-command', action='store',
+                        default=DEFAULT_LOAD_COMMAND,
+                        help='command that reports the server\'s TPS')
+    parser.add_argument('--load-pattern', action='store',
+                        default=DEFAULT_LOAD_PATTERN,
+                        help='regular expression whose first group is the '
+                             'TPS in the load command\'s response (e.g. '
+                             '"Mean TPS: ([0-9.]+)" for "forge tps")')
+    parser.add_argument('--target-tps', action='store', type=float,
+                        default=19.0,
+                        help='back off whenever TPS drops below this')
+    parser.add_argument('--rate', action='store', type=float, default=200.0,
+                        help='initial commands per second when throttling')
+    parser.add_argument('--max-rate', action='store', type=float,
+                        default=20000.0,
+                        help='highest commands per second when throttling')
+    parser.add_argument('--sample-interval', action='store', type=float,
+                        default=2.0,
+                        help='seconds between TPS samples')
+
+    #
+    # checkpoints
+    #
+    parser.add_argument('--checkpoint', action='store',
+                        help='checkpoint file (default: the model file name '
+                             'plus "{}")'.format(CHECKPOINT_EXTENSION))
+    parser.add_argument('--checkpoint-interval', action='store', type=int,
+                        default=DEFAULT_INTERVAL,
+                        help='acknowledged commands between checkpoints')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted build from its '
+                             'checkpoint')
+
+    #
+    # metrics
+    #
+    parser.add_argument('--metrics-json', action='store',
+                        help='write stage timings, counters and the RCON '
+                             'latency histogram to this JSON file')
+    parser.add_argument('--metrics-prometheus', action='store',
+                        help='write the same metrics to this file in the '
+                             'Prometheus text format')
+    parser.add_argument('--metrics-interval', action='store', type=float,
+                        help='also write the metrics every this many '
+                             'seconds during the build')
+
+    #
+    # command cache
+    #
+    parser.add_argument('--cache', action='store_true',
+                        help='reuse the commands of earlier builds of the '
+                             'same model, position and settings (not with '
+                             '--journal)')
+    parser.add_argument('--cache-dir', action='store',
+                        help='cache directory (implies --cache; default: '
+                             '$XDG_CACHE_HOME/mc-sdf-1)')
+    parser.add_argument('--cache-size', action='store', type=float,
+                        default=DEFAULT_MAX_BYTES / 2 ** 20,
+                        help='evict the least recently used commands once '
+                             'the cache is larger than this (MiB)')
+
+    #
+    # output
+    #
+    parser.add_argument('--dry-run', action='store_true',
+                        help='don\'t connect to a server; the commands only '
+                             'go to --output (if given)')
+    parser.add_argument('--output', action='store',
+                        help='also write the commands to this file ("-" for '
+                             'stdout, gzipped if it ends in ".gz")')
+    parser.add_argument('--verbosity', action='store', choices=VERBOSITY,
+                        default='summary',
+                        help='quiet, periodic summaries (the default), or '
+                             'every command (and response) as well')
+    parser.add_argument('--progress-interval', action='store', type=float,
+                        default=5.0,
+                        help='seconds between progress summaries')
+
     args = parser.parse_args()
 
+    if args.dry_run and args.datapack:
+        parser.error('--dry-run and --datapack cannot be combined')
+
+    if args.max_window < args.window:
+        parser.error('--max-window cannot be less than --window')
+
+    try:
+        args.dialect = select_dialect(
+            args.dialect,
+            datapack=bool(args.datapack),
+            chunked=args.chunked
+        )
+    except BadConfigException as exc:
+        parser.error(str(exc))
+
     options = Options.generate(args)
 
-    if not options.password:
+    # keep reports out of commands written to stdout
+    progress = Progress(
+        VERBOSITY[args.verbosity],
+        args.progress_interval,
+        out=sys.stderr if args.output == STDOUT else sys.stdout,
+        label='written' if args.dry_run else 'sent'
+    )
+
+    metrics = NULL_METRICS
+    reporter = None
+
+    if args.metrics_json or args.metrics_prometheus:
+
+        metrics = Metrics()
+
+        metrics.gauge('blocks_per_second', lambda: metrics.counters.get(
+            'blocks_sent', 0
+        ) / metrics.elapsed)
+        metrics.gauge('commands_per_second', lambda: metrics.counters.get(
+            'commands_sent', 0
+        ) / metrics.elapsed)
+
+        reporter = MetricsReporter(
+            metrics,
+            args.metrics_json,
+            args.metrics_prometheus,
+            args.metrics_interval
+        ).start()
+
+    connecting = not (args.datapack and args.no_run) and not args.dry_run
+
+    if connecting and not options.password:
 
         options.password = getpass('Password: ')
 
-    # open the specified file
+    registry = default_registry()
+
+    if args.materials:
+        registry.update_from(args.materials)
+
+    transform = Transform(args.rotate, args.mirror)
+
+    # everything the command stream depends on, apart from a journal
+    settings = {
+        'position': options.position.data,
+        'optimize': args.optimize,
+        'chunked': [args.chunked, args.chunk_window, args.curve],
+        'materials': [registry.tables, registry.variants, registry.facings]
+    }
+
+    if not transform.identity:
+        settings['transform'] = transform.data
 
-    data = None
+    if args.dialect != LEGACY:
+        settings['dialect'] = args.dialect
 
-    with open(options.filename, 'r') as fin:
+    cache = None
 
-        data = yaml.load(fin)
+    if (args.cache or args.cache_dir) and not args.journal:
 
-    parser = Parser(data)
-    gen = ParseGenerator(parser)
+        cache = CommandCache(
+            args.cache_dir,
+            int(args.cache_size * 2 ** 20)
+        ).slot(stream_key([options.filename], **settings))
+
+    gen = None
+    fin = None
+
+    if cache is not None and cache.hit:
+
+        print('Using {} cached commands.'.format(cache.entry.count))
+
+    else:
+
+        gen, fin = load_model(
+            options.filename,
+            stream=args.stream,
+            workers=args.workers,
+            metrics=metrics
+        )
+
+        # provide position context data to the generator
+
+        gen.x_offset = options.position.x
+        gen.y_offset = options.position.y
+        gen.z_offset = options.position.z
+
+        if not transform.identity:
+            gen = TransformGenerator(gen, transform)
+
+    materials = MaterialTable(registry, args.dialect)
+
+    journal = None
+
+    if args.journal:
+
+        journal = Journal(
+            args.journal,
+            (options.position.x, options.position.y, options.position.z)
+        )
+
+    scheduler = None
+
+    if args.chunked:
+        scheduler = ChunkScheduler(args.chunk_window, args.curve)
+
+    writer = None
+
+    if args.datapack:
+
+        writer = DatapackWriter(
+            args.datapack,
+            args.function or function_name(
+                os.path.splitext(os.path.basename(options.filename))[0]
+            ),
+            namespace=args.namespace,
+            pack_format=args.pack_format
+        )
+
+        try:
+            plan = export_datapack(
+                gen,
+                writer,
+                optimize=args.optimize,
+                materials=materials,
+                journal=journal,
+                scheduler=scheduler,
+                metrics=metrics,
+                cache=cache
+            )
+        finally:
+            if fin:
+                fin.close()
+
+        print('Wrote {} commands in {} functions to {} ({}).'.format(
+            writer.command_count,
+            writer.shard_count,
+            args.datapack,
+            writer.function
+        ))
+
+        if plan is not None:
+            print_plan(plan)
+
+        if not connecting:
+
+            if reporter is not None:
+                reporter.stop()
+
+            return
+
+    if args.dry_run:
+
+        sink = StreamSink.open(args.output) if args.output else NullSink()
+
+        try:
+            plan = dry_run(
+                gen,
+                sink,
+                optimize=args.optimize,
+                materials=materials,
+                journal=journal,
+                scheduler=scheduler,
+                progress=progress,
+                metrics=metrics,
+                bulk=not args.stream,
+                cache=cache
+            )
+        finally:
+            sink.close()
+
+            if fin:
+                fin.close()
+
+        progress.finish()
+
+        if plan is not None:
+            print_plan(plan)
+
+        if reporter is not None:
+            reporter.stop()
+
+        return
 
     #
     # connect to server via rcon interface
     #
 
-    rcon = None
-    try:
+    def connect():
 
-        rcon = RemoteConsole(
+        return RemoteConsole(
             options.host,
             options.port,
             options.password
         )
 
-        '''
-        /setblock <x> <y> <z> <TileName> [dataValue]
-            [oldBlockHandling] [dataTag]
-        '''
+    checkpoint = None
 
-        last_context = None
+    if writer is None:
 
-        # provide position context data to the generator
+        checkpoint_file = args.checkpoint or \
+            options.filename + CHECKPOINT_EXTENSION
 
-        gen.x_offset = options.position.x
-        gen.y_offset = options.position.y
-        gen.z_offset = options.position.z
+        key = stream_key(
+            [options.filename] + ([args.journal] if args.journal else []),
+            **settings
+        )
+
+        if args.resume:
+            checkpoint = Checkpoint.resume(
+                checkpoint_file,
+                key,
+                args.checkpoint_interval
+            )
+            print('Resuming after {} commands.'.format(checkpoint.start))
+        else:
+            checkpoint = Checkpoint(
+                checkpoint_file,
+                key,
+                args.checkpoint_interval
+            )
 
-        for context, item in gen.generate():
+    on_result = ResultHandler(progress, metrics, checkpoint)
+
+    pool = SenderPool(
+        connect,
+        size=args.connections,
+        # room for the largest window the throttle may open; its limit
+        # keeps the commands in flight to the current one
+        window=args.max_window if args.throttle else args.window,
+        retries=args.retries,
+        retry_exceptions=(ConnectionError, OSError),
+        on_result=on_result,
+        key=target_key if scheduler is None else chunk_key,
+        backoff=args.backoff
+    )
 
-            if context != last_context:
-                last_context = context
+    sink = pool
 
-            material_data = get_material_data(
-                last_context.material,
-                last_context.facing
-            )
+    if args.output:
+        sink = TeeSink(pool, StreamSink.open(args.output))
 
-            values = {
-                'x': item.x,
-                'y': item.y,
-                'z': item.z,
-                'material': material_data.material,
-                'dataValue': material_data.dataValue
-            }
+    probe = None
+    throttle = None
 
-            command = 'setblock {x} {y} {z} {material} {dataValue}'.format(
-                **values
-            )
+    if args.throttle:
 
-            print(command)
+        probe = LoadProbe(
+            connect,
+            args.load_command,
+            regex_parser(args.load_pattern),
+            retry_exceptions=(ConnectionError, OSError)
+        )
+
+        throttle = Throttle(
+            probe,
+            AimdController(
+                rate=args.rate,
+                max_rate=args.max_rate,
+                target=args.target_tps,
+                window=args.window * args.connections,
+                max_window=args.max_window * args.connections
+            ),
+            pool=pool,
+            interval=args.sample_interval,
+            on_sample=print_stats
+        )
 
-            response, response_id = rcon.send(command)
+        on_result.throttle = throttle
 
-            if response:
-                print(response.decode())
+    try:
+
+        sink.start()
+
+        if writer is not None:
+
+            run_datapack(sink, writer)
+
+            if journal is not None:
+                journal.save()
+
+        else:
+
+            plan = build(
+                gen,
+                sink,
+                optimize=args.optimize,
+                materials=materials,
+                journal=journal,
+                checkpoint=checkpoint,
+                throttle=throttle,
+                scheduler=scheduler,
+                metrics=metrics,
+                cache=cache
+            )
+
+        progress.finish()
+
+        if writer is None and plan is not None:
+            print_plan(plan)
 
     except AuthenticationError as exc:
         print('AuthenticationError: (details="{}")'.format(exc))
@@ -288,8 +1188,26 @@ def main():
         print('ConnectionError: Check that your server is running and you '
               'have specified the correct hostname and port.')
     finally:
-        if rcon:
-            rcon.disconnect()
+        try:
+            sink.close()
+        except (ConnectionError, OSError):
+            pass
+
+        if probe is not None:
+            probe.close()
+
+        if checkpoint is not None and not checkpoint.finished:
+
+            checkpoint.save()
+
+            print('Stopped after {} commands; run again with --resume to '
+                  'continue.'.format(checkpoint.acknowledged))
+
+        if fin:
+            fin.close()
+
+        if reporter is not None:
+            reporter.stop()
 
 if __name__ == '__main__':
 
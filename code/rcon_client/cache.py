@@ -0,0 +1,319 @@
+'''
+    An on-disk cache of resolved command streams.
+
+    A build's command stream only depends on the model file, the position,
+    the material tables and the optimizer/scheduler settings, so all of
+    that is hashed (see checkpoint.stream_key) into the key the stream is
+    cached under. A hit streams the commands straight from the cache
+    without loading the model at all.
+
+    Every entry is a gzipped text file with one command per line plus a
+    small JSON index (the command count and the fill plan's figures).
+    Streams are recorded while they are being sent, but only become entries
+    once the build says every command went through (CacheSlot.finish()),
+    so a failed or interrupted build leaves nothing behind. The least
+    recently used entries are evicted once the cache grows beyond its size
+    limit.
+'''
+
+import gzip
+import json
+import os
+import tempfile
+import time
+
+from sinks import StreamSink
+
+
+FORMAT_VERSION = 1
+
+COMMANDS_EXTENSION = '.commands.gz'
+INDEX_EXTENSION = '.json'
+
+DEFAULT_MAX_BYTES = 1 << 30
+
+# fast beats small here; level 1 still takes commands to around a tenth
+COMPRESS_LEVEL = 1
+
+
+def default_directory():
+    '''$XDG_CACHE_HOME/mc-sdf-1 (~/.cache/mc-sdf-1 by default).'''
+
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+
+    return os.path.join(base, 'mc-sdf-1')
+
+
+class CachedPlan:
+    '''The figures of a cached stream's FillPlan (for reporting).'''
+
+    def __init__(self, block_count, command_count):
+
+        self.block_count = block_count
+        self.command_count = command_count
+
+    @property
+    def saved(self):
+        return self.block_count - self.command_count
+
+    @property
+    def data(self):
+
+        return {
+            'block_count': self.block_count,
+            'command_count': self.command_count
+        }
+
+
+class CacheEntry:
+    '''A cached command stream.'''
+
+    def __init__(self, filename, index):
+
+        self.filename = filename
+        self.count = index['count']
+
+        plan = index.get('plan')
+        self.plan = None if plan is None else CachedPlan(**plan)
+
+    def commands(self):
+        '''Yield the commands, in order.'''
+
+        with gzip.open(self.filename, 'rt') as fin:
+
+            for line in fin:
+                yield line[:-1]
+
+
+class CacheSlot:
+    '''Where one key's stream is (or will be) cached: entry is the cached
+    stream, or None on a miss.'''
+
+    def __init__(self, cache, key):
+
+        self.cache = cache
+        self.key = key
+        self.entry = cache.get(key)
+        self.recording = None
+
+    @property
+    def hit(self):
+        return self.entry is not None
+
+    def record(self, commands, plan=None):
+        '''Return the commands as a CacheRecording for this key; finish()
+        decides whether it becomes the entry.'''
+
+        self.recording = self.cache.record(self.key, commands, plan)
+
+        return self.recording
+
+    def finish(self, complete=True):
+        '''Cache the recorded stream if complete (every command went
+        through), otherwise drop it.'''
+
+        if self.recording is not None:
+            self.recording.finish(complete)
+            self.recording = None
+
+
+class CacheRecording:
+    '''A command stream being recorded for key: iterating yields the
+    commands, writing them to a temporary file, which finish() turns into
+    key's entry once they were all taken and went through.'''
+
+    def __init__(self, cache, key, commands, plan=None):
+
+        self.cache = cache
+        self.key = key
+        self.commands = commands
+        self.plan = plan
+
+        # set once every command was taken
+        self.count = None
+
+        self._temporary = None
+
+    def __iter__(self):
+
+        fd, self._temporary = tempfile.mkstemp(
+            dir=self.cache.directory, suffix=COMMANDS_EXTENSION + '.tmp'
+        )
+        os.close(fd)
+
+        sink = StreamSink(
+            gzip.open(self._temporary, 'wt', compresslevel=COMPRESS_LEVEL),
+            owned=True
+        )
+
+        taken = False
+
+        try:
+
+            for command in self.commands:
+                sink.submit(command)
+                yield command
+
+            taken = True
+
+        finally:
+
+            sink.close()
+
+            if taken:
+                self.count = sink.count
+            else:
+                self._discard()
+
+    def finish(self, complete=True):
+        '''Store the stream as key's entry if complete and every command
+        was taken, otherwise remove it.'''
+
+        if self._temporary is None:
+            return
+
+        if complete and self.count is not None:
+            self.cache._store(self.key, self._temporary, self.count,
+                              self.plan)
+            self._temporary = None
+        else:
+            self._discard()
+
+    def _discard(self):
+
+        try:
+            os.remove(self._temporary)
+        except FileNotFoundError:
+            pass
+
+        self._temporary = None
+
+
+class CommandCache:
+    '''The cache in directory, kept to at most max_bytes.'''
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+
+        self.directory = directory or default_directory()
+        self.max_bytes = max_bytes
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _paths(self, key):
+
+        base = os.path.join(self.directory, key)
+
+        return base + COMMANDS_EXTENSION, base + INDEX_EXTENSION
+
+    def slot(self, key):
+        return CacheSlot(self, key)
+
+    def get(self, key):
+        '''The CacheEntry for key, or None.'''
+
+        commands, index = self._paths(key)
+
+        try:
+
+            with open(index, 'r') as fin:
+                data = json.load(fin)
+
+            if data.get('version') != FORMAT_VERSION or \
+                    not os.path.exists(commands):
+                return None
+
+            # entries are evicted least recently used first
+            now = time.time()
+            os.utime(index, (now, now))
+
+        except (OSError, ValueError):
+            return None
+
+        return CacheEntry(commands, data)
+
+    def record(self, key, commands, plan=None):
+        '''A CacheRecording of commands for key; plan is the stream's
+        FillPlan (if any).'''
+
+        return CacheRecording(self, key, commands, plan)
+
+    def _store(self, key, temporary, count, plan):
+
+        commands, index = self._paths(key)
+
+        os.replace(temporary, commands)
+
+        data = {
+            'version': FORMAT_VERSION,
+            'count': count,
+            'plan': None if plan is None else CachedPlan(
+                plan.block_count, plan.command_count
+            ).data
+        }
+
+        with open(index + '.tmp', 'w') as fout:
+            json.dump(data, fout)
+
+        os.replace(index + '.tmp', index)
+
+        self.evict()
+
+    def entries(self):
+        '''(last used, bytes, key) of every entry, least recently used
+        first.'''
+
+        retval = []
+
+        for name in os.listdir(self.directory):
+
+            if not name.endswith(INDEX_EXTENSION):
+                continue
+
+            key = name[:-len(INDEX_EXTENSION)]
+            commands, index = self._paths(key)
+
+            try:
+                size = os.path.getsize(commands) + os.path.getsize(index)
+                used = os.path.getmtime(index)
+            except OSError:
+                continue
+
+            retval.append((used, size, key))
+
+        return sorted(retval)
+
+    @property
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        '''Remove least recently used entries until the cache fits in
+        max_bytes. Returns the keys removed.'''
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        removed = []
+
+        for _, size, key in entries:
+
+            if total <= self.max_bytes:
+                break
+
+            self.remove(key)
+
+            total -= size
+            removed.append(key)
+
+        return removed
+
+    def remove(self, key):
+
+        # the index goes first, so a half removed entry is never a hit
+        for path in reversed(self._paths(key)):
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
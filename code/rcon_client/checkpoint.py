@@ -0,0 +1,153 @@
+'''
+    Checkpoints for resuming an interrupted build.
+
+    A build's command stream is deterministic, so a checkpoint only needs
+    to remember how many of its commands were acknowledged (in order) and
+    which build it belongs to.
+'''
+
+import hashlib
+import itertools
+import json
+import os
+
+
+FORMAT_VERSION = 1
+
+# acknowledged commands between checkpoint writes
+DEFAULT_INTERVAL = 1000
+
+
+class CheckpointException(Exception):
+    '''Base Exception class for this module.'''
+    pass
+
+
+class BadCheckpointException(CheckpointException):
+    '''Represents a missing, unreadable or mismatched checkpoint.'''
+    pass
+
+
+def stream_key(filenames, **settings):
+    '''A digest of everything a command stream depends on: the contents of
+    filenames (those that exist) and the settings (which must be JSON
+    serializable).'''
+
+    digest = hashlib.sha1()
+
+    for filename in filenames:
+
+        digest.update(filename.encode('utf-8'))
+
+        if not os.path.exists(filename):
+            continue
+
+        with open(filename, 'rb') as fin:
+
+            for chunk in iter(lambda: fin.read(1 << 20), b''):
+                digest.update(chunk)
+
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    '''Tracks the acknowledged prefix of a command stream and writes it to
+    filename every "interval" commands.
+
+    Commands are numbered by the SenderPool that sends them (SendResult.seq)
+    and may be acknowledged out of order; only the unbroken run from the
+    start counts, so a resumed build may repeat a few commands but never
+    skips one.'''
+
+    def __init__(self, filename, key, interval=DEFAULT_INTERVAL):
+
+        self.filename = filename
+        self.key = key
+        self.interval = interval
+
+        # commands acknowledged by earlier runs
+        self.start = 0
+
+        self.acknowledged = 0
+        self.finished = False
+
+        self._saved = 0
+        self._out_of_order = set()
+
+    @classmethod
+    def resume(clz, filename, key, interval=DEFAULT_INTERVAL):
+        '''Continue from the checkpoint in filename.'''
+
+        try:
+            with open(filename, 'r') as fin:
+                data = json.load(fin)
+        except (OSError, ValueError) as exc:
+            raise BadCheckpointException(
+                'Could not read checkpoint "{}" ({}).'.format(filename, exc)
+            )
+
+        if data.get('version') != FORMAT_VERSION:
+            raise BadCheckpointException('Unsupported checkpoint version.')
+
+        if data.get('key') != key:
+            raise BadCheckpointException(
+                'Checkpoint "{}" belongs to a different build (model, '
+                'position or settings changed).'.format(filename)
+            )
+
+        retval = clz(filename, key, interval)
+        retval.start = retval.acknowledged = retval._saved = \
+            data['acknowledged']
+
+        return retval
+
+    def skip(self, commands):
+        '''The part of the commands iterable that is still to be sent.'''
+
+        return itertools.islice(commands, self.start, None)
+
+    def acknowledge(self, seq):
+        '''Record that command seq (counted from the first one sent by this
+        run) was acknowledged.'''
+
+        index = self.start + seq
+
+        if index != self.acknowledged:
+            self._out_of_order.add(index)
+            return
+
+        self.acknowledged += 1
+
+        while self.acknowledged in self._out_of_order:
+            self._out_of_order.remove(self.acknowledged)
+            self.acknowledged += 1
+
+        if self.acknowledged - self._saved >= self.interval:
+            self.save()
+
+    def save(self):
+
+        data = {
+            'version': FORMAT_VERSION,
+            'key': self.key,
+            'acknowledged': self.acknowledged
+        }
+
+        temporary = self.filename + '.tmp'
+
+        with open(temporary, 'w') as fout:
+            json.dump(data, fout)
+
+        os.replace(temporary, self.filename)
+
+        self._saved = self.acknowledged
+
+    def finish(self):
+        '''The build completed - the checkpoint is no longer needed.'''
+
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+        self.finished = True
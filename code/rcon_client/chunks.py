@@ -0,0 +1,220 @@
+'''
+    Chunk-ordered scheduling: blocks are grouped by 16x16 chunk, the chunks
+    are visited along a space-filling curve and only a sliding window of
+    them is force-loaded at a time.
+
+    "forceload" only exists from 1.14.4 on, so the commands it wraps have
+    to be in the materials.BLOCK_STATES dialect (build.py --chunked sees to
+    that).
+'''
+
+import numpy as np
+
+from mcparser import BlockArrays
+
+
+CHUNK_SIZE = 16
+CHUNK_SHIFT = 4
+
+HILBERT = 'hilbert'
+ZORDER = 'zorder'
+
+CURVES = (HILBERT, ZORDER)
+
+# chunks force-loaded at once
+DEFAULT_CHUNK_WINDOW = 4
+
+FORCELOAD_TEMPLATE = 'forceload {action} {x} {z}'
+
+
+class ScheduleException(Exception):
+    '''Base Exception class for this module.'''
+    pass
+
+
+def _bits(values):
+
+    return max(int(values.max()).bit_length(), 1) if len(values) else 1
+
+
+def hilbert_keys(x, z):
+    '''Position of every (x, z) (non-negative integer arrays) along a
+    Hilbert curve covering them.'''
+
+    x = x.astype(np.int64)
+    z = z.astype(np.int64)
+
+    n = 1 << max(_bits(x), _bits(z))
+
+    retval = np.zeros(len(x), dtype=np.int64)
+
+    s = n >> 1
+
+    while s > 0:
+
+        rx = (x & s) > 0
+        rz = (z & s) > 0
+
+        retval += s * s * ((3 * rx) ^ rz)
+
+        # rotate the quadrant so that the curve stays continuous
+        flip = rx & ~rz
+        x = np.where(flip, n - 1 - x, x)
+        z = np.where(flip, n - 1 - z, z)
+
+        swap = ~rz
+        x, z = np.where(swap, z, x), np.where(swap, x, z)
+
+        s >>= 1
+
+    return retval
+
+
+def zorder_keys(x, z):
+    '''Position of every (x, z) (non-negative integer arrays) along a
+    Z-order (Morton) curve.'''
+
+    retval = np.zeros(len(x), dtype=np.int64)
+
+    x = x.astype(np.int64)
+    z = z.astype(np.int64)
+
+    for bit in range(max(_bits(x), _bits(z))):
+
+        retval |= ((x >> bit) & 1) << (2 * bit)
+        retval |= ((z >> bit) & 1) << (2 * bit + 1)
+
+    return retval
+
+
+CURVE_KEYS = {
+    HILBERT: hilbert_keys,
+    ZORDER: zorder_keys
+}
+
+
+def chunk_key(command):
+    '''A SenderPool key that sends everything for one chunk (setblock, fill
+    by its first corner, forceload) over the same connection, in order.'''
+
+    parts = command.split(' ', 4)
+
+    try:
+
+        if parts[0] == 'forceload':
+            return int(parts[2]) >> CHUNK_SHIFT, int(parts[3]) >> CHUNK_SHIFT
+
+        if parts[0] in ('setblock', 'fill'):
+            return int(parts[1]) >> CHUNK_SHIFT, int(parts[3]) >> CHUNK_SHIFT
+
+    except (IndexError, ValueError):
+        pass
+
+    return command
+
+
+class ChunkSchedule:
+    '''The chunk order of a set of blocks: order sorts them chunk by chunk
+    (stable, so blocks within a chunk keep their relative order), chunks
+    lists the (chunk x, chunk z) of each group and counts its size.'''
+
+    def __init__(self, order, chunks, counts):
+
+        self.order = order
+        self.chunks = chunks
+        self.counts = counts
+
+
+class ChunkScheduler:
+    '''Orders blocks (or fill regions) by chunk along a space-filling curve
+    and wraps their commands in "forceload add/remove" so that at most
+    "window" chunks are force-loaded at a time.'''
+
+    def __init__(self, window=DEFAULT_CHUNK_WINDOW, curve=HILBERT):
+
+        if curve not in CURVE_KEYS:
+            raise ScheduleException('Unknown curve "{}".'.format(curve))
+
+        if window < 1:
+            raise ScheduleException('The window must be at least 1 chunk.')
+
+        self.window = window
+        self.curve = curve
+
+    def schedule(self, x, z):
+        '''Return the ChunkSchedule for blocks at x, z (integer arrays).'''
+
+        if not len(x):
+            return ChunkSchedule(np.zeros(0, dtype=np.int64), [], [])
+
+        cx = np.right_shift(x.astype(np.int64), CHUNK_SHIFT)
+        cz = np.right_shift(z.astype(np.int64), CHUNK_SHIFT)
+
+        keys = CURVE_KEYS[self.curve](cx - cx.min(), cz - cz.min())
+
+        order = np.argsort(keys, kind='stable')
+
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.diff(sorted_keys)) + 1
+        starts = np.concatenate(([0], starts))
+
+        counts = np.diff(np.concatenate((starts, [len(order)])))
+
+        first = order[starts]
+        chunks = list(zip(cx[first].tolist(), cz[first].tolist()))
+
+        return ChunkSchedule(order, chunks, counts.tolist())
+
+    def order_arrays(self, arrays):
+        '''Return (BlockArrays in chunk order, ChunkSchedule).'''
+
+        schedule = self.schedule(arrays.x, arrays.z)
+
+        ordered = BlockArrays(
+            arrays.blocks[schedule.order],
+            arrays.materials,
+            arrays.facings,
+            arrays.operations
+        )
+
+        return ordered, schedule
+
+    def order_regions(self, regions):
+        '''Return (regions in chunk order, ChunkSchedule); a region belongs
+        to the chunk of its first corner.'''
+
+        schedule = self.schedule(
+            np.array([r.x1 for r in regions], dtype=np.int64),
+            np.array([r.z1 for r in regions], dtype=np.int64)
+        )
+
+        return [regions[n] for n in schedule.order.tolist()], schedule
+
+    def forceload(self, commands, schedule):
+        '''Yield commands (already in schedule order) with the forceload
+        commands for schedule's sliding window around them.'''
+
+        commands = iter(commands)
+        chunks = schedule.chunks
+
+        for chunk in chunks[:self.window]:
+            yield self._forceload('add', chunk)
+
+        for n, (chunk, count) in enumerate(zip(chunks, schedule.counts)):
+
+            for _ in range(count):
+                yield next(commands)
+
+            yield self._forceload('remove', chunk)
+
+            if n + self.window < len(chunks):
+                yield self._forceload('add', chunks[n + self.window])
+
+    @staticmethod
+    def _forceload(action, chunk):
+
+        return FORCELOAD_TEMPLATE.format(
+            action=action,
+            x=chunk[0] * CHUNK_SIZE,
+            z=chunk[1] * CHUNK_SIZE
+        )
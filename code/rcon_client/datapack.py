@@ -0,0 +1,203 @@
+'''
+    Writes a command stream into a datapack so that the server can run a
+    whole build itself, started by a single "function" command.
+
+    The commands are split into numbered shard functions of at most
+    max_commands lines. Each shard ends by scheduling the next one for the
+    following tick, so every shard gets its own maxCommandChainLength
+    budget, and the root function just schedules the first shard:
+
+        <directory>/pack.mcmeta
+        <directory>/data/<namespace>/functions/<name>.mcfunction
+        <directory>/data/<namespace>/functions/<name>/part_00000.mcfunction
+        ...
+
+    Datapacks need 1.13 and "schedule" 1.14, which only take block state
+    commands ("setblock 0 64 0 minecraft:red_wool"), so the commands have
+    to be resolved in the materials.BLOCK_STATES dialect; build.py always
+    does that for datapacks.
+'''
+
+import json
+import os
+import re
+
+
+# the default value of the maxCommandChainLength gamerule
+MAX_FUNCTION_COMMANDS = 65536
+
+DEFAULT_NAMESPACE = 'mc_sdf'
+
+# 1.13 - 1.14.4 (the packs need 1.14 for "schedule")
+DEFAULT_PACK_FORMAT = 4
+
+# pack formats from this one on use "function" rather than "functions"
+SINGULAR_FUNCTION_FORMAT = 45
+
+SHARD_TEMPLATE = 'part_{:05d}'
+
+SCHEDULE_TEMPLATE = 'schedule function {} 1t'
+
+NAME_REGEX = re.compile('^[a-z0-9_.-]+(/[a-z0-9_.-]+)*$')
+
+
+class DatapackException(Exception):
+    '''Base Exception class for this module.'''
+    pass
+
+
+def function_name(text):
+    '''Turn text (e.g. a model's file name) into a valid function name.'''
+
+    retval = re.sub('[^a-z0-9_.-]+', '_', text.lower()).strip('_.')
+
+    return retval or 'build'
+
+
+class DatapackWriter:
+    '''Streams commands into a datapack (see the module docstring).'''
+
+    def __init__(self, directory, name, namespace=DEFAULT_NAMESPACE,
+                 max_commands=MAX_FUNCTION_COMMANDS,
+                 pack_format=DEFAULT_PACK_FORMAT, description=None):
+
+        for value in (namespace, name):
+
+            if not NAME_REGEX.match(value):
+                raise DatapackException(
+                    'Invalid function name "{}".'.format(value)
+                )
+
+        # one line of every shard is the "schedule" of the next
+        if max_commands < 2:
+            raise DatapackException('max_commands must be at least 2.')
+
+        self.directory = directory
+        self.name = name
+        self.namespace = namespace
+        self.max_commands = max_commands
+        self.pack_format = pack_format
+        self.description = description or 'mc-sdf-1 build {}'.format(name)
+
+        self.command_count = 0
+        self.shard_count = 0
+
+    @property
+    def function(self):
+        '''The id to pass to the "function" command.'''
+
+        return '{}:{}'.format(self.namespace, self.name)
+
+    @property
+    def functions_directory(self):
+
+        return os.path.join(
+            self.directory,
+            'data',
+            self.namespace,
+            'function' if self.pack_format >= SINGULAR_FUNCTION_FORMAT
+            else 'functions'
+        )
+
+    def shard_function(self, index):
+
+        return '{}/{}'.format(self.function, SHARD_TEMPLATE.format(index))
+
+    def write(self, commands):
+        '''Write every command in the commands iterable. Only one shard is
+        open at a time, so memory use doesn't depend on the command count.
+        Returns the function id.'''
+
+        self._write_meta()
+
+        shard_directory = os.path.join(self.functions_directory, self.name)
+        os.makedirs(shard_directory, exist_ok=True)
+
+        self._remove_old_shards(shard_directory)
+
+        self.command_count = 0
+        self.shard_count = 0
+
+        per_shard = self.max_commands - 1
+        fout = None
+
+        try:
+
+            for command in commands:
+
+                if self.command_count % per_shard == 0:
+
+                    if fout is not None:
+                        self._close_shard(fout, self.shard_count)
+
+                    fout = open(
+                        os.path.join(
+                            shard_directory,
+                            SHARD_TEMPLATE.format(self.shard_count) +
+                            '.mcfunction'
+                        ),
+                        'w',
+                        encoding='utf-8'
+                    )
+
+                    self.shard_count += 1
+
+                fout.write(command)
+                fout.write('\n')
+
+                self.command_count += 1
+
+        finally:
+
+            if fout is not None:
+                fout.close()
+
+        self._write_root()
+
+        return self.function
+
+    def _close_shard(self, fout, next_index):
+
+        fout.write(SCHEDULE_TEMPLATE.format(self.shard_function(next_index)))
+        fout.write('\n')
+        fout.close()
+
+    def _write_root(self):
+
+        lines = []
+
+        if self.shard_count:
+            lines.append(SCHEDULE_TEMPLATE.format(self.shard_function(0)))
+
+        filename = os.path.join(
+            self.functions_directory,
+            self.name + '.mcfunction'
+        )
+
+        with open(filename, 'w', encoding='utf-8') as fout:
+
+            for line in lines:
+                fout.write(line + '\n')
+
+    def _write_meta(self):
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        meta = {
+            'pack': {
+                'pack_format': self.pack_format,
+                'description': self.description
+            }
+        }
+
+        with open(os.path.join(self.directory, 'pack.mcmeta'), 'w') as fout:
+            json.dump(meta, fout, indent=4)
+
+    @staticmethod
+    def _remove_old_shards(directory):
+
+        # a shorter build must not leave a previous one's shards behind
+        for filename in os.listdir(directory):
+
+            if re.match('^part_[0-9]+\\.mcfunction$', filename):
+                os.remove(os.path.join(directory, filename))
@@ -0,0 +1,256 @@
+'''
+    An in-process stand-in for a Minecraft server's RCON interface.
+
+    It speaks the RCON packet framing (little-endian int32 length, request
+    id and type followed by a NUL terminated body and a NUL pad byte) and
+    the Minecraft flavour of authentication, so RemoteConsole can connect
+    to it exactly as it would to a real server.
+'''
+
+import collections
+import socketserver
+import struct
+import threading
+import time
+
+
+SERVERDATA_RESPONSE_VALUE = 0
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_AUTH = 3
+
+# a healthy server runs this many ticks per second
+FULL_TPS = 20.0
+
+TPS_TEMPLATE = 'TPS from last 1m, 5m, 15m: {0:.1f}, {0:.1f}, {0:.1f}'
+
+
+def pack(request_id, packet_type, body):
+    '''Frame an RCON packet.'''
+
+    payload = struct.pack('<ii', request_id, packet_type) + body + b'\x00\x00'
+
+    return struct.pack('<i', len(payload)) + payload
+
+
+def default_response(command):
+
+    if command.startswith('setblock '):
+        return 'Block placed'
+
+    if command.startswith('fill '):
+        return 'Blocks filled'
+
+    return ''
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+
+        server = self.server.owner
+        authenticated = False
+
+        while True:
+
+            packet = self._read_packet()
+
+            if packet is None:
+                return
+
+            request_id, packet_type, body = packet
+
+            if packet_type == SERVERDATA_AUTH:
+
+                authenticated = body.decode() == server.password
+
+                self.request.sendall(pack(
+                    request_id if authenticated else -1,
+                    SERVERDATA_AUTH_RESPONSE,
+                    b''
+                ))
+
+            elif not authenticated:
+
+                return
+
+            elif packet_type == SERVERDATA_EXECCOMMAND:
+
+                response = server.execute(body.decode())
+
+                self.request.sendall(pack(
+                    request_id,
+                    SERVERDATA_RESPONSE_VALUE,
+                    response.encode()
+                ))
+
+            else:
+
+                self.request.sendall(pack(
+                    request_id,
+                    SERVERDATA_RESPONSE_VALUE,
+                    'Unknown request {:x}'.format(packet_type).encode()
+                ))
+
+    def _read_packet(self):
+
+        data = self._read(4)
+
+        if data is None:
+            return None
+
+        length, = struct.unpack('<i', data)
+
+        data = self._read(length)
+
+        if data is None:
+            return None
+
+        request_id, packet_type = struct.unpack('<ii', data[:8])
+
+        return request_id, packet_type, data[8:-2]
+
+    def _read(self, count):
+
+        chunks = []
+
+        while count:
+
+            try:
+                chunk = self.request.recv(count)
+            except OSError:
+                return None
+
+            if not chunk:
+                return None
+
+            chunks.append(chunk)
+            count -= len(chunk)
+
+        return b''.join(chunks)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeRconServer:
+    '''A local RCON server for tests and benchmarks.
+
+    latency is added to every response (it models the network round trip
+    and overlaps between connections). command_cost models the server's
+    main thread: commands from all connections are executed one at a time
+    and each takes that many seconds.
+
+    respond(command) -> str supplies response bodies.
+
+    capacity simulates overload: once commands arrive faster than capacity
+    per second (measured over the last second) the reported TPS falls in
+    proportion. load_command is answered with the TPS, in the format of
+    Spigot/Paper's "tps" command.
+    '''
+
+    def __init__(self, password='', host='127.0.0.1', port=0, latency=0.0,
+                 command_cost=0.0, respond=default_response, record=False,
+                 capacity=None, load_command='tps'):
+
+        self.password = password
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.command_cost = command_cost
+        self.respond = respond
+        self.capacity = capacity
+        self.load_command = load_command
+
+        self.command_count = 0
+        self.commands = [] if record else None
+
+        self._arrivals = collections.deque()
+
+        self._main_thread = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.owner = self
+
+        self.host, self.port = self._server.server_address[:2]
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            daemon=True
+        )
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+
+        if self._server is None:
+            return
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def tps(self):
+        '''The simulated ticks per second.'''
+
+        with self._main_thread:
+            return self._tps(time.monotonic())
+
+    def _tps(self, now):
+
+        while self._arrivals and self._arrivals[0] < now - 1.0:
+            self._arrivals.popleft()
+
+        if not self.capacity or len(self._arrivals) <= self.capacity:
+            return FULL_TPS
+
+        return FULL_TPS * self.capacity / len(self._arrivals)
+
+    def execute(self, command):
+
+        if command == self.load_command:
+
+            response = TPS_TEMPLATE.format(self.tps)
+
+            if self.latency:
+                time.sleep(self.latency)
+
+            return response
+
+        with self._main_thread:
+
+            if self.capacity:
+                self._arrivals.append(time.monotonic())
+
+            if self.command_cost:
+                time.sleep(self.command_cost)
+
+            self.command_count += 1
+
+            if self.commands is not None:
+                self.commands.append(command)
+
+            response = self.respond(command)
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        return response
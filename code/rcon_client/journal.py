@@ -0,0 +1,228 @@
+'''
+    A build journal: what a model looked like the last time it was built at
+    a given position, so that the next build only sends what changed.
+
+    File layout (little-endian):
+
+        header      magic "SDFJ", format version (uint16), flags (uint16),
+                    position x, y, z (int32), block count (uint64), table
+                    length (uint64)
+        blocks      count JOURNAL_DTYPE records: x, y, z and a block index
+        table       UTF-8 JSON list of [block name, data value] pairs
+'''
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from mcparser import (
+    BlockArrays,
+    BlockOperation,
+    last_occurrences,
+    LookupTable
+)
+from optimizer import coordinate_keys
+
+
+MAGIC = b'SDFJ'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<4sHHiiiQQ')
+
+JOURNAL_DTYPE = np.dtype([
+    ('x', '<i4'),
+    ('y', '<i4'),
+    ('z', '<i4'),
+    ('block', '<u4')
+])
+
+# what a block that is no longer part of the model is replaced with
+REMOVED_MATERIAL = 'air'
+
+
+class JournalException(Exception):
+    '''Base Exception class for this module.'''
+    pass
+
+
+class BadJournalException(JournalException):
+    '''Represents an unreadable journal file.'''
+    pass
+
+
+class Journal:
+    '''The journal file for one model at one position.
+
+    changes() compares a new build with the journal and records the new
+    state, which save() writes out once the build went through. A build
+    that fails part way leaves the journal as it was, so the next attempt
+    simply sends the same changes again.'''
+
+    def __init__(self, filename, position):
+
+        self.filename = filename
+        self.position = tuple(position)
+
+        self.blocks = np.zeros(0, dtype=JOURNAL_DTYPE)
+        self.table = []
+
+        self._pending = None
+
+        if os.path.exists(filename):
+            self._load()
+
+    def _load(self):
+
+        with open(self.filename, 'rb') as fin:
+
+            data = fin.read(HEADER.size)
+
+            if len(data) < HEADER.size:
+                raise BadJournalException('Truncated journal.')
+
+            magic, version, flags, x, y, z, count, table_length = \
+                HEADER.unpack(data)
+
+            if magic != MAGIC:
+                raise BadJournalException('Not a build journal.')
+
+            if version != FORMAT_VERSION:
+                raise BadJournalException(
+                    'Unsupported journal version {}.'.format(version)
+                )
+
+            # a journal for another position describes other blocks
+            if (x, y, z) != self.position:
+                return
+
+            blocks = np.fromfile(fin, dtype=JOURNAL_DTYPE, count=count)
+            table = fin.read(table_length)
+
+        if len(blocks) != count or len(table) != table_length:
+            raise BadJournalException('Truncated journal.')
+
+        self.blocks = blocks
+        self.table = [tuple(entry) for entry in json.loads(
+            table.decode('utf-8')
+        )]
+
+    def changes(self, arrays, materials):
+        '''Return the blocks of arrays (mcparser.BlockArrays) that differ
+        from the journal, plus an air block for every journalled block the
+        model no longer has, as a new BlockArrays. materials is the
+        MaterialTable that resolves the blocks.'''
+
+        keep = last_occurrences(arrays.coordinates)
+        blocks = arrays.blocks[keep]
+        block_ids = materials.block_ids(arrays)[keep]
+
+        # compare resolved blocks so that a changed material mapping counts
+        # as a change too
+        resolved = LookupTable()
+
+        old_blocks = np.array(
+            [resolved.intern(entry) for entry in self.table],
+            dtype=np.uint32
+        )[self.blocks['block']]
+
+        new_blocks = np.array(
+            [
+                resolved.intern((entry.material, entry.dataValue))
+                for entry in materials.blocks
+            ],
+            dtype=np.uint32
+        )[block_ids]
+
+        old_keys, new_keys = coordinate_keys(self.blocks, blocks)
+
+        order = np.argsort(old_keys, kind='stable')
+        sorted_keys = old_keys[order]
+
+        unchanged = np.zeros(len(blocks), dtype=bool)
+
+        if len(sorted_keys):
+
+            position = np.searchsorted(sorted_keys, new_keys)
+            position = np.minimum(position, len(sorted_keys) - 1)
+
+            unchanged = (
+                (sorted_keys[position] == new_keys) &
+                (old_blocks[order[position]] == new_blocks)
+            )
+
+        removed = self.blocks[~np.isin(old_keys, new_keys)]
+
+        materials_table = LookupTable(arrays.materials)
+        facings_table = LookupTable(arrays.facings)
+        operations_table = LookupTable(arrays.operations)
+
+        air = np.zeros(len(removed), dtype=arrays.blocks.dtype)
+
+        for axis in 'xyz':
+            air[axis] = removed[axis]
+
+        air['material'] = materials_table.intern(REMOVED_MATERIAL)
+        air['facing'] = facings_table.intern(None)
+        air['operation'] = operations_table.intern(BlockOperation.Replace)
+
+        self._pending = self._record(blocks, block_ids, materials)
+
+        return BlockArrays(
+            np.concatenate((blocks[~unchanged], air)),
+            materials_table,
+            facings_table,
+            operations_table
+        )
+
+    @staticmethod
+    def _record(blocks, block_ids, materials):
+
+        retval = np.empty(len(blocks), dtype=JOURNAL_DTYPE)
+
+        for axis in 'xyz':
+            retval[axis] = blocks[axis]
+
+        retval['block'] = block_ids
+
+        table = [
+            (entry.material, entry.dataValue) for entry in materials.blocks
+        ]
+
+        return retval, table
+
+    def save(self):
+        '''Write the state recorded by the last changes() call.'''
+
+        if self._pending is None:
+            raise JournalException('Nothing to save.')
+
+        blocks, table = self._pending
+
+        table_data = json.dumps(table, separators=(',', ':')).encode('utf-8')
+
+        # write a new file and swap it in, so a crash never leaves a
+        # half-written journal
+        temporary = self.filename + '.tmp'
+
+        with open(temporary, 'wb') as fout:
+
+            fout.write(HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                0,
+                self.position[0],
+                self.position[1],
+                self.position[2],
+                len(blocks),
+                len(table_data)
+            ))
+            fout.write(blocks.tobytes())
+            fout.write(table_data)
+
+        os.replace(temporary, self.filename)
+
+        self.blocks = blocks
+        self.table = table
+        self._pending = None
@@ -1,58 +1,275 @@
-from mcparser import Facing
+'''
+    Resolves mc-sdf-1 materials and facings to Minecraft block names and
+    data values, as described by a mapping such as materials.yaml.
+
+    Commands come in two dialects: the legacy one (1.12 and earlier) names
+    blocks by id and numeric data value ("wool 14"), the block state one
+    (1.13 on, which functions, "schedule" and "forceload" need) by name
+    and properties ("minecraft:red_wool", "minecraft:piston[facing=up]").
+    Block states are derived from the same mapping (see
+    mcparser/blockstates.py): its variants give the block names and its
+    facing tables which property a facing sets.
+'''
+
+import os
+
+import numpy as np
+import yaml
+
+from blockstates import block_state, format_state
+from mcparser import LookupTable
+
+
+DEFAULT_MAPPING = os.path.join(os.path.dirname(__file__), 'materials.yaml')
+
+SECTIONS = ('tables', 'variants', 'facings')
+
+LEGACY = 'legacy'
+BLOCK_STATES = 'block-states'
+DIALECTS = (LEGACY, BLOCK_STATES)
+
+class MaterialException(Exception):
+    '''Base Exception class for this module.'''
+    pass
+
+
+class BadMappingException(MaterialException):
+    '''Represents an invalid material mapping.'''
+    pass
+
+
+class UnknownMaterialException(MaterialException, KeyError):
+    '''A variant or facing the mapping has no data value for.'''
+    pass
 
 
 class MaterialData:
 
-    material = None
-    dataValue = ''
-
-WOOL_DICT = {
-
-    'wool.white': 0,
-    'wool.orange': 1,
-    'wool.magenta': 2,
-    'wool.light_blue': 3,
-    'wool.yellow': 4,
-    'wool.lime': 5,
-    'wool.pink': 6,
-    'wool.gray': 7,
-    'wool.light_gray': 8,
-    'wool.cyan': 9,
-    'wool.purple': 10,
-    'wool.blue': 11,
-    'wool.brown': 12,
-    'wool.green': 13,
-    'wool.red': 14,
-    'wool.black': 15
-}
-
-PISTON_FACING_DICT = {
-
-    Facing.Down: 0,
-    Facing.Up: 1,
-    Facing.North: 2,
-    Facing.South: 3,
-    Facing.West: 4,
-    Facing.East: 5
-}
-
-
-# TODO refactor this. ick.
-def get_material_data(material, facing):
+    __slots__ = ('material', 'dataValue')
+
+    def __init__(self, material, dataValue=''):
+
+        self.material = material
+        self.dataValue = dataValue
+
+    def __eq__(self, other):
+
+        return (
+            isinstance(other, MaterialData) and
+            (self.material, self.dataValue) ==
+            (other.material, other.dataValue)
+        )
+
+    def __hash__(self):
+        return hash((self.material, self.dataValue))
+
+    def __repr__(self):
+        return 'MaterialData({!r}, {!r})'.format(self.material, self.dataValue)
+
+
+class MaterialRegistry:
+    '''Maps (material, facing) pairs to MaterialData.
+
+    See materials.yaml for the shape of the mapping.'''
+
+    def __init__(self, data=None):
+
+        self.tables = {}
+        self.variants = {}
+        self.facings = {}
+
+        if data:
+            self.update(data)
+
+    @classmethod
+    def load(clz, filename=DEFAULT_MAPPING):
+        '''Create a registry from a YAML (or JSON) mapping file.'''
+
+        retval = clz()
+        retval.update_from(filename)
+
+        return retval
+
+    def update_from(self, filename):
+
+        with open(filename, 'r') as fin:
+            data = yaml.safe_load(fin)
+
+        self.update(data)
+
+    def update(self, data):
+        '''Merge a mapping into this registry, table by table.'''
+
+        if not isinstance(data, dict) or set(data) - set(SECTIONS):
+
+            raise BadMappingException(
+                'Expected a mapping with the sections {}.'.format(SECTIONS)
+            )
+
+        for name, table in (data.get('tables') or {}).items():
+
+            if not isinstance(table, dict):
+                raise BadMappingException('Table "{}" isn\'t a mapping.'.format(
+                    name
+                ))
+
+            self.tables.setdefault(name, {}).update(table)
+
+        for section in ('variants', 'facings'):
+
+            for block, table in (data.get(section) or {}).items():
+
+                if table not in self.tables:
 
-    md = MaterialData()
+                    raise BadMappingException(
+                        'Block "{}" refers to unknown table "{}".'.format(
+                            block,
+                            table
+                        )
+                    )
 
-    if material.startswith('wool'):
+                getattr(self, section)[block] = table
 
-        md.material = 'wool'
-        md.dataValue = WOOL_DICT[material]
+    def resolve(self, material, facing):
+        '''Return the MaterialData for a material and (Facing or None)
+        facing.'''
 
-    else:
+        block, _, variant = material.partition('.')
 
-        md.material = material
+        data_value = None
 
-        if material in ('piston', 'sticky_piston') and facing is not None:
+        if variant and block in self.variants:
+            data_value = self._lookup(self.variants[block], variant, material)
+        else:
+            block = material
 
-            md.dataValue = PISTON_FACING_DICT[facing]
+        if facing is not None and block in self.facings:
+
+            offset = self._lookup(self.facings[block], facing.name, material)
+            data_value = offset + (data_value or 0)
+
+        return MaterialData(block, '' if data_value is None else data_value)
+
+    def resolve_state(self, material, facing):
+        '''Return the MaterialData (a block state without a data value) for
+        a material and (Facing or None) facing.'''
+
+        block, _, variant = material.partition('.')
+
+        # only for the same errors resolve() raises
+        if variant and block in self.variants:
+            self._lookup(self.variants[block], variant, material)
+
+        if facing is not None and block in self.facings:
+            self._lookup(self.facings[block], facing.name, material)
+
+        return MaterialData(format_state(
+            *block_state(material, facing, self.facings)
+        ))
+
+    def _lookup(self, table, key, material):
+
+        try:
+            return self.tables[table][key]
+        except KeyError:
+
+            raise UnknownMaterialException(
+                'No "{}" value for "{}" in table "{}".'.format(
+                    key,
+                    material,
+                    table
+                )
+            )
+
+
+_default_registry = None
+
+
+def default_registry():
+    '''The registry for materials.yaml, loaded on first use.'''
+
+    global _default_registry
+
+    if _default_registry is None:
+        _default_registry = MaterialRegistry.load()
+
+    return _default_registry
+
+
+class MaterialTable:
+    '''Compiles the (material, facing) pairs of a model into ids, one id per
+    distinct block name and data value, so that builders only need a list
+    lookup per block. dialect is LEGACY or BLOCK_STATES.'''
+
+    def __init__(self, registry=None, dialect=LEGACY):
+
+        if dialect not in DIALECTS:
+
+            raise MaterialException(
+                'Expected one of the dialects {}, not "{}".'.format(
+                    DIALECTS,
+                    dialect
+                )
+            )
+
+        self.registry = registry if registry is not None \
+            else default_registry()
+        self.dialect = dialect
+
+        self.ids = {}
+        self.blocks = LookupTable()
+
+    def id(self, material, facing):
+        '''The id of a (material, facing) pair; facing is a Facing or None.'''
+
+        try:
+            return self.ids[(material, facing)]
+        except KeyError:
+            pass
+
+        if self.dialect == BLOCK_STATES:
+            data = self.registry.resolve_state(material, facing)
+        else:
+            data = self.registry.resolve(material, facing)
+
+        retval = self.blocks.intern(data)
+        self.ids[(material, facing)] = retval
+
+        return retval
+
+    def __getitem__(self, id):
+        return self.blocks[id]
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def block_ids(self, arrays):
+        '''The id of every block in arrays (mcparser.BlockArrays).'''
+
+        facing_count = max(len(arrays.facings), 1)
+
+        pairs = (
+            arrays.blocks['material'].astype(np.int64) * facing_count +
+            arrays.blocks['facing']
+        )
+
+        unique_pairs, pair_index = np.unique(pairs, return_inverse=True)
+
+        lookup = np.array(
+            [
+                self.id(
+                    arrays.materials[pair // facing_count],
+                    arrays.facings[pair % facing_count]
+                )
+                for pair in unique_pairs.tolist()
+            ],
+            dtype=np.uint32
+        )
+
+        return lookup[pair_index.reshape(-1)]
+
+
+def get_material_data(material, facing):
+    '''Resolve a single pair with the default registry.'''
 
-    return md
+    return default_registry().resolve(material, facing)
@@ -0,0 +1,444 @@
+'''
+    Named timers, counters, histograms and gauges for the build pipeline,
+    reported as JSON and in the Prometheus text exposition format.
+
+    Everything takes a metrics object, NULL_METRICS when metrics are off:
+    its timers are a shared do-nothing context manager, time_iter() and
+    timed() hand back the iterable or function itself and the rest are
+    empty methods, so disabled instrumentation costs a method call per
+    stage rather than per block.
+
+    Stage times are inclusive: "command_stream", for instance, covers the
+    "generate" and "materials" time of the commands it produced.
+'''
+
+import bisect
+import json
+import os
+import re
+import threading
+import time
+
+
+PROMETHEUS_PREFIX = 'mcbuild_'
+
+# seconds; Prometheus' default buckets, plus finer ones for local servers
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0
+)
+
+NAME_REGEX = re.compile('[^a-zA-Z0-9_]')
+
+
+class MetricsException(Exception):
+    '''Base Exception class for this module.'''
+    pass
+
+
+def metric_name(name):
+    '''name made safe for Prometheus.'''
+
+    return PROMETHEUS_PREFIX + NAME_REGEX.sub('_', name)
+
+
+class Histogram:
+    '''Counts of observed values per (cumulative) bucket upper bound.'''
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        '''The upper bound of the bucket holding the q quantile (None when
+        empty, inf past the last bucket).'''
+
+        if not self.count:
+            return None
+
+        target = q * self.count
+        seen = 0
+
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+
+            seen += count
+
+            if seen >= target:
+                return bound
+
+    @property
+    def data(self):
+
+        cumulative = []
+        seen = 0
+
+        for count in self.counts:
+            seen += count
+            cumulative.append(seen)
+
+        return {
+            'buckets': dict(zip(
+                [str(bound) for bound in self.buckets] + ['+Inf'],
+                cumulative
+            )),
+            'sum': self.sum,
+            'count': self.count,
+            'p50': _finite(self.quantile(0.5)),
+            'p99': _finite(self.quantile(0.99))
+        }
+
+
+def _finite(value):
+    '''value, or None for infinity (which JSON can't hold).'''
+
+    return None if value == float('inf') else value
+
+
+class _Timing:
+
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.metrics.add_time(self.name, time.perf_counter() - self.started)
+
+
+class _NullTiming:
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class NullMetrics:
+    '''Metrics that aren't recorded.'''
+
+    enabled = False
+
+    _TIMING = _NullTiming()
+
+    def timer(self, name):
+        return self._TIMING
+
+    def time_iter(self, name, iterable):
+        return iterable
+
+    def timed(self, name, function):
+        return function
+
+    def add_time(self, name, seconds, calls=1):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+    def gauge(self, name, value):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class Metrics:
+    '''Named stage timers (calls and seconds), counters, histograms and
+    gauges, safe to update from several threads.
+
+    A gauge's value may be a callable, read whenever a report is made
+    (e.g. a rate over the run so far).'''
+
+    enabled = True
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+
+        self.buckets = buckets
+
+        self.started = time.time()
+        self._clock = time.perf_counter()
+
+        self.timers = {}
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        '''Seconds since the metrics were created.'''
+
+        return time.perf_counter() - self._clock
+
+    def timer(self, name):
+        '''A context manager that adds the time spent in it to name.'''
+
+        return _Timing(self, name)
+
+    def time_iter(self, name, iterable):
+        '''Yield from iterable, adding the time spent producing each item
+        (but not the time spent by the consumer) to name.'''
+
+        iterator = iter(iterable)
+        clock = time.perf_counter
+
+        calls = 0
+        total = 0.0
+
+        try:
+
+            while True:
+
+                started = clock()
+
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    total += clock() - started
+                    return
+
+                total += clock() - started
+                calls += 1
+
+                yield item
+
+                # fold in now and then so periodic reports see progress
+                if not calls & 0x3ff:
+                    self.add_time(name, total, calls)
+                    calls = 0
+                    total = 0.0
+
+        finally:
+            self.add_time(name, total, calls)
+
+    def timed(self, name, function):
+        '''function, with the time spent in its calls added to name.'''
+
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+
+            started = clock()
+
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add_time(name, clock() - started)
+
+        return wrapper
+
+    def add_time(self, name, seconds, calls=1):
+
+        with self._lock:
+
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += calls
+            timer[1] += seconds
+
+    def count(self, name, value=1):
+
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+
+        with self._lock:
+
+            histogram = self.histograms.get(name)
+
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.buckets)
+
+            histogram.observe(value)
+
+    def gauge(self, name, value):
+
+        with self._lock:
+            self.gauges[name] = value
+
+    def _gauge_values(self):
+
+        with self._lock:
+            gauges = dict(self.gauges)
+
+        return {
+            name: value() if callable(value) else value
+            for name, value in gauges.items()
+        }
+
+    def report(self):
+        '''Everything recorded so far, as a JSON-ready dict.'''
+
+        gauges = self._gauge_values()
+
+        with self._lock:
+
+            return {
+                'started': self.started,
+                'elapsed': self.elapsed,
+                'timers': {
+                    name: {'calls': calls, 'seconds': seconds}
+                    for name, (calls, seconds) in self.timers.items()
+                },
+                'counters': dict(self.counters),
+                'histograms': {
+                    name: histogram.data
+                    for name, histogram in self.histograms.items()
+                },
+                'gauges': gauges
+            }
+
+    def prometheus(self):
+        '''Everything recorded so far in the Prometheus text format.'''
+
+        gauges = self._gauge_values()
+
+        lines = []
+
+        def metric(name, kind, samples):
+
+            lines.append('# TYPE {} {}'.format(name, kind))
+
+            for suffix, labels, value in samples:
+                lines.append('{}{}{} {}'.format(
+                    name, suffix, labels, _number(value)
+                ))
+
+        with self._lock:
+
+            if self.timers:
+
+                metric(metric_name('stage_seconds_total'), 'counter', [
+                    ('', '{{stage="{}"}}'.format(name), seconds)
+                    for name, (_, seconds) in sorted(self.timers.items())
+                ])
+
+                metric(metric_name('stage_calls_total'), 'counter', [
+                    ('', '{{stage="{}"}}'.format(name), calls)
+                    for name, (calls, _) in sorted(self.timers.items())
+                ])
+
+            for name, value in sorted(self.counters.items()):
+                metric(metric_name(name + '_total'), 'counter',
+                       [('', '', value)])
+
+            for name, histogram in sorted(self.histograms.items()):
+
+                data = histogram.data
+                samples = [
+                    ('_bucket', '{{le="{}"}}'.format(bound), count)
+                    for bound, count in data['buckets'].items()
+                ]
+                samples.append(('_sum', '', data['sum']))
+                samples.append(('_count', '', data['count']))
+
+                metric(metric_name(name), 'histogram', samples)
+
+        for name, value in sorted(gauges.items()):
+            metric(metric_name(name), 'gauge', [('', '', value)])
+
+        metric(metric_name('elapsed_seconds'), 'gauge',
+               [('', '', self.elapsed)])
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_file=None, prometheus_file=None):
+        '''Write the report to either or both files.'''
+
+        if json_file:
+            _replace(json_file, json.dumps(self.report(), indent=2))
+
+        if prometheus_file:
+            _replace(prometheus_file, self.prometheus())
+
+
+def _number(value):
+
+    if value is None:
+        return 'NaN'
+
+    if isinstance(value, float) and value == float('inf'):
+        return '+Inf'
+
+    return repr(value)
+
+
+def _replace(filename, text):
+
+    temporary = filename + '.tmp'
+
+    with open(temporary, 'w') as fout:
+        fout.write(text)
+
+    os.replace(temporary, filename)
+
+
+class MetricsReporter:
+    '''Writes a Metrics report every interval seconds (from a background
+    thread) and once more when stopped.'''
+
+    def __init__(self, metrics, json_file=None, prometheus_file=None,
+                 interval=None):
+
+        if not (json_file or prometheus_file):
+            raise MetricsException('Nowhere to write metrics to.')
+
+        self.metrics = metrics
+        self.json_file = json_file
+        self.prometheus_file = prometheus_file
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+
+        if self.interval:
+
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        return self
+
+    def _run(self):
+
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+
+        self.metrics.write(self.json_file, self.prometheus_file)
+
+    def stop(self):
+
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self.write()
@@ -0,0 +1,223 @@
+'''
+    Plans the fewest /fill commands needed to build a set of generated blocks.
+'''
+
+import numpy as np
+
+from mcparser import last_occurrences
+
+
+# Minecraft refuses to /fill more than this many blocks in one command
+MAX_FILL_VOLUME = 32768
+
+FILL_TEMPLATE = 'fill {x1} {y1} {z1} {x2} {y2} {z2} {material} {dataValue}'
+SETBLOCK_TEMPLATE = 'setblock {x} {y} {z} {material} {dataValue}'
+
+
+def command_volume(command):
+    '''The number of blocks a setblock or fill command places (0 for any
+    other command).'''
+
+    words = command.split(' ', 7)
+
+    if words[0] == 'setblock':
+        return 1
+
+    if words[0] != 'fill':
+        return 0
+
+    x1, y1, z1, x2, y2, z2 = (int(word) for word in words[1:7])
+
+    return (abs(x2 - x1) + 1) * (abs(y2 - y1) + 1) * (abs(z2 - z1) + 1)
+
+
+class Region:
+    '''An axis-aligned box of identical blocks (inclusive corners).'''
+
+    def __init__(self, x1, y1, z1, x2, y2, z2, material, dataValue):
+
+        self.x1 = x1
+        self.y1 = y1
+        self.z1 = z1
+        self.x2 = x2
+        self.y2 = y2
+        self.z2 = z2
+        self.material = material
+        self.dataValue = dataValue
+
+    @property
+    def volume(self):
+
+        return (
+            (self.x2 - self.x1 + 1) *
+            (self.y2 - self.y1 + 1) *
+            (self.z2 - self.z1 + 1)
+        )
+
+    @property
+    def command(self):
+
+        if self.volume == 1:
+
+            return SETBLOCK_TEMPLATE.format(
+                x=self.x1,
+                y=self.y1,
+                z=self.z1,
+                material=self.material,
+                dataValue=self.dataValue
+            ).rstrip()
+
+        return FILL_TEMPLATE.format(**self.__dict__).rstrip()
+
+
+class FillPlan:
+    '''The result of FillPlanner.plan().'''
+
+    def __init__(self, regions, block_count):
+
+        self.regions = regions
+        self.block_count = block_count
+
+    @property
+    def commands(self):
+
+        for region in self.regions:
+            yield region.command
+
+    @property
+    def command_count(self):
+        return len(self.regions)
+
+    @property
+    def saved(self):
+        '''Number of commands saved compared to one setblock per block.'''
+
+        return self.block_count - self.command_count
+
+
+def coordinate_keys(*blocks):
+    '''One int64 key per block for every array of blocks, equal exactly when
+    the coordinates are.'''
+
+    present = [b for b in blocks if len(b)]
+
+    if not present:
+        return [np.zeros(0, dtype=np.int64) for _ in blocks]
+
+    low = [min(int(b[axis].min()) for b in present) for axis in 'xyz']
+    high = [max(int(b[axis].max()) for b in present) for axis in 'xyz']
+
+    shape = tuple(h - l + 1 for l, h in zip(low, high))
+
+    return [
+        np.ravel_multi_index(
+            tuple(b[axis].astype(np.int64) - l for axis, l in zip('xyz', low)),
+            shape
+        )
+        for b in blocks
+    ]
+
+
+# the model is meshed in cubes of this size so that the occupancy grid
+# stays small no matter how spread out a material is (regions never cross
+# a multiple of it)
+TILE_SIZE = 128
+
+
+class FillPlanner:
+    '''Merges blocks that share a material and data value into boxes using
+    greedy meshing (grow along x, then z, then y).'''
+
+    def __init__(self, max_volume=MAX_FILL_VOLUME, tile_size=TILE_SIZE):
+
+        self.max_volume = max_volume
+        self.tile_size = tile_size
+
+    def plan(self, arrays, materials):
+        '''Plan an arrays (mcparser.BlockArrays) build, using materials (a
+        materials.MaterialTable) to turn blocks into block names and data
+        values.'''
+
+        keep = last_occurrences(arrays.coordinates)
+        blocks = arrays.blocks[keep]
+
+        block_ids = materials.block_ids(arrays)[keep]
+
+        regions = []
+
+        for block_id in np.unique(block_ids).tolist():
+
+            rows = blocks[block_ids == block_id]
+            material_data = materials[block_id]
+
+            regions.extend(self._mesh(
+                rows,
+                material_data.material,
+                material_data.dataValue
+            ))
+
+        return FillPlan(regions, len(arrays))
+
+    def _mesh(self, rows, material, dataValue):
+
+        coordinates = np.column_stack((rows['y'], rows['z'], rows['x']))
+        coordinates = coordinates.astype(np.int64)
+
+        tiles = coordinates // self.tile_size
+        tiles -= tiles.min(axis=0)
+
+        tile_keys = np.ravel_multi_index(tiles.T, tiles.max(axis=0) + 1)
+        order = np.argsort(tile_keys, kind='stable')
+        bounds = np.flatnonzero(np.diff(tile_keys[order])) + 1
+
+        for members in np.split(order, bounds):
+
+            tile = coordinates[members]
+            origin = tile.min(axis=0)
+            local = tile - origin
+
+            grid = np.zeros(local.max(axis=0) + 1, dtype=bool)
+            grid[local[:, 0], local[:, 1], local[:, 2]] = True
+
+            oy, oz, ox = (int(i) for i in origin)
+
+            for y1, z1, x1, y2, z2, x2 in self._boxes(grid):
+
+                yield Region(
+                    ox + x1, oy + y1, oz + z1,
+                    ox + x2, oy + y2, oz + z2,
+                    material,
+                    dataValue
+                )
+
+    def _boxes(self, grid):
+        '''Greedily carve grid (indexed [y, z, x]) into boxes, yielding
+        inclusive (y1, z1, x1, y2, z2, x2) tuples.'''
+
+        size_y, size_z, size_x = grid.shape
+
+        for y, z, x in np.argwhere(grid).tolist():
+
+            if not grid[y, z, x]:
+                continue
+
+            # grow along x
+            row = grid[y, z, x:x + min(size_x - x, self.max_volume)]
+            dx = len(row) if row.all() else int(row.argmin())
+
+            # then along z, keeping the whole x run filled
+            dz = 1
+            while (z + dz < size_z and dx * (dz + 1) <= self.max_volume and
+                   grid[y, z + dz, x:x + dx].all()):
+                dz += 1
+
+            # then along y, keeping the whole x/z rectangle filled
+            dy = 1
+            while (y + dy < size_y and
+                   dx * dz * (dy + 1) <= self.max_volume and
+                   grid[y + dy, z:z + dz, x:x + dx].all()):
+                dy += 1
+
+            grid[y:y + dy, z:z + dz, x:x + dx] = False
+
+            yield y, z, x, y + dy - 1, z + dz - 1, x + dx - 1
@@ -0,0 +1,274 @@
+'''
+    Concurrent command sender backed by a pool of RCON connections.
+'''
+
+import itertools
+import queue
+import threading
+import time
+
+
+def target_key(command):
+    '''The block a command starts at; commands sharing it keep their order.'''
+
+    return tuple(command.split(' ', 4)[1:4])
+
+
+class SendResult:
+    '''The outcome of one command sent through a SenderPool.'''
+
+    def __init__(self, seq, command, response, response_id, attempts,
+                 elapsed):
+
+        self.seq = seq
+        self.command = command
+        self.response = response
+        self.response_id = response_id
+        self.attempts = attempts
+
+        # seconds spent sending, including any retries
+        self.elapsed = elapsed
+
+
+class _Worker(threading.Thread):
+    '''Owns one connection and sends the commands queued for it in order.'''
+
+    _STOP = object()
+
+    def __init__(self, pool, connection, window):
+
+        super().__init__(daemon=True)
+
+        self.pool = pool
+        self.connection = connection
+        self.queue = queue.Queue(maxsize=window)
+
+    def run(self):
+
+        while True:
+
+            job = self.queue.get()
+
+            if job is self._STOP:
+                break
+
+            seq, command = job
+
+            if self.pool.error is None:
+
+                try:
+                    self.pool._deliver(self._send(seq, command))
+                except Exception as exc:
+                    self.pool._fail(exc)
+
+            self.pool._release()
+            self.queue.task_done()
+
+        self.queue.task_done()
+        self._disconnect()
+
+    def _send(self, seq, command):
+
+        attempts = 0
+        started = time.perf_counter()
+
+        while True:
+
+            attempts += 1
+
+            try:
+
+                if self.connection is None:
+                    self.connection = self.pool.connect()
+
+                response, response_id = self.connection.send(command)
+
+                return SendResult(
+                    seq, command, response, response_id, attempts,
+                    time.perf_counter() - started
+                )
+
+            except self.pool.retry_exceptions:
+
+                self._disconnect()
+
+                if attempts > self.pool.retries:
+                    raise
+
+                time.sleep(self.pool.retry_delay(attempts))
+
+    def _disconnect(self):
+
+        if self.connection is None:
+            return
+
+        try:
+            self.connection.disconnect()
+        except Exception:
+            pass
+
+        self.connection = None
+
+
+class SenderPool:
+    '''Sends commands over "size" connections at once.
+
+    connect() must return an object with the RemoteConsole interface:
+    send(command) -> (response, response_id) and disconnect().
+
+    Each connection has a bounded queue of at most "window" commands, so
+    submit() blocks once the pool is saturated. Commands with the same key
+    (see target_key) always use the same connection, which preserves their
+    relative order. Commands that fail with one of retry_exceptions are
+    retried on a fresh connection up to "retries" times, waiting backoff
+    seconds before the first retry and twice as long before each further
+    one (but never more than max_backoff).
+
+    on_result(SendResult) is called once per command, never concurrently.
+
+    set_limit() additionally caps the number of commands in flight (queued
+    or being sent) across all connections, e.g. for a throttle.
+    '''
+
+    def __init__(self, connect, size=1, window=16, retries=3,
+                 retry_exceptions=(OSError,), on_result=None,
+                 key=target_key, backoff=0.0, max_backoff=30.0):
+
+        self.connect = connect
+        self.size = size
+        self.window = window
+        self.retries = retries
+        self.retry_exceptions = retry_exceptions
+        self.on_result = on_result
+        self.key = key
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.error = None
+        self.sent = 0
+
+        self.limit = None
+        self.in_flight = 0
+
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._slots = threading.Condition()
+        self._workers = []
+
+    def start(self):
+
+        # connect up front so authentication problems surface immediately
+        try:
+            for _ in range(self.size):
+                self._workers.append(
+                    _Worker(self, self.connect(), self.window)
+                )
+        except Exception:
+            for worker in self._workers:
+                worker._disconnect()
+            self._workers = []
+            raise
+
+        for worker in self._workers:
+            worker.start()
+
+        return self
+
+    def retry_delay(self, attempts):
+        '''Seconds to wait before retrying a command that failed attempts
+        times.'''
+
+        if not self.backoff:
+            return 0.0
+
+        return min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+
+    def submit(self, command, key=None):
+        '''Queue command for sending and return its sequence number.'''
+
+        if self.error is not None:
+            raise self.error
+
+        if key is None:
+            key = self.key(command)
+
+        with self._slots:
+
+            while self.limit is not None and self.in_flight >= self.limit:
+                self._slots.wait()
+
+            self.in_flight += 1
+
+        seq = next(self._seq)
+
+        worker = self._workers[hash(key) % len(self._workers)]
+        worker.queue.put((seq, command))
+
+        return seq
+
+    def set_limit(self, limit):
+        '''Allow at most limit commands in flight (None for no limit).'''
+
+        with self._slots:
+            self.limit = limit
+            self._slots.notify_all()
+
+    def join(self):
+        '''Wait for every queued command to be sent.'''
+
+        for worker in self._workers:
+            worker.queue.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        '''Send what is still queued, then disconnect everything.'''
+
+        for worker in self._workers:
+            worker.queue.put(_Worker._STOP)
+
+        for worker in self._workers:
+            worker.join()
+
+        self._workers = []
+
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        if exc_type is None:
+            self.close()
+            return
+
+        # already failing - don't let close() mask the original exception
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _deliver(self, result):
+
+        with self._lock:
+
+            self.sent += 1
+
+            if self.on_result:
+                self.on_result(result)
+
+    def _release(self):
+
+        with self._slots:
+            self.in_flight -= 1
+            self._slots.notify()
+
+    def _fail(self, exc):
+
+        with self._lock:
+
+            if self.error is None:
+                self.error = exc
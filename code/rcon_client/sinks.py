@@ -0,0 +1,259 @@
+'''
+    Command sinks: where the build pipeline's commands go, and progress
+    reporting on them.
+
+    A sink has SenderPool's interface - start(), submit(command, key=None)
+    returning the command's sequence number, join() and close() - so
+    build() can feed any of them; a SenderPool is the RCON sink. The others
+    write commands out (to a file, gzipped or not, or stdout) in large
+    batches, count them for dry runs, or tee them into several sinks.
+'''
+
+import gzip
+import sys
+import threading
+import time
+
+
+# Progress verbosity levels
+QUIET = 0
+SUMMARY = 1
+COMMANDS = 2
+RESPONSES = 3
+
+VERBOSITY = {
+    'quiet': QUIET,
+    'summary': SUMMARY,
+    'commands': COMMANDS,
+    'responses': RESPONSES
+}
+
+STDOUT = '-'
+GZIP_EXTENSION = '.gz'
+
+# lines written to a stream at once
+BUFFER_LINES = 4096
+
+# gzip's default of 9 costs a lot more time for very little on commands
+COMPRESS_LEVEL = 6
+
+
+class CommandSink:
+    '''The base sink; it only counts the commands submitted.'''
+
+    def __init__(self):
+
+        self.count = 0
+
+    def start(self):
+        return self
+
+    def submit(self, command, key=None):
+
+        seq = self.count
+        self.count += 1
+
+        return seq
+
+    def join(self):
+        pass
+
+    def close(self):
+        self.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class NullSink(CommandSink):
+    '''Discards commands (counting them), for dry runs.'''
+    pass
+
+
+class StreamSink(CommandSink):
+    '''Writes commands, one per line, to a text stream, buffer_lines at a
+    time. The stream is closed with the sink when the sink opened it.'''
+
+    def __init__(self, fout, buffer_lines=BUFFER_LINES, owned=False):
+
+        super().__init__()
+
+        self.fout = fout
+        self.buffer_lines = buffer_lines
+        self.owned = owned
+
+        self._lines = []
+
+    @classmethod
+    def open(clz, target, buffer_lines=BUFFER_LINES):
+        '''A sink for a file name; "-" is stdout and names ending in ".gz"
+        are gzipped.'''
+
+        if target == STDOUT:
+            return clz(sys.stdout, buffer_lines)
+
+        if target.endswith(GZIP_EXTENSION):
+            fout = gzip.open(target, 'wt', compresslevel=COMPRESS_LEVEL)
+        else:
+            fout = open(target, 'w')
+
+        return clz(fout, buffer_lines, owned=True)
+
+    def submit(self, command, key=None):
+
+        self._lines.append(command)
+
+        if len(self._lines) >= self.buffer_lines:
+            self._flush()
+
+        return super().submit(command, key)
+
+    def _flush(self):
+
+        if self._lines:
+            self._lines.append('')
+            self.fout.write('\n'.join(self._lines))
+            self._lines = []
+
+    def join(self):
+
+        self._flush()
+        self.fout.flush()
+
+    def close(self):
+
+        try:
+            self.join()
+        finally:
+            if self.owned:
+                self.fout.close()
+
+
+class TeeSink(CommandSink):
+    '''Submits every command to each of sinks; sequence numbers are the
+    first sink's.'''
+
+    def __init__(self, *sinks):
+
+        super().__init__()
+
+        self.sinks = sinks
+
+    def start(self):
+
+        for sink in self.sinks:
+            sink.start()
+
+        return self
+
+    def submit(self, command, key=None):
+
+        seqs = [sink.submit(command, key) for sink in self.sinks]
+
+        self.count += 1
+
+        return seqs[0]
+
+    def join(self):
+
+        for sink in self.sinks:
+            sink.join()
+
+    def close(self):
+
+        error = None
+
+        # close everything, even after a failure
+        for sink in self.sinks:
+
+            try:
+                sink.close()
+            except Exception as exc:
+                error = error or exc
+
+        if error is not None:
+            raise error
+
+
+class Progress:
+    '''Reports on commands as they are done: every command (and its
+    response) at the COMMANDS (RESPONSES) verbosity, and a one line
+    summary every interval seconds from SUMMARY up. total, when known, is
+    the number of commands expected. Updates may come from several threads
+    (a SenderPool's workers).'''
+
+    def __init__(self, verbosity=SUMMARY, interval=5.0, total=None,
+                 out=None, label='sent'):
+
+        self.verbosity = verbosity
+        self.interval = interval
+        self.total = total
+        self.out = out or sys.stdout
+        self.label = label
+
+        self.count = 0
+
+        self._started = time.monotonic()
+        self._next = self._started + interval
+
+        self._lock = threading.Lock()
+
+    def update(self, command, response=None):
+        '''Record a command that was done (with the server's response).'''
+
+        with self._lock:
+
+            self.count += 1
+
+            if self.verbosity >= COMMANDS:
+
+                self.out.write(command + '\n')
+
+                if response and self.verbosity >= RESPONSES:
+                    self.out.write(response.decode() + '\n')
+
+            if self.verbosity >= SUMMARY:
+
+                now = time.monotonic()
+
+                if now >= self._next:
+                    self._next = now + self.interval
+                    self._summary('progress')
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self._started
+
+    def summary(self, tag):
+
+        with self._lock:
+            self._summary(tag)
+
+    def _summary(self, tag):
+
+        elapsed = self.elapsed
+
+        if self.total:
+            done = '{} of {} commands ({:.1f}%)'.format(
+                self.count, self.total, 100.0 * self.count / self.total
+            )
+        else:
+            done = '{} commands'.format(self.count)
+
+        self.out.write('[{}] {} {} in {:.1f}s ({:.0f}/s)\n'.format(
+            tag,
+            done,
+            self.label,
+            elapsed,
+            self.count / elapsed if elapsed else 0.0
+        ))
+        self.out.flush()
+
+    def finish(self):
+        '''Print the final summary.'''
+
+        if self.verbosity >= SUMMARY:
+            self.summary('done')
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# mirror build.py's path patching so the tests can find the parser and the
+# minecraft-tools submodule
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.append(os.path.join(HERE, os.pardir, 'minecraft-tools'))
+sys.path.append(os.path.join(HERE, os.pardir, os.pardir, 'mcparser'))
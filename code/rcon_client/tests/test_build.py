@@ -0,0 +1,392 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import yaml
+
+from mcparser import Parser, ParseGenerator
+
+from cache import CommandCache
+from datapack import DatapackWriter
+from materials import BLOCK_STATES, LEGACY, MaterialTable
+from metrics import Metrics
+from sender import SendResult
+from sinks import CommandSink, COMMANDS, Progress
+
+try:
+    import build
+except ImportError:
+    # build.py needs the minecraft-tools submodule
+    build = None
+
+
+MODEL = '''mc-sdf-1:
+  version: 1.0
+  cells:
+    - cell:
+        structure:
+          - context:
+              material: wool.red
+              items: ["0,0,0", "1,0,0", "2,0,0"]
+          - context:
+              material: piston
+              facing: U
+              items: ["0,1,0"]
+          - context:
+              material: stone
+              items: ["40,0,40"]
+'''
+
+LEGACY_COMMANDS = [
+    'setblock 0 64 0 wool 14',
+    'setblock 1 64 0 wool 14',
+    'setblock 2 64 0 wool 14',
+    'setblock 0 65 0 piston 1',
+    'setblock 40 64 40 stone'
+]
+
+BLOCK_STATE_COMMANDS = [
+    'setblock 0 64 0 minecraft:red_wool',
+    'setblock 1 64 0 minecraft:red_wool',
+    'setblock 2 64 0 minecraft:red_wool',
+    'setblock 0 65 0 minecraft:piston[facing=up]',
+    'setblock 40 64 40 minecraft:stone'
+]
+
+# BLOCK_STATE_COMMANDS chunk by chunk, one chunk force-loaded at a time
+CHUNKED_COMMANDS = (
+    ['forceload add 0 0'] +
+    BLOCK_STATE_COMMANDS[:4] +
+    ['forceload remove 0 0', 'forceload add 32 32'] +
+    BLOCK_STATE_COMMANDS[4:] +
+    ['forceload remove 32 32']
+)
+
+
+def read_lines(filename):
+
+    with open(filename, 'r') as fin:
+        return fin.read().splitlines()
+
+
+def first_shard(directory):
+    '''The commands of a datapack's first shard function.'''
+
+    return read_lines(os.path.join(
+        directory, 'data', 'mc_sdf', 'functions', 'model',
+        'part_00000.mcfunction'
+    ))
+
+
+class ListSink(CommandSink):
+    '''Keeps the commands submitted to it.'''
+
+    def __init__(self):
+
+        super().__init__()
+
+        self.commands = []
+
+    def submit(self, command, key=None):
+
+        self.commands.append(command)
+
+        return super().submit(command, key)
+
+
+class ResultSink(CommandSink):
+    '''Reports each command to on_result as if a SenderPool had sent it.'''
+
+    def __init__(self, on_result):
+
+        super().__init__()
+
+        self.on_result = on_result
+
+    def submit(self, command, key=None):
+
+        seq = super().submit(command, key)
+
+        self.on_result(SendResult(seq, command, b'', seq + 1, 1, 0.001))
+
+        return seq
+
+
+class FailingSink(CommandSink):
+    '''Takes every command, then fails to send them.'''
+
+    def join(self):
+        raise OSError('connection lost')
+
+
+def stub_console(sent, fail_after=None):
+    '''A RemoteConsole stand-in that appends the commands it sends to sent
+    and loses its connection once fail_after of them went through.'''
+
+    class StubConsole:
+
+        def __init__(self, host, port, password):
+            pass
+
+        def send(self, command):
+
+            if fail_after is not None and len(sent) >= fail_after:
+                raise build.ConnectionError('connection lost')
+
+            sent.append(command)
+
+            return b'', len(sent)
+
+        def disconnect(self):
+            pass
+
+    return StubConsole
+
+
+@unittest.skipIf(build is None, 'minecraft-tools submodule not checked out')
+class TestBuild(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = self.tempdir.name
+
+        self.model = os.path.join(self.directory, 'model.yaml')
+
+        with open(self.model, 'w') as fout:
+            fout.write(MODEL)
+
+    def tearDown(self):
+
+        self.tempdir.cleanup()
+
+    def generator(self):
+
+        gen = ParseGenerator(Parser(yaml.safe_load(MODEL)))
+        gen.x_offset, gen.y_offset, gen.z_offset = 0, 64, 0
+
+        return gen
+
+    def main(self, *args):
+        '''Run build.py with args (after the model file); returns what it
+        printed.'''
+
+        out = io.StringIO()
+
+        with mock.patch.object(
+            sys, 'argv', ['build.py', self.model, '--position', '0 64 0',
+                          '--stream'] + list(args)
+        ), contextlib.redirect_stdout(out):
+            build.main()
+
+        return out.getvalue()
+
+    def test_dialects(self):
+
+        for dialect, expected in ((LEGACY, LEGACY_COMMANDS),
+                                  (BLOCK_STATES, BLOCK_STATE_COMMANDS)):
+
+            sink = ListSink()
+
+            build.dry_run(
+                self.generator(),
+                sink,
+                materials=MaterialTable(dialect=dialect)
+            )
+
+            self.assertEqual(sink.commands, expected)
+
+    def test_select_dialect(self):
+
+        select = build.select_dialect
+
+        self.assertEqual(select(), LEGACY)
+        self.assertEqual(select(BLOCK_STATES), BLOCK_STATES)
+        self.assertEqual(select(datapack=True), BLOCK_STATES)
+        self.assertEqual(select(BLOCK_STATES, chunked=True), BLOCK_STATES)
+
+        with self.assertRaises(build.BadConfigException):
+            select(LEGACY, datapack=True)
+
+        with self.assertRaises(build.BadConfigException):
+            select(LEGACY, chunked=True)
+
+    def test_main_dialects(self):
+
+        output = os.path.join(self.directory, 'commands.txt')
+
+        for args, expected in (
+            ((), LEGACY_COMMANDS),
+            (('--dialect', 'legacy'), LEGACY_COMMANDS),
+            (('--dialect', 'block-states'), BLOCK_STATE_COMMANDS)
+        ):
+
+            self.main('--dry-run', '--output', output, *args)
+
+            self.assertEqual(read_lines(output), expected)
+
+    def test_chunked(self):
+
+        sink = ListSink()
+
+        build.dry_run(
+            self.generator(),
+            sink,
+            materials=MaterialTable(dialect=BLOCK_STATES),
+            scheduler=build.ChunkScheduler(window=1)
+        )
+
+        self.assertEqual(sink.commands, CHUNKED_COMMANDS)
+
+    def test_main_chunked(self):
+
+        output = os.path.join(self.directory, 'commands.txt')
+
+        # block states without asking for them
+        self.main('--dry-run', '--output', output, '--chunked',
+                  '--chunk-window', '1')
+
+        self.assertEqual(read_lines(output), CHUNKED_COMMANDS)
+
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+
+            with self.assertRaises(SystemExit):
+                self.main('--dry-run', '--chunked', '--dialect', 'legacy')
+
+        self.assertIn('--chunked needs the block-states dialect',
+                      err.getvalue())
+
+    def test_reports(self):
+
+        out = io.StringIO()
+        progress = Progress(COMMANDS, out=out)
+        metrics = Metrics()
+
+        build.build(
+            self.generator(),
+            ResultSink(build.ResultHandler(progress, metrics)),
+            optimize=True,
+            metrics=metrics
+        )
+
+        progress.finish()
+
+        # the three wool blocks go out as one fill
+        commands = out.getvalue().splitlines()
+
+        self.assertEqual(len(commands), 4)
+        self.assertEqual(
+            commands[:3],
+            ['fill 0 64 0 2 64 0 wool 14', LEGACY_COMMANDS[3],
+             LEGACY_COMMANDS[4]]
+        )
+        self.assertTrue(commands[3].startswith('[done] 3 commands sent'))
+
+        self.assertEqual(
+            metrics.counters,
+            {'blocks_generated': 5, 'commands_sent': 3, 'blocks_sent': 5}
+        )
+        self.assertEqual(metrics.histograms['rcon_send_seconds'].count, 3)
+
+        for timer in ('generate', 'optimize', 'command_stream', 'submit',
+                      'print', 'join'):
+            self.assertIn(timer, metrics.timers)
+
+        self.assertEqual(metrics.timers['submit'][0], 3)
+
+    def test_cache(self):
+
+        cache = CommandCache(os.path.join(self.directory, 'cache'))
+
+        slot = cache.slot('key')
+
+        with self.assertRaises(OSError):
+            build.build(self.generator(), FailingSink(), cache=slot)
+
+        # every command was taken, but not sent
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(os.listdir(cache.directory), [])
+
+        slot = cache.slot('key')
+
+        build.build(self.generator(), ListSink(), cache=slot)
+
+        self.assertEqual(
+            list(cache.get('key').commands()), LEGACY_COMMANDS
+        )
+
+        sink = ListSink()
+
+        build.build(None, sink, cache=cache.slot('key'))
+
+        self.assertEqual(sink.commands, LEGACY_COMMANDS)
+
+    def test_resume(self):
+
+        output = os.path.join(self.directory, 'commands.txt')
+
+        self.main('--dry-run', '--output', output)
+        commands = read_lines(output)
+
+        args = ('--password', 'x', '--retries', '0',
+                '--checkpoint-interval', '1')
+
+        first = []
+
+        with mock.patch.object(build, 'RemoteConsole',
+                               stub_console(first, fail_after=2)):
+            printed = self.main(*args)
+
+        self.assertEqual(first, commands[:2])
+        self.assertIn('Stopped after 2 commands', printed)
+
+        second = []
+
+        with mock.patch.object(build, 'RemoteConsole',
+                               stub_console(second)):
+            printed = self.main('--resume', *args)
+
+        self.assertIn('Resuming after 2 commands', printed)
+
+        # only what the first run didn't get to
+        self.assertEqual(second, commands[2:])
+
+    def test_export_datapack(self):
+
+        writer = DatapackWriter(self.directory, 'model')
+
+        build.export_datapack(
+            self.generator(),
+            writer,
+            materials=MaterialTable(dialect=BLOCK_STATES)
+        )
+
+        self.assertEqual(first_shard(self.directory), BLOCK_STATE_COMMANDS)
+
+    def test_main_datapack(self):
+
+        datapack = os.path.join(self.directory, 'datapack')
+
+        printed = self.main('--datapack', datapack, '--no-run')
+
+        self.assertIn('Wrote 5 commands in 1 functions', printed)
+
+        # block states without asking for them
+        self.assertEqual(first_shard(datapack), BLOCK_STATE_COMMANDS)
+
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+
+            with self.assertRaises(SystemExit):
+                self.main('--datapack', datapack, '--no-run',
+                          '--dialect', 'legacy')
+
+        self.assertIn('--datapack needs the block-states dialect',
+                      err.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import time
+import unittest
+
+from cache import CachedPlan, CommandCache
+
+
+COMMANDS_SENT = ['setblock {} 0 0 stone 0'.format(x) for x in range(10)]
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cache = CommandCache(self.tempdir.name)
+
+    def tearDown(self):
+
+        self.tempdir.cleanup()
+
+    def record(self, key):
+
+        recording = self.cache.record(key, iter(COMMANDS_SENT))
+
+        list(recording)
+        recording.finish()
+
+    def test_round_trip(self):
+
+        commands = COMMANDS_SENT + ['say trailing space ']
+
+        slot = self.cache.slot('key')
+
+        self.assertFalse(slot.hit)
+
+        recorded = list(slot.record(iter(commands), CachedPlan(20, 11)))
+
+        self.assertEqual(recorded, commands)
+
+        # nothing is cached until the build says it went through
+        self.assertIsNone(self.cache.get('key'))
+
+        slot.finish()
+
+        entry = self.cache.slot('key').entry
+
+        self.assertEqual(entry.count, 11)
+        self.assertEqual(list(entry.commands()), commands)
+        self.assertEqual(entry.plan.block_count, 20)
+        self.assertEqual(entry.plan.saved, 9)
+
+        self.assertIsNone(self.cache.get('other key'))
+
+    def test_interrupted(self):
+
+        recording = self.cache.record('key', iter(COMMANDS_SENT))
+        stream = iter(recording)
+
+        next(stream)
+        stream.close()
+        recording.finish()
+
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(os.listdir(self.tempdir.name), [])
+
+    def test_failed(self):
+
+        recording = self.cache.record('key', iter(COMMANDS_SENT))
+
+        list(recording)
+        recording.finish(complete=False)
+
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(os.listdir(self.tempdir.name), [])
+
+    def test_no_plan(self):
+
+        self.record('key')
+
+        self.assertIsNone(self.cache.get('key').plan)
+
+    def test_eviction(self):
+
+        for key in ('a', 'b'):
+            self.record(key)
+
+        size = self.cache.size
+
+        # "a" was used last, so "b" goes first
+        past = time.time() - 60
+        os.utime(os.path.join(self.tempdir.name, 'a.json'), (past, past))
+        os.utime(os.path.join(self.tempdir.name, 'b.json'), (past, past))
+        self.cache.get('a')
+
+        # room for two entries
+        self.cache.max_bytes = size
+
+        self.record('c')
+
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+        self.assertLessEqual(self.cache.size, self.cache.max_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
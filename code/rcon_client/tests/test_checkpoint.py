@@ -0,0 +1,144 @@
+import os
+import tempfile
+import unittest
+
+from checkpoint import BadCheckpointException, Checkpoint, stream_key
+from sender import SenderPool
+
+from tests.test_sender import FakeConnection
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tempdir.name, 'model.checkpoint')
+
+    def tearDown(self):
+
+        self.tempdir.cleanup()
+
+    def test_out_of_order(self):
+
+        checkpoint = Checkpoint(self.filename, 'key', interval=1000)
+
+        for seq in (1, 2, 4):
+            checkpoint.acknowledge(seq)
+
+        self.assertEqual(checkpoint.acknowledged, 0)
+
+        checkpoint.acknowledge(0)
+        self.assertEqual(checkpoint.acknowledged, 3)
+
+        checkpoint.acknowledge(3)
+        self.assertEqual(checkpoint.acknowledged, 5)
+
+    def test_interval(self):
+
+        checkpoint = Checkpoint(self.filename, 'key', interval=10)
+
+        for seq in range(9):
+            checkpoint.acknowledge(seq)
+
+        self.assertFalse(os.path.exists(self.filename))
+
+        checkpoint.acknowledge(9)
+
+        self.assertEqual(
+            Checkpoint.resume(self.filename, 'key').acknowledged, 10
+        )
+
+    def test_resume(self):
+
+        checkpoint = Checkpoint(self.filename, 'key')
+
+        for seq in range(3):
+            checkpoint.acknowledge(seq)
+
+        checkpoint.save()
+
+        resumed = Checkpoint.resume(self.filename, 'key')
+
+        self.assertEqual(list(resumed.skip(iter(range(6)))), [3, 4, 5])
+
+        # the resumed run numbers its commands from zero again
+        resumed.acknowledge(0)
+        self.assertEqual(resumed.acknowledged, 4)
+
+        resumed.finish()
+
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertTrue(resumed.finished)
+
+    def test_wrong_build(self):
+
+        Checkpoint(self.filename, 'key').save()
+
+        with self.assertRaises(BadCheckpointException):
+            Checkpoint.resume(self.filename, 'other key')
+
+        with self.assertRaises(BadCheckpointException):
+            Checkpoint.resume(self.filename + '.missing', 'key')
+
+    def test_stream_key(self):
+
+        model = os.path.join(self.tempdir.name, 'model.yaml')
+
+        with open(model, 'w') as fout:
+            fout.write('one')
+
+        key = stream_key([model], position={'x': 0})
+
+        self.assertEqual(key, stream_key([model], position={'x': 0}))
+        self.assertNotEqual(key, stream_key([model], position={'x': 1}))
+
+        with open(model, 'w') as fout:
+            fout.write('two')
+
+        self.assertNotEqual(key, stream_key([model], position={'x': 0}))
+
+    def test_interrupted_build(self):
+
+        commands = ['say {}'.format(n) for n in range(100)]
+        log = []
+
+        def send(pool_connect, checkpoint):
+
+            pool = SenderPool(
+                pool_connect,
+                size=3,
+                retries=0,
+                retry_exceptions=(ConnectionError,),
+                on_result=lambda result: checkpoint.acknowledge(result.seq)
+            )
+
+            try:
+                with pool:
+                    for command in checkpoint.skip(iter(commands)):
+                        pool.submit(command)
+            finally:
+                checkpoint.save()
+
+        # every connection drops after 10 commands
+        with self.assertRaises(ConnectionError):
+            send(
+                lambda: FakeConnection(log, fail_after=10),
+                Checkpoint(self.filename, 'key', interval=5)
+            )
+
+        checkpoint = Checkpoint.resume(self.filename, 'key')
+
+        self.assertGreater(checkpoint.start, 0)
+        self.assertLess(checkpoint.start, len(commands))
+
+        send(lambda: FakeConnection(log), checkpoint)
+
+        self.assertEqual(set(log), set(commands))
+
+        # nothing is sent twice unless it was sent after the checkpoint
+        self.assertLessEqual(len(log) - len(commands), 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import unittest
+
+import numpy as np
+
+from mcparser import Parser, ParseGenerator
+
+from chunks import (
+    chunk_key,
+    ChunkScheduler,
+    hilbert_keys,
+    ScheduleException,
+    zorder_keys,
+    ZORDER
+)
+
+
+def grid(size):
+
+    x, z = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+
+    return x.ravel(), z.ravel()
+
+
+class TestCurves(unittest.TestCase):
+
+    def test_hilbert_is_continuous(self):
+
+        x, z = grid(16)
+        keys = hilbert_keys(x, z)
+
+        self.assertEqual(sorted(keys.tolist()), list(range(256)))
+
+        order = np.argsort(keys)
+        steps = np.abs(np.diff(x[order])) + np.abs(np.diff(z[order]))
+
+        # every step along the curve moves to a neighbouring cell
+        self.assertTrue((steps == 1).all())
+
+    def test_zorder(self):
+
+        x, z = grid(4)
+
+        self.assertEqual(sorted(zorder_keys(x, z).tolist()), list(range(16)))
+        self.assertEqual(
+            zorder_keys(np.array([0, 1, 0, 1, 2]), np.array([0, 0, 1, 1, 0]))
+            .tolist(),
+            [0, 1, 2, 3, 4]
+        )
+
+
+class TestChunkScheduler(unittest.TestCase):
+
+    def make_arrays(self, items):
+
+        data = {
+            'mc-sdf-1': {
+                'version': '1.0',
+                'cells': [{'cell': {'structure': [
+                    {'context': {
+                        'material': 'stone',
+                        'item_suffix': ['material'],
+                        'items': items
+                    }}
+                ]}}]
+            }
+        }
+
+        return ParseGenerator(Parser(data)).generate_arrays()
+
+    def test_stable_within_chunk(self):
+
+        items = [
+            '0,0,0,wool.red',
+            '40,0,40',
+            '5,1,5',
+            '0,0,0,wool.blue',
+            '-1,0,-1',
+            '41,0,40'
+        ]
+
+        arrays, schedule = ChunkScheduler().order_arrays(
+            self.make_arrays(items)
+        )
+
+        rows = [
+            (int(row['x']), int(row['z']), arrays.materials[row['material']])
+            for row in arrays.blocks
+        ]
+
+        chunk_of = {(x, z): (x >> 4, z >> 4) for x, z, _ in rows}
+
+        # each chunk's blocks are contiguous and in document order
+        self.assertEqual(len(schedule.chunks), 3)
+        self.assertEqual(sum(schedule.counts), len(items))
+
+        position = 0
+
+        for chunk, count in zip(schedule.chunks, schedule.counts):
+
+            for x, z, _ in rows[position:position + count]:
+                self.assertEqual(chunk_of[(x, z)], chunk)
+
+            position += count
+
+        origin = [m for x, z, m in rows if (x, z) == (0, 0)]
+        self.assertEqual(origin, ['wool.red', 'wool.blue'])
+
+        self.assertIn((-1, -1), schedule.chunks)
+
+    def test_forceload_window(self):
+
+        items = [
+            '{},0,{}'.format(x, z)
+            for x in range(0, 160, 8) for z in range(0, 160, 8)
+        ]
+
+        scheduler = ChunkScheduler(window=3, curve=ZORDER)
+        arrays, schedule = scheduler.order_arrays(self.make_arrays(items))
+
+        commands = list(scheduler.forceload(
+            ('setblock {} {} {}'.format(x, y, z)
+             for x, y, z in arrays.coordinates.tolist()),
+            schedule
+        ))
+
+        loaded = set()
+        blocks = 0
+
+        for command in commands:
+
+            parts = command.split(' ')
+            chunk = chunk_key(command)
+
+            if parts[0] == 'forceload':
+
+                if parts[1] == 'add':
+                    loaded.add(chunk)
+                else:
+                    loaded.remove(chunk)
+
+                self.assertLessEqual(len(loaded), 3)
+
+            else:
+
+                self.assertIn(chunk, loaded)
+                blocks += 1
+
+        self.assertEqual(blocks, len(items))
+        self.assertEqual(loaded, set())
+        self.assertEqual(len(schedule.chunks), 100)
+
+    def test_regions(self):
+
+        class Region:
+
+            def __init__(self, x1, z1):
+                self.x1, self.z1 = x1, z1
+
+        regions = [Region(100, 0), Region(0, 0), Region(3, 3)]
+
+        ordered, schedule = ChunkScheduler().order_regions(regions)
+
+        self.assertEqual(ordered, [regions[1], regions[2], regions[0]])
+        self.assertEqual(schedule.counts, [2, 1])
+
+    def test_chunk_key(self):
+
+        self.assertEqual(chunk_key('setblock 17 64 -1 stone 0'), (1, -1))
+        self.assertEqual(chunk_key('fill 32 0 15 40 5 20 stone 0'), (2, 0))
+        self.assertEqual(chunk_key('forceload add -16 32'), (-1, 2))
+        self.assertEqual(chunk_key('say hi'), 'say hi')
+
+    def test_bad_settings(self):
+
+        with self.assertRaises(ScheduleException):
+            ChunkScheduler(curve='peano')
+
+        with self.assertRaises(ScheduleException):
+            ChunkScheduler(window=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
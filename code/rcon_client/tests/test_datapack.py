@@ -0,0 +1,181 @@
+import json
+import os
+import tempfile
+import re
+import unittest
+
+from mcparser import Parser, ParseGenerator
+
+from datapack import (
+    DatapackException,
+    DatapackWriter,
+    function_name
+)
+from materials import BLOCK_STATES, MaterialTable
+from optimizer import FillPlanner
+
+
+def read_lines(filename):
+
+    with open(filename, 'r') as fin:
+        return fin.read().splitlines()
+
+
+class TestDatapackWriter(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = self.tempdir.name
+
+    def tearDown(self):
+
+        self.tempdir.cleanup()
+
+    def functions(self, *parts):
+
+        return os.path.join(
+            self.directory, 'data', 'mc_sdf', 'functions', *parts
+        )
+
+    def run_commands(self, writer, function):
+        '''Follow the schedule chain from function, returning the commands
+        it runs (and checking that no function exceeds the limit).'''
+
+        commands = []
+        pending = [function]
+
+        while pending:
+
+            namespace, name = pending.pop().split(':')
+            lines = read_lines(self.functions(name + '.mcfunction'))
+
+            self.assertLessEqual(len(lines), writer.max_commands)
+
+            for line in lines:
+
+                if line.startswith('schedule function '):
+                    pending.append(line.split(' ')[2])
+                else:
+                    commands.append(line)
+
+        return commands
+
+    def test_sharding(self):
+
+        commands = ['setblock {} 0 0 stone'.format(n) for n in range(10)]
+
+        writer = DatapackWriter(self.directory, 'house', max_commands=4)
+
+        self.assertEqual(writer.write(iter(commands)), 'mc_sdf:house')
+        self.assertEqual(writer.command_count, 10)
+        self.assertEqual(writer.shard_count, 4)
+
+        self.assertEqual(
+            read_lines(self.functions('house.mcfunction')),
+            ['schedule function mc_sdf:house/part_00000 1t']
+        )
+        self.assertEqual(
+            read_lines(self.functions('house', 'part_00003.mcfunction')),
+            ['setblock 9 0 0 stone']
+        )
+
+        self.assertEqual(self.run_commands(writer, 'mc_sdf:house'), commands)
+
+        with open(os.path.join(self.directory, 'pack.mcmeta')) as fin:
+            self.assertEqual(json.load(fin)['pack']['pack_format'], 4)
+
+    def test_exact_multiple(self):
+
+        commands = ['say {}'.format(n) for n in range(6)]
+
+        writer = DatapackWriter(self.directory, 'exact', max_commands=4)
+        writer.write(commands)
+
+        self.assertEqual(writer.shard_count, 2)
+        self.assertEqual(self.run_commands(writer, 'mc_sdf:exact'), commands)
+
+    def test_rewrite_removes_old_shards(self):
+
+        writer = DatapackWriter(self.directory, 'house', max_commands=2)
+
+        writer.write(['say {}'.format(n) for n in range(5)])
+        writer.write(['say again'])
+
+        self.assertEqual(
+            os.listdir(self.functions('house')),
+            ['part_00000.mcfunction']
+        )
+        self.assertEqual(
+            self.run_commands(writer, 'mc_sdf:house'),
+            ['say again']
+        )
+
+    def test_empty(self):
+
+        writer = DatapackWriter(self.directory, 'nothing')
+        writer.write([])
+
+        self.assertEqual(read_lines(self.functions('nothing.mcfunction')), [])
+
+    def test_singular_function_directory(self):
+
+        writer = DatapackWriter(self.directory, 'new', pack_format=48)
+        writer.write(['say hi'])
+
+        self.assertTrue(os.path.exists(os.path.join(
+            self.directory, 'data', 'mc_sdf', 'function', 'new.mcfunction'
+        )))
+
+    def test_names(self):
+
+        self.assertEqual(function_name('My House (v2)'), 'my_house_v2')
+        self.assertEqual(function_name('???'), 'build')
+
+        with self.assertRaises(DatapackException):
+            DatapackWriter(self.directory, 'Bad Name')
+
+
+    def test_block_state_commands(self):
+
+        data = {
+            'mc-sdf-1': {
+                'version': '1.0',
+                'cells': [{'cell': {'structure': [
+                    {'context': {
+                        'material': 'wool.red',
+                        'items': ['0,0,0', '1,0,0', '4,0,0']
+                    }},
+                    {'context': {
+                        'material': 'piston',
+                        'item_suffix': ['facing'],
+                        'items': ['0,1,0,N', '1,1,0,U']
+                    }}
+                ]}}]
+            }
+        }
+
+        plan = FillPlanner().plan(
+            ParseGenerator(Parser(data)).generate_arrays(),
+            MaterialTable(dialect=BLOCK_STATES)
+        )
+
+        writer = DatapackWriter(self.directory, 'build')
+        writer.write(plan.commands)
+
+        commands = self.run_commands(writer, 'mc_sdf:build')
+
+        self.assertEqual(sorted(commands), [
+            'fill 0 0 0 1 0 0 minecraft:red_wool',
+            'setblock 0 1 0 minecraft:piston[facing=north]',
+            'setblock 1 1 0 minecraft:piston[facing=up]',
+            'setblock 4 0 0 minecraft:red_wool'
+        ])
+
+        # no 1.12 data values or trailing blanks
+        for command in commands:
+            self.assertIsNone(re.search(' \\d+$| $', command))
+
+
+if __name__ == '__main__':
+    unittest.main()
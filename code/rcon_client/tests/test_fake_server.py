@@ -0,0 +1,132 @@
+import socket
+import struct
+import time
+import unittest
+
+from fake_server import (
+    FakeRconServer,
+    pack,
+    SERVERDATA_AUTH,
+    SERVERDATA_AUTH_RESPONSE,
+    SERVERDATA_EXECCOMMAND,
+    SERVERDATA_RESPONSE_VALUE
+)
+from sender import SenderPool
+
+try:
+    from api.rcon import RemoteConsole
+except ImportError:
+    RemoteConsole = None
+
+
+class RawClient:
+    '''Just enough of an RCON client to check the framing by hand.'''
+
+    def __init__(self, server):
+
+        self.sock = socket.create_connection((server.host, server.port))
+
+    def request(self, request_id, packet_type, body):
+
+        self.sock.sendall(pack(request_id, packet_type, body.encode()))
+
+        length, = struct.unpack('<i', self._read(4))
+        data = self._read(length)
+
+        self.padding = data[-2:]
+
+        response_id, response_type = struct.unpack('<ii', data[:8])
+
+        return response_id, response_type, data[8:-2].decode()
+
+    def _read(self, count):
+
+        data = b''
+
+        while len(data) < count:
+            chunk = self.sock.recv(count - len(data))
+            if not chunk:
+                raise ConnectionError('closed')
+            data += chunk
+
+        return data
+
+    def close(self):
+        self.sock.close()
+
+
+class TestFakeRconServer(unittest.TestCase):
+
+    def test_protocol(self):
+
+        with FakeRconServer('secret', record=True) as server:
+
+            client = RawClient(server)
+
+            self.assertEqual(
+                client.request(7, SERVERDATA_AUTH, 'secret'),
+                (7, SERVERDATA_AUTH_RESPONSE, '')
+            )
+            self.assertEqual(client.padding, b'\x00\x00')
+
+            self.assertEqual(
+                client.request(8, SERVERDATA_EXECCOMMAND,
+                               'setblock 0 0 0 stone'),
+                (8, SERVERDATA_RESPONSE_VALUE, 'Block placed')
+            )
+
+            client.close()
+
+            self.assertEqual(server.commands, ['setblock 0 0 0 stone'])
+            self.assertEqual(server.command_count, 1)
+
+    def test_bad_password(self):
+
+        with FakeRconServer('secret') as server:
+
+            client = RawClient(server)
+
+            response_id, response_type, _ = client.request(
+                1, SERVERDATA_AUTH, 'wrong'
+            )
+
+            self.assertEqual(response_id, -1)
+            self.assertEqual(response_type, SERVERDATA_AUTH_RESPONSE)
+
+            client.close()
+
+    def test_latency(self):
+
+        with FakeRconServer('', latency=0.05) as server:
+
+            client = RawClient(server)
+            client.request(1, SERVERDATA_AUTH, '')
+
+            start = time.time()
+            client.request(2, SERVERDATA_EXECCOMMAND, 'say hi')
+
+            self.assertGreaterEqual(time.time() - start, 0.05)
+
+            client.close()
+
+    @unittest.skipIf(RemoteConsole is None,
+                     'minecraft-tools submodule not checked out')
+    def test_sender_pool(self):
+
+        with FakeRconServer('secret', latency=0.005) as server:
+
+            def connect():
+                return RemoteConsole(server.host, server.port, 'secret')
+
+            results = []
+
+            with SenderPool(connect, size=4, on_result=results.append) as pool:
+
+                for n in range(100):
+                    pool.submit('setblock {} 0 0 stone'.format(n))
+
+            self.assertEqual(server.command_count, 100)
+            self.assertEqual(len(results), 100)
+
+            for result in results:
+                self.assertEqual(result.response, b'Block placed')
@@ -0,0 +1,148 @@
+import os
+import tempfile
+import unittest
+
+from mcparser import Parser, ParseGenerator
+
+from journal import BadJournalException, Journal, JournalException
+from materials import MaterialRegistry, MaterialTable
+
+
+def make_arrays(stone, wool=()):
+
+    data = {
+        'mc-sdf-1': {
+            'version': '1.0',
+            'cells': [{'cell': {'structure': [
+                {'context': {'material': 'stone', 'items': list(stone)}},
+                {'context': {
+                    'item_suffix': ['material'],
+                    'items': list(wool)
+                }}
+            ]}}]
+        }
+    }
+
+    return ParseGenerator(Parser(data)).generate_arrays()
+
+
+def changed_blocks(arrays):
+
+    return sorted(
+        (
+            (int(row['x']), int(row['y']), int(row['z'])),
+            arrays.materials[row['material']]
+        )
+        for row in arrays.blocks
+    )
+
+
+class TestJournal(unittest.TestCase):
+
+    POSITION = (10, 64, -5)
+
+    def setUp(self):
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tempdir.name, 'model.journal')
+
+        self.stone = ['{},0,{}'.format(x, z)
+                      for x in range(20) for z in range(20)]
+
+    def tearDown(self):
+
+        self.tempdir.cleanup()
+
+    def deploy(self, arrays, position=POSITION, materials=None):
+
+        journal = Journal(self.filename, position)
+
+        if materials is None:
+            materials = MaterialTable()
+
+        changes = journal.changes(arrays, materials)
+        journal.save()
+
+        return changes
+
+    def test_first_build_sends_everything(self):
+
+        changes = self.deploy(make_arrays(self.stone, ['0,1,0,wool.red']))
+
+        self.assertEqual(len(changes), 401)
+
+    def test_only_changes_are_sent(self):
+
+        self.deploy(make_arrays(self.stone, ['0,1,0,wool.red']))
+
+        stone = [s for s in self.stone if s != '5,0,5'] + ['0,2,0']
+
+        changes = self.deploy(make_arrays(
+            stone,
+            ['0,1,0,wool.blue', '1,0,1,wool.red']
+        ))
+
+        self.assertEqual(changed_blocks(changes), [
+            ((0, 1, 0), 'wool.blue'),
+            ((0, 2, 0), 'stone'),
+            ((1, 0, 1), 'wool.red'),
+            ((5, 0, 5), 'air')
+        ])
+
+        # and nothing at all the next time
+        self.assertEqual(len(self.deploy(make_arrays(
+            stone,
+            ['0,1,0,wool.blue', '1,0,1,wool.red']
+        ))), 0)
+
+    def test_other_position(self):
+
+        self.deploy(make_arrays(self.stone))
+
+        changes = self.deploy(make_arrays(self.stone), position=(0, 0, 0))
+
+        self.assertEqual(len(changes), len(self.stone))
+
+    def test_changed_mapping(self):
+
+        self.deploy(make_arrays(self.stone[:3], ['0,1,0,wool.red']))
+
+        registry = MaterialRegistry.load()
+        registry.update({'tables': {'color': {'red': 99}}})
+
+        changes = self.deploy(
+            make_arrays(self.stone[:3], ['0,1,0,wool.red']),
+            materials=MaterialTable(registry)
+        )
+
+        self.assertEqual(changed_blocks(changes), [((0, 1, 0), 'wool.red')])
+
+    def test_unsaved_build_keeps_journal(self):
+
+        self.deploy(make_arrays(self.stone))
+
+        journal = Journal(self.filename, self.POSITION)
+        journal.changes(make_arrays(self.stone[:10]), MaterialTable())
+
+        # the build failed - the next attempt sends the same changes
+        journal = Journal(self.filename, self.POSITION)
+        changes = journal.changes(make_arrays(self.stone[:10]), MaterialTable())
+
+        self.assertEqual(len(changes), len(self.stone) - 10)
+
+    def test_save_needs_changes(self):
+
+        with self.assertRaises(JournalException):
+            Journal(self.filename, self.POSITION).save()
+
+    def test_bad_file(self):
+
+        with open(self.filename, 'wb') as fout:
+            fout.write(b'not a journal at all, really')
+
+        with self.assertRaises(BadJournalException):
+            Journal(self.filename, self.POSITION)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,344 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from anvil import read_nbt
+from blockstates import format_state
+from mcparser import (
+    BLOCK_DTYPE,
+    BlockArrays,
+    BlockOperation,
+    Facing,
+    LookupTable,
+    Parser,
+    ParseGenerator
+)
+from structure import StructureWriter
+from transform import Transform
+
+from materials import (
+    BadMappingException,
+    BLOCK_STATES,
+    MaterialException,
+    MaterialData,
+    MaterialRegistry,
+    MaterialTable,
+    UnknownMaterialException,
+    get_material_data
+)
+
+
+class TestMaterialRegistry(unittest.TestCase):
+
+    def setUp(self):
+
+        self.registry = MaterialRegistry.load()
+
+    def test_colored_blocks(self):
+
+        self.assertEqual(
+            self.registry.resolve('wool.white', None),
+            MaterialData('wool', 0)
+        )
+        self.assertEqual(
+            self.registry.resolve('wool.red', Facing.North),
+            MaterialData('wool', 14)
+        )
+        self.assertEqual(
+            self.registry.resolve('stained_glass.light_blue', None),
+            MaterialData('stained_glass', 3)
+        )
+
+    def test_facing_blocks(self):
+
+        expected = {
+            Facing.Down: 0,
+            Facing.Up: 1,
+            Facing.North: 2,
+            Facing.South: 3,
+            Facing.West: 4,
+            Facing.East: 5
+        }
+
+        for facing, data_value in expected.items():
+
+            self.assertEqual(
+                self.registry.resolve('sticky_piston', facing),
+                MaterialData('sticky_piston', data_value)
+            )
+
+        self.assertEqual(
+            self.registry.resolve('piston', None),
+            MaterialData('piston', '')
+        )
+        self.assertEqual(
+            self.registry.resolve('oak_stairs', Facing.North),
+            MaterialData('oak_stairs', 3)
+        )
+
+    def test_variant_and_facing(self):
+
+        self.assertEqual(
+            self.registry.resolve('log.birch', Facing.East),
+            MaterialData('log', 6)
+        )
+        self.assertEqual(
+            self.registry.resolve('log.birch', None),
+            MaterialData('log', 2)
+        )
+
+    def test_plain_materials(self):
+
+        self.assertEqual(
+            self.registry.resolve('stone', Facing.Up),
+            MaterialData('stone', '')
+        )
+        self.assertEqual(
+            self.registry.resolve('wood.oak', None),
+            MaterialData('wood.oak', '')
+        )
+
+    def test_plain_variant_families(self):
+
+        for block in self.registry.variants:
+
+            self.assertEqual(
+                self.registry.resolve(block, None),
+                MaterialData(block, '')
+            )
+
+        self.assertEqual(
+            self.registry.resolve('wool', Facing.North),
+            MaterialData('wool', '')
+        )
+        self.assertEqual(
+            self.registry.resolve('log', Facing.East),
+            MaterialData('log', 4)
+        )
+
+        table = MaterialTable()
+
+        self.assertEqual(
+            table[table.id('wool', None)], MaterialData('wool', '')
+        )
+
+    def test_unknown_values(self):
+
+        with self.assertRaises(UnknownMaterialException):
+            self.registry.resolve('wool.plaid', None)
+
+        with self.assertRaises(KeyError):
+            self.registry.resolve('piston', Facing.Other)
+
+    def test_update_from_json(self):
+
+        mapping = {
+            'tables': {'color': {'plaid': 16}, 'rail': {'North': 0}},
+            'facings': {'rail': 'rail'}
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            filename = os.path.join(directory, 'extra.json')
+
+            with open(filename, 'w') as fout:
+                json.dump(mapping, fout)
+
+            self.registry.update_from(filename)
+
+        self.assertEqual(
+            self.registry.resolve('wool.plaid', None),
+            MaterialData('wool', 16)
+        )
+        self.assertEqual(
+            self.registry.resolve('wool.red', None),
+            MaterialData('wool', 14)
+        )
+        self.assertEqual(
+            self.registry.resolve('rail', Facing.North),
+            MaterialData('rail', 0)
+        )
+
+    def test_bad_mapping(self):
+
+        with self.assertRaises(BadMappingException):
+            self.registry.update({'facings': {'rail': 'missing'}})
+
+        with self.assertRaises(BadMappingException):
+            self.registry.update({'blocks': {}})
+
+    def test_get_material_data(self):
+
+        self.assertEqual(
+            get_material_data('wool.black', None),
+            MaterialData('wool', 15)
+        )
+
+
+class TestMaterialTable(unittest.TestCase):
+
+    def test_block_states(self):
+
+        table = MaterialTable(dialect=BLOCK_STATES)
+
+        for material, facing, state in (
+            ('wool.red', None, 'minecraft:red_wool'),
+            ('wool', Facing.North, 'minecraft:white_wool'),
+            (
+                'stained_hardened_clay.white',
+                None,
+                'minecraft:white_terracotta'
+            ),
+            ('piston', Facing.Up, 'minecraft:piston[facing=up]'),
+            ('piston', None, 'minecraft:piston'),
+            ('furnace', Facing.West, 'minecraft:furnace[facing=west]'),
+            ('oak_stairs', Facing.East, 'minecraft:oak_stairs[facing=east]'),
+            ('log.birch', Facing.East, 'minecraft:birch_log[axis=x]'),
+            ('log2.acacia', Facing.Up, 'minecraft:acacia_log[axis=y]'),
+            ('log', Facing.Other, 'minecraft:oak_log'),
+            ('torch', Facing.Up, 'minecraft:torch'),
+            ('torch', Facing.South, 'minecraft:wall_torch[facing=south]'),
+            ('stone', Facing.North, 'minecraft:stone')
+        ):
+
+            self.assertEqual(
+                table[table.id(material, facing)],
+                MaterialData(state, '')
+            )
+
+        # the same checks as the legacy dialect
+        with self.assertRaises(UnknownMaterialException):
+            table.id('wool.plaid', None)
+
+        with self.assertRaises(UnknownMaterialException):
+            table.id('furnace', Facing.Up)
+
+        with self.assertRaises(MaterialException):
+            MaterialTable(dialect='1.12')
+
+    def test_structure_states(self):
+
+        registry = MaterialRegistry.load()
+
+        pairs = [
+            (block, Facing[facing])
+            for block, table in sorted(registry.facings.items())
+            for facing in registry.tables[table]
+        ]
+
+        materials = LookupTable()
+        facings = LookupTable()
+
+        arrays = BlockArrays(
+            np.array(
+                [
+                    (n, 0, 0, materials.intern(block), facings.intern(facing),
+                     0)
+                    for n, (block, facing) in enumerate(pairs)
+                ],
+                dtype=BLOCK_DTYPE
+            ),
+            materials,
+            facings,
+            LookupTable([BlockOperation.Replace])
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            tile, = StructureWriter(
+                directory, 'model', tile_size=len(pairs)
+            ).write(arrays)
+
+            with gzip.open(tile.filename, 'rb') as fin:
+                root = read_nbt(fin.read())
+
+        # templates place the blocks that block state commands set
+        for block, (material, facing) in zip(root['blocks'], pairs):
+
+            entry = root['palette'][block['state']]
+
+            self.assertEqual(
+                format_state(entry['Name'], entry.get('Properties')),
+                registry.resolve_state(material, facing).material
+            )
+
+
+    def test_ids(self):
+
+        table = MaterialTable()
+
+        stone = table.id('stone', None)
+
+        self.assertEqual(table.id('stone', Facing.North), stone)
+        self.assertNotEqual(table.id('wool.red', None), stone)
+        self.assertEqual(table[stone], MaterialData('stone', ''))
+        self.assertEqual(len(table), 2)
+
+    def test_block_ids(self):
+
+        data = {
+            'mc-sdf-1': {
+                'version': '1.0',
+                'cells': [{'cell': {'structure': [
+                    {'context': {'material': 'stone', 'items': ['0,0,0']}},
+                    {'context': {
+                        'material': 'piston',
+                        'item_suffix': ['facing', 'material'],
+                        'items': ['1,0,0,N', '2,0,0,S', '3,0,0,U,wool.red']
+                    }}
+                ]}}]
+            }
+        }
+
+        gen = ParseGenerator(Parser(data))
+
+        table = MaterialTable()
+
+        actual = [
+            table[block_id]
+            for block_id in table.block_ids(gen.generate_arrays()).tolist()
+        ]
+
+        expected = [
+            get_material_data(context.material, context.facing)
+            for context, item in gen.generate()
+        ]
+
+        self.assertEqual(actual, expected)
+
+    def test_transformed_data_values(self):
+
+        data = {
+            'mc-sdf-1': {
+                'version': '1.0',
+                'cells': [{'cell': {'structure': [
+                    {'context': {
+                        'material': 'piston',
+                        'item_suffix': ['facing'],
+                        'items': ['0,0,0,N', '1,0,0,E', '2,0,0,U']
+                    }}
+                ]}}]
+            }
+        }
+
+        arrays = ParseGenerator(Parser(data)).generate_arrays()
+        arrays = Transform(rotate=90).apply(arrays)
+
+        table = MaterialTable()
+
+        # north -> east (5), east -> south (3), up stays up (1)
+        self.assertEqual(
+            [
+                table[block_id].dataValue
+                for block_id in table.block_ids(arrays).tolist()
+            ],
+            [5, 3, 1]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from metrics import (
+    Histogram,
+    Metrics,
+    MetricsException,
+    MetricsReporter,
+    NULL_METRICS
+)
+from optimizer import command_volume
+from sender import SenderPool
+
+from tests.test_sender import FakeConnection
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+
+        self.tempdir.cleanup()
+
+    def test_timers_and_counters(self):
+
+        metrics = Metrics()
+
+        with metrics.timer('load'):
+            time.sleep(0.01)
+
+        metrics.count('blocks', 5)
+        metrics.count('blocks')
+
+        add = metrics.timed('add', lambda a, b: a + b)
+
+        self.assertEqual(add(1, 2), 3)
+
+        report = metrics.report()
+
+        self.assertEqual(report['timers']['load']['calls'], 1)
+        self.assertGreaterEqual(report['timers']['load']['seconds'], 0.01)
+        self.assertEqual(report['timers']['add']['calls'], 1)
+        self.assertEqual(report['counters'], {'blocks': 6})
+
+    def test_time_iter(self):
+
+        metrics = Metrics()
+
+        def slow():
+
+            for n in range(3):
+                time.sleep(0.01)
+                yield n
+
+        consumed = 0.0
+
+        for _ in metrics.time_iter('produce', slow()):
+
+            started = time.perf_counter()
+            time.sleep(0.02)
+            consumed += time.perf_counter() - started
+
+        calls, seconds = metrics.timers['produce']
+
+        self.assertEqual(calls, 3)
+        self.assertGreaterEqual(seconds, 0.03)
+        self.assertLess(seconds, consumed)
+
+        # stopping early still records what was produced
+        iterator = metrics.time_iter('partial', iter(range(10)))
+        next(iterator)
+        iterator.close()
+
+        self.assertEqual(metrics.timers['partial'][0], 1)
+
+    def test_histogram(self):
+
+        histogram = Histogram((0.01, 0.1, 1.0))
+
+        for value in (0.005, 0.05, 0.05, 0.5, 5.0):
+            histogram.observe(value)
+
+        data = histogram.data
+
+        self.assertEqual(
+            data['buckets'], {'0.01': 1, '0.1': 3, '1.0': 4, '+Inf': 5}
+        )
+        self.assertEqual(data['count'], 5)
+        self.assertAlmostEqual(data['sum'], 5.605)
+        self.assertEqual(data['p50'], 0.1)
+        self.assertIsNone(data['p99'])
+
+    def test_prometheus(self):
+
+        metrics = Metrics()
+
+        metrics.add_time('generate', 1.5, calls=3)
+        metrics.count('commands-sent', 7)
+        metrics.observe('rcon_send_seconds', 0.002)
+        metrics.gauge('blocks_per_second', lambda: 42.0)
+
+        text = metrics.prometheus()
+
+        self.assertIn('# TYPE mcbuild_stage_seconds_total counter', text)
+        self.assertIn('mcbuild_stage_seconds_total{stage="generate"} 1.5',
+                      text)
+        self.assertIn('mcbuild_stage_calls_total{stage="generate"} 3', text)
+        self.assertIn('mcbuild_commands_sent_total 7', text)
+        self.assertIn('mcbuild_rcon_send_seconds_bucket{le="0.001"} 0', text)
+        self.assertIn('mcbuild_rcon_send_seconds_bucket{le="0.0025"} 1',
+                      text)
+        self.assertIn('mcbuild_rcon_send_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn('mcbuild_rcon_send_seconds_count 1', text)
+        self.assertIn('# TYPE mcbuild_blocks_per_second gauge', text)
+        self.assertIn('mcbuild_blocks_per_second 42.0', text)
+
+    def test_reporter(self):
+
+        json_file = os.path.join(self.tempdir.name, 'metrics.json')
+        prometheus_file = os.path.join(self.tempdir.name, 'metrics.prom')
+
+        metrics = Metrics()
+
+        reporter = MetricsReporter(
+            metrics, json_file, prometheus_file, interval=0.01
+        ).start()
+
+        metrics.count('commands_sent', 3)
+
+        deadline = time.time() + 5
+
+        while not os.path.exists(json_file) and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertTrue(os.path.exists(json_file))
+
+        metrics.count('commands_sent')
+        reporter.stop()
+
+        with open(json_file, 'r') as fin:
+            self.assertEqual(json.load(fin)['counters']['commands_sent'], 4)
+
+        with open(prometheus_file, 'r') as fin:
+            self.assertIn('mcbuild_commands_sent_total 4', fin.read())
+
+        with self.assertRaises(MetricsException):
+            MetricsReporter(metrics)
+
+    def test_send_latency(self):
+
+        metrics = Metrics()
+        log = []
+
+        def on_result(result):
+
+            metrics.observe('rcon_send_seconds', result.elapsed)
+            metrics.count('blocks_sent', command_volume(result.command))
+
+        with SenderPool(lambda: FakeConnection(log, delay=0.002),
+                        size=2, on_result=on_result) as pool:
+
+            submit = metrics.timed('submit', pool.submit)
+
+            submit('setblock 0 0 0 stone 0')
+            submit('fill 0 0 0 1 1 1 stone 0')
+            submit('forceload add 0 0')
+
+            pool.join()
+
+        histogram = metrics.histograms['rcon_send_seconds']
+
+        self.assertEqual(histogram.count, 3)
+        self.assertGreaterEqual(histogram.sum, 0.006)
+        self.assertEqual(metrics.counters['blocks_sent'], 9)
+        self.assertEqual(metrics.timers['submit'][0], 3)
+
+    def test_disabled(self):
+
+        def function():
+            pass
+
+        commands = ['a', 'b']
+
+        self.assertFalse(NULL_METRICS.enabled)
+        self.assertIs(NULL_METRICS.time_iter('stage', commands), commands)
+        self.assertIs(NULL_METRICS.timed('stage', function), function)
+
+        with NULL_METRICS.timer('stage'):
+            NULL_METRICS.count('blocks')
+            NULL_METRICS.observe('latency', 1.0)
+            NULL_METRICS.gauge('rate', 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+
+from mcparser import Parser, ParseGenerator
+
+from materials import MaterialTable, get_material_data
+from optimizer import FillPlanner, MAX_FILL_VOLUME
+
+
+def make_document(*contexts):
+
+    return {
+        'mc-sdf-1': {
+            'version': '1.0',
+            'cells': [
+                {'cell': {'structure': [{'context': c} for c in contexts]}}
+            ]
+        }
+    }
+
+
+def cube(size):
+
+    return [
+        '{},{},{}'.format(x, y, z)
+        for x in range(size) for y in range(size) for z in range(size)
+    ]
+
+
+def built_blocks(plan):
+    '''Replay plan commands into a coordinate -> (material, data) dict.'''
+
+    world = {}
+
+    for command in plan.commands:
+
+        # a block without a data value ends with its name
+        parts = command.split(' ') + ['']
+
+        if parts[0] == 'setblock':
+            x1, y1, z1 = x2, y2, z2 = [int(i) for i in parts[1:4]]
+            material, data = parts[4:6]
+        else:
+            x1, y1, z1, x2, y2, z2 = [int(i) for i in parts[1:7]]
+            material, data = parts[7:9]
+
+        for x in range(x1, x2 + 1):
+            for y in range(y1, y2 + 1):
+                for z in range(z1, z2 + 1):
+                    world[(x, y, z)] = (material, data)
+
+    return world
+
+
+class TestFillPlanner(unittest.TestCase):
+
+    def plan(self, data, planner=None):
+
+        gen = ParseGenerator(Parser(data))
+        plan = (planner or FillPlanner()).plan(
+            gen.generate_arrays(), MaterialTable()
+        )
+
+        return gen, plan
+
+    def test_solid_cube(self):
+
+        gen, plan = self.plan(
+            make_document({'material': 'stone', 'items': cube(8)})
+        )
+
+        self.assertEqual(plan.command_count, 1)
+        self.assertEqual(plan.saved, 8 ** 3 - 1)
+        self.assertEqual(
+            list(plan.commands), ['fill 0 0 0 7 7 7 stone']
+        )
+
+    def test_volume_limit(self):
+
+        gen, plan = self.plan(
+            make_document({'material': 'stone', 'items': cube(40)}),
+        )
+
+        for region in plan.regions:
+            self.assertLessEqual(region.volume, MAX_FILL_VOLUME)
+
+        self.assertEqual(sum(r.volume for r in plan.regions), 40 ** 3)
+        self.assertEqual(len(built_blocks(plan)), 40 ** 3)
+
+    def test_matches_setblock_build(self):
+
+        data = make_document(
+            {'material': 'stone', 'items': cube(4)},
+            {
+                'item_suffix': ['material'],
+                'x': 1,
+                'items': ['0,0,0,wool.red', '1,0,0,wool.red', '0,9,0,wool.blue']
+            },
+            {
+                'material': 'piston',
+                'item_suffix': ['facing'],
+                'items': ['5,5,5,N', '6,5,5,N', '7,5,5,S']
+            }
+        )
+
+        gen, plan = self.plan(data, FillPlanner(max_volume=6))
+
+        expected = {}
+
+        for context, item in gen.generate():
+
+            md = get_material_data(context.material, context.facing)
+            expected[(item.x, item.y, item.z)] = (
+                md.material, str(md.dataValue)
+            )
+
+        self.assertEqual(built_blocks(plan), expected)
+        self.assertLess(plan.command_count, plan.block_count)
+
+        for region in plan.regions:
+            self.assertLessEqual(region.volume, 6)
+
+    def test_single_blocks_use_setblock(self):
+
+        gen, plan = self.plan(
+            make_document({'material': 'dirt', 'items': ['0,0,0', '2,0,0']})
+        )
+
+        self.assertEqual(
+            sorted(plan.commands),
+            ['setblock 0 0 0 dirt', 'setblock 2 0 0 dirt']
+        )
+        self.assertEqual(plan.saved, 0)
@@ -0,0 +1,148 @@
+import threading
+import time
+import unittest
+
+from sender import SenderPool, target_key
+
+
+class FakeConnection:
+
+    def __init__(self, log, fail_after=None, delay=0.0):
+
+        self.log = log
+        self.fail_after = fail_after
+        self.delay = delay
+        self.sent = 0
+        self.connected = True
+
+    def send(self, command):
+
+        if self.fail_after is not None and self.sent >= self.fail_after:
+            raise ConnectionError('dropped')
+
+        self.sent += 1
+        time.sleep(self.delay)
+        self.log.append(command)
+
+        return command.upper().encode(), len(self.log)
+
+    def disconnect(self):
+        self.connected = False
+
+
+class TestSenderPool(unittest.TestCase):
+
+    def test_sends_everything(self):
+
+        log = []
+        results = []
+
+        with SenderPool(lambda: FakeConnection(log), size=4, window=2,
+                        on_result=results.append) as pool:
+
+            for n in range(200):
+                pool.submit('setblock {} 0 0 stone'.format(n))
+
+        self.assertEqual(len(log), 200)
+        self.assertEqual(pool.sent, 200)
+        self.assertEqual(sorted(r.seq for r in results), list(range(200)))
+
+        for result in results:
+            self.assertEqual(result.response, result.command.upper().encode())
+
+    def test_same_target_keeps_order(self):
+
+        log = []
+
+        with SenderPool(lambda: FakeConnection(log), size=8) as pool:
+
+            for n in range(50):
+                pool.submit('setblock 1 2 3 wool {}'.format(n))
+
+        self.assertEqual(
+            log, ['setblock 1 2 3 wool {}'.format(n) for n in range(50)]
+        )
+        self.assertEqual(target_key(log[0]), ('1', '2', '3'))
+
+    def test_concurrency(self):
+
+        log = []
+
+        start = time.time()
+
+        with SenderPool(lambda: FakeConnection(log, delay=0.01),
+                        size=10) as pool:
+
+            for n in range(100):
+                pool.submit('setblock {} 0 0 stone'.format(n))
+
+        # 100 sequential sends would take a full second
+        self.assertLess(time.time() - start, 0.6)
+        self.assertEqual(len(log), 100)
+
+    def test_retry_reconnects(self):
+
+        log = []
+        connections = []
+        lock = threading.Lock()
+
+        def connect():
+            with lock:
+                # the first connection drops after 5 commands
+                conn = FakeConnection(log, 5 if not connections else None)
+                connections.append(conn)
+                return conn
+
+        results = []
+
+        with SenderPool(connect, size=1, on_result=results.append) as pool:
+
+            for n in range(10):
+                pool.submit('say {}'.format(n))
+
+        self.assertEqual(log, ['say {}'.format(n) for n in range(10)])
+        self.assertEqual(len(connections), 2)
+        self.assertFalse(connections[0].connected)
+        self.assertEqual(results[5].attempts, 2)
+
+    def test_backoff(self):
+
+        pool = SenderPool(lambda: None, backoff=0.5, max_backoff=3.0)
+
+        self.assertEqual(
+            [pool.retry_delay(n) for n in range(1, 6)],
+            [0.5, 1.0, 2.0, 3.0, 3.0]
+        )
+        self.assertEqual(SenderPool(lambda: None).retry_delay(3), 0.0)
+
+    def test_backoff_waits(self):
+
+        connections = []
+
+        def connect():
+            connections.append(time.perf_counter())
+            return FakeConnection([], 0 if len(connections) < 3 else None)
+
+        with SenderPool(connect, retries=3, retry_exceptions=(
+                ConnectionError,), backoff=0.02) as pool:
+            pool.submit('say hi')
+
+        # connects at start, then after waiting 0.02 and 0.04 seconds
+        self.assertEqual(len(connections), 3)
+        self.assertGreaterEqual(connections[2] - connections[0], 0.06)
+
+    def test_gives_up(self):
+
+        pool = SenderPool(lambda: FakeConnection([], fail_after=0),
+                          retries=2).start()
+
+        pool.submit('say hi')
+
+        with self.assertRaises(ConnectionError):
+            pool.join()
+
+        with self.assertRaises(ConnectionError):
+            pool.submit('say again')
+
+        with self.assertRaises(ConnectionError):
+            pool.close()
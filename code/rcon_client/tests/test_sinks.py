@@ -0,0 +1,163 @@
+import gzip
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+from sender import SenderPool
+from sinks import (
+    COMMANDS,
+    NullSink,
+    Progress,
+    QUIET,
+    RESPONSES,
+    StreamSink,
+    SUMMARY,
+    TeeSink
+)
+
+from tests.test_sender import FakeConnection
+
+
+COMMANDS_SENT = ['setblock {} 0 0 stone 0'.format(x) for x in range(10)]
+
+
+class TestSinks(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+
+        self.tempdir.cleanup()
+
+    def test_null(self):
+
+        with NullSink() as sink:
+            seqs = [sink.submit(command) for command in COMMANDS_SENT]
+
+        self.assertEqual(seqs, list(range(10)))
+        self.assertEqual(sink.count, 10)
+
+    def test_stream_buffers(self):
+
+        fout = io.StringIO()
+        sink = StreamSink(fout, buffer_lines=4)
+
+        for command in COMMANDS_SENT[:6]:
+            sink.submit(command)
+
+        # one batch of four written, two still buffered
+        self.assertEqual(fout.getvalue().splitlines(), COMMANDS_SENT[:4])
+
+        sink.close()
+
+        self.assertEqual(fout.getvalue().splitlines(), COMMANDS_SENT[:6])
+        self.assertFalse(fout.closed)
+
+    def test_files(self):
+
+        for name, opener in (('commands.txt', open),
+                             ('commands.txt.gz', gzip.open)):
+
+            filename = os.path.join(self.tempdir.name, name)
+
+            with StreamSink.open(filename, buffer_lines=3) as sink:
+                for command in COMMANDS_SENT:
+                    sink.submit(command)
+
+            self.assertTrue(sink.fout.closed)
+
+            with opener(filename, 'rt') as fin:
+                self.assertEqual(fin.read().splitlines(), COMMANDS_SENT)
+
+    def test_tee(self):
+
+        log = []
+        fout = io.StringIO()
+
+        pool = SenderPool(lambda: FakeConnection(log), size=2)
+
+        with TeeSink(pool, StreamSink(fout)) as sink:
+
+            seqs = [sink.submit(command) for command in COMMANDS_SENT]
+
+            sink.join()
+
+            self.assertEqual(sorted(log), sorted(COMMANDS_SENT))
+
+        self.assertEqual(seqs, list(range(10)))
+        self.assertEqual(fout.getvalue().splitlines(), COMMANDS_SENT)
+
+    def test_progress_verbosity(self):
+
+        def report(verbosity):
+
+            out = io.StringIO()
+            progress = Progress(verbosity, interval=3600, out=out)
+
+            progress.update('say hi', b'hi')
+            progress.update('say bye')
+            progress.finish()
+
+            return out.getvalue().splitlines()
+
+        self.assertEqual(report(QUIET), [])
+
+        lines = report(SUMMARY)
+
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith('[done] 2 commands sent in'))
+
+        self.assertEqual(report(COMMANDS)[:2], ['say hi', 'say bye'])
+        self.assertEqual(report(RESPONSES)[:3], ['say hi', 'hi', 'say bye'])
+
+    def test_progress_summaries(self):
+
+        out = io.StringIO()
+        progress = Progress(SUMMARY, interval=0, total=4, out=out,
+                            label='written')
+
+        for command in COMMANDS_SENT[:4]:
+            progress.update(command)
+
+        lines = out.getvalue().splitlines()
+
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[-1].startswith(
+            '[progress] 4 of 4 commands (100.0%) written in'
+        ))
+
+
+    def test_progress_threads(self):
+
+        out = io.StringIO()
+        progress = Progress(RESPONSES, interval=0, out=out)
+
+        def update():
+
+            for command in COMMANDS_SENT * 100:
+                progress.update(command, b'ok')
+
+        threads = [threading.Thread(target=update) for _ in range(4)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(progress.count, 4000)
+
+        lines = out.getvalue().splitlines()
+
+        # every command is followed by its response, never another line
+        for n, line in enumerate(lines):
+            if line in COMMANDS_SENT:
+                self.assertEqual(lines[n + 1], 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
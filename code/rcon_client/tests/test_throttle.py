@@ -0,0 +1,217 @@
+import time
+import unittest
+
+from fake_server import (
+    FakeRconServer,
+    SERVERDATA_AUTH,
+    SERVERDATA_EXECCOMMAND
+)
+from sender import SenderPool
+from throttle import (
+    AimdController,
+    LoadProbe,
+    RateMeter,
+    regex_parser,
+    Throttle
+)
+
+from tests.test_fake_server import RawClient
+
+
+class RawConsole:
+    '''RemoteConsole's interface on top of RawClient.'''
+
+    def __init__(self, server):
+
+        self.client = RawClient(server)
+        self.client.request(1, SERVERDATA_AUTH, server.password)
+
+    def send(self, command):
+
+        response_id, _, response = self.client.request(
+            2, SERVERDATA_EXECCOMMAND, command
+        )
+
+        return response.encode(), response_id
+
+    def disconnect(self):
+        self.client.close()
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestParsing(unittest.TestCase):
+
+    def test_default_pattern(self):
+
+        parse = regex_parser()
+
+        self.assertEqual(
+            parse('TPS from last 1m, 5m, 15m: 19.5, 20.0, 20.0'), 19.5
+        )
+        self.assertEqual(
+            parse('§6TPS from last 1m, 5m, 15m: §a*20.0, §a20.0, §a20.0'),
+            20.0
+        )
+        self.assertIsNone(parse('Unknown command'))
+
+    def test_custom_pattern(self):
+
+        parse = regex_parser('Mean TPS: ([0-9.]+)')
+
+        self.assertEqual(
+            parse('Overall: Mean tick time: 62.5 ms. Mean TPS: 16.0'), 16.0
+        )
+
+
+class TestAimdController(unittest.TestCase):
+
+    def test_increase_and_decrease(self):
+
+        controller = AimdController(rate=100, min_rate=10, max_rate=200,
+                                    increase=60, decrease=0.5, target=19,
+                                    window=4, max_window=5)
+
+        self.assertTrue(controller.update(20.0))
+        self.assertEqual((controller.rate, controller.window), (160, 5))
+
+        controller.update(20.0)
+        self.assertEqual((controller.rate, controller.window), (200, 5))
+
+        self.assertFalse(controller.update(12.0))
+        self.assertEqual((controller.rate, controller.window), (100, 2))
+
+        for _ in range(10):
+            controller.update(5.0)
+
+        self.assertEqual((controller.rate, controller.window), (10, 1))
+
+
+class TestThrottle(unittest.TestCase):
+
+    def test_pacing(self):
+
+        clock = FakeClock()
+        samples = []
+
+        throttle = Throttle(
+            lambda: 20.0,
+            AimdController(rate=100, increase=100),
+            interval=1.0,
+            on_sample=samples.append,
+            clock=clock,
+            sleep=clock.sleep
+        )
+
+        for _ in range(100):
+            throttle.wait()
+
+        # 100 commands at 100/sec
+        self.assertAlmostEqual(clock.now, 0.99, places=6)
+        self.assertEqual(samples, [])
+
+        for _ in range(200):
+            throttle.wait()
+
+        # two more at 100/sec, then the sample at 1.0 doubles the rate
+        self.assertEqual(len(samples), 1)
+        self.assertEqual(samples[0].rate, 200)
+        self.assertAlmostEqual(clock.now, 1.01 + 198 * 0.005, places=6)
+
+    def test_failed_sample_keeps_rate(self):
+
+        clock = FakeClock()
+
+        throttle = Throttle(lambda: None, AimdController(rate=50),
+                            interval=0.0, clock=clock, sleep=clock.sleep)
+
+        throttle.wait()
+
+        self.assertEqual(throttle.controller.rate, 50)
+        self.assertIsNone(throttle.stats.tps)
+
+    def test_rate_meter(self):
+
+        clock = FakeClock()
+        meter = RateMeter(span=2.0, clock=clock)
+
+        for _ in range(30):
+            clock.sleep(0.1)
+            meter.add()
+
+        self.assertAlmostEqual(meter.rate, 10.0, delta=0.6)
+        self.assertEqual(meter.count, 30)
+
+
+class TestOverload(unittest.TestCase):
+
+    def test_fake_server_tps(self):
+
+        with FakeRconServer('pw', capacity=50) as server:
+
+            console = RawConsole(server)
+
+            self.assertEqual(
+                console.send('tps')[0],
+                b'TPS from last 1m, 5m, 15m: 20.0, 20.0, 20.0'
+            )
+
+            for n in range(100):
+                console.send('setblock {} 0 0 stone'.format(n))
+
+            self.assertLess(regex_parser()(console.send('tps')[0].decode()),
+                            19.0)
+
+            console.disconnect()
+
+    def test_controller_backs_off(self):
+
+        with FakeRconServer('pw', capacity=100) as server:
+
+            def connect():
+                return RawConsole(server)
+
+            probe = LoadProbe(connect)
+            samples = []
+
+            with SenderPool(connect, size=2, window=8) as pool:
+
+                throttle = Throttle(
+                    probe,
+                    AimdController(rate=1000, target=19.0, window=16),
+                    pool=pool,
+                    interval=0.25,
+                    on_sample=samples.append
+                )
+
+                pool.on_result = throttle.acknowledge
+
+                started = time.monotonic()
+                n = 0
+
+                while time.monotonic() - started < 1.5:
+                    throttle.wait()
+                    pool.submit('setblock {} 0 0 stone'.format(n))
+                    n += 1
+
+            probe.close()
+
+        self.assertTrue(samples)
+        self.assertGreater(throttle.backoffs, 0)
+        self.assertLess(throttle.controller.rate, 1000)
+        self.assertLess(throttle.controller.window, 16)
+        self.assertEqual(throttle.stats.sent, n)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,287 @@
+'''
+    Adaptive throttling: the send rate and in-flight window follow the
+    server's health, sampled over RCON, using an AIMD controller (additive
+    increase while the server keeps up, multiplicative decrease when it
+    doesn't).
+'''
+
+import collections
+import re
+import threading
+import time
+
+
+# Spigot/Paper; answered with "TPS from last 1m, 5m, 15m: 20.0, ..."
+DEFAULT_LOAD_COMMAND = 'tps'
+
+# the first number after the colon, ignoring "*" (Paper marks TPS above 20
+# with it) and section sign colour codes
+DEFAULT_LOAD_PATTERN = ':[^0-9]*([0-9]+(?:\\.[0-9]+)?)'
+
+COLOUR_CODE_REGEX = re.compile('§.')
+
+
+class ThrottleException(Exception):
+    '''Base Exception class for this module.'''
+    pass
+
+
+def regex_parser(pattern=DEFAULT_LOAD_PATTERN):
+    '''Make a response parser that returns the float in group 1 of the first
+    match of pattern (or None if nothing matches).'''
+
+    regex = re.compile(pattern)
+
+    def parse(text):
+
+        match = regex.search(COLOUR_CODE_REGEX.sub('', text))
+
+        if match is None:
+            return None
+
+        return float(match.group(1))
+
+    return parse
+
+
+class LoadProbe:
+    '''Samples the server's ticks per second through its own connection.
+
+    connect() must return a RemoteConsole-like object; parse(text) turns
+    the response to command into a TPS figure (or None).'''
+
+    def __init__(self, connect, command=DEFAULT_LOAD_COMMAND, parse=None,
+                 retry_exceptions=(OSError,)):
+
+        self.connect = connect
+        self.command = command
+        self.parse = parse or regex_parser()
+        self.retry_exceptions = retry_exceptions
+
+        self.connection = None
+
+    def __call__(self):
+        '''Return the current TPS, or None if it couldn't be read.'''
+
+        try:
+
+            if self.connection is None:
+                self.connection = self.connect()
+
+            response, _ = self.connection.send(self.command)
+
+        except self.retry_exceptions:
+
+            self.close()
+            return None
+
+        if isinstance(response, bytes):
+            response = response.decode('utf-8', 'replace')
+
+        return self.parse(response)
+
+    def close(self):
+
+        if self.connection is None:
+            return
+
+        try:
+            self.connection.disconnect()
+        except Exception:
+            pass
+
+        self.connection = None
+
+
+class AimdController:
+    '''Additive increase, multiplicative decrease of a rate (commands per
+    second) and a window (commands in flight), driven by TPS samples.'''
+
+    def __init__(self, rate=200.0, min_rate=10.0, max_rate=20000.0,
+                 increase=50.0, decrease=0.5, target=19.0, window=16,
+                 min_window=1, max_window=512):
+
+        if not 0 < decrease < 1:
+            raise ThrottleException('decrease must be between 0 and 1.')
+
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.target = target
+        self.window = window
+        self.min_window = min_window
+        self.max_window = max_window
+
+    def update(self, tps):
+        '''Adjust to a TPS sample; returns True if the server kept up.'''
+
+        if tps >= self.target:
+
+            self.rate = min(self.rate + self.increase, self.max_rate)
+            self.window = min(self.window + 1, self.max_window)
+
+            return True
+
+        self.rate = max(self.rate * self.decrease, self.min_rate)
+        self.window = max(int(self.window * self.decrease), self.min_window)
+
+        return False
+
+
+class RateMeter:
+    '''Events per second over the last "span" seconds.'''
+
+    def __init__(self, span=5.0, clock=time.monotonic):
+
+        self.span = span
+        self.clock = clock
+        self.count = 0
+
+        self._times = collections.deque()
+        self._started = clock()
+
+    def add(self):
+
+        now = self.clock()
+
+        self.count += 1
+        self._times.append(now)
+
+        self._trim(now)
+
+    def _trim(self, now):
+
+        while self._times and self._times[0] < now - self.span:
+            self._times.popleft()
+
+    @property
+    def rate(self):
+
+        now = self.clock()
+        self._trim(now)
+
+        elapsed = min(self.span, now - self._started)
+
+        return len(self._times) / elapsed if elapsed > 0 else 0.0
+
+
+class ThrottleStats:
+    '''A snapshot of a Throttle.'''
+
+    __slots__ = ('tps', 'rate', 'window', 'achieved', 'sent', 'backoffs')
+
+    def __init__(self, tps, rate, window, achieved, sent, backoffs):
+
+        self.tps = tps
+        self.rate = rate
+        self.window = window
+        self.achieved = achieved
+        self.sent = sent
+        self.backoffs = backoffs
+
+    def to_dict(self):
+
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __str__(self):
+
+        return (
+            '{:.0f} cmds/sec (limit {:.0f}, window {}), TPS {}, '
+            '{} sent'.format(
+                self.achieved,
+                self.rate,
+                self.window,
+                '?' if self.tps is None else '{:.1f}'.format(self.tps),
+                self.sent
+            )
+        )
+
+
+class Throttle:
+    '''Paces a build loop. Call wait() before submitting each command to
+    pool (a SenderPool) and acknowledge() for every SendResult.
+
+    Every "interval" seconds the probe is sampled and the controller
+    adjusts; the new window becomes the pool's in-flight limit.
+    on_sample(ThrottleStats) is called after every sample.'''
+
+    def __init__(self, probe, controller=None, pool=None, interval=2.0,
+                 on_sample=None, clock=time.monotonic, sleep=time.sleep):
+
+        self.probe = probe
+        self.controller = controller or AimdController()
+        self.pool = pool
+        self.interval = interval
+        self.on_sample = on_sample
+        self.clock = clock
+        self.sleep = sleep
+
+        self.tps = None
+        self.backoffs = 0
+
+        self.meter = RateMeter(clock=clock)
+
+        self._lock = threading.Lock()
+        self._next_send = clock()
+        self._next_sample = clock() + interval
+
+        self._apply()
+
+    def wait(self):
+        '''Block until the next command may be sent.'''
+
+        now = self.clock()
+
+        if now >= self._next_sample:
+            self.sample()
+            now = self.clock()
+
+        if self._next_send > now:
+            self.sleep(self._next_send - now)
+
+        self._next_send = max(self._next_send, now) + \
+            1.0 / self.controller.rate
+
+    def sample(self):
+
+        tps = self.probe()
+
+        self._next_sample = self.clock() + self.interval
+
+        if tps is not None:
+
+            self.tps = tps
+
+            if not self.controller.update(tps):
+                self.backoffs += 1
+
+            self._apply()
+
+        if self.on_sample:
+            self.on_sample(self.stats)
+
+    def acknowledge(self, result=None):
+
+        with self._lock:
+            self.meter.add()
+
+    @property
+    def stats(self):
+
+        with self._lock:
+
+            return ThrottleStats(
+                self.tps,
+                self.controller.rate,
+                self.controller.window,
+                self.meter.rate,
+                self.meter.count,
+                self.backoffs
+            )
+
+    def _apply(self):
+
+        if self.pool is not None:
+            self.pool.set_limit(self.controller.window)